@@ -0,0 +1,121 @@
+"""Python 3.11
+
+Compares the item list serialization before and after the fast path.
+
+The old path loads ORM objects, converts them with parse_obj_as and lets FastAPI validate
+and encode the response model. The fast path fetches columns only and serializes them to
+JSON bytes with a cached TypeAdapter. Both must produce the same bytes.
+
+Usage: python -m benchmarks.serialization [sizes...]
+"""
+import json
+import sys
+import time
+import warnings
+from typing import List
+
+from pydantic import parse_obj_as
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from database import models
+from database.factory import Base
+from utils import responses, serialization
+
+SIZES = (10, 1_000, 100_000)
+
+
+def build_menu(size: int):
+    """
+        Creates an in-memory database holding one restaurant with a menu of the given size.
+
+        :param size: Number of items.
+        :return: Tuple of (engine, restaurant ID).
+    """
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        restaurant_id = db.scalar(insert(models.Restaurant).values(
+            name="Bench", email="bench@example.com", mobile="0", address="Street"
+        ).returning(models.Restaurant.id))
+        db.execute(insert(models.Item), [
+            {"restaurant_id": restaurant_id, "name": f"Item {index} crème brûlée",
+             "description": "Description \"quoted\"", "cost": index / 4, "price": index / 2 + 0.99,
+             "is_active": index % 3 != 0, "image": f"media/image/{index}.png"}
+            for index in range(size)
+        ])
+        db.commit()
+    return engine, restaurant_id
+
+
+def old_path(engine, restaurant_id: int, size: int):
+    """
+        Serializes the menu the way main.get_items did before the fast path.
+
+        :return: JSON bytes.
+    """
+    with Session(engine) as db:
+        items = db.scalars(
+            select(models.Item).where(models.Item.restaurant_id == restaurant_id)
+        ).all()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        page = responses.ItemPageResponseSchema(
+            items=parse_obj_as(List[responses.ItemResponseSchema], items), limit=size
+        )
+    # What FastAPI does with the returned value: validate it against the response model,
+    # dump it to JSON compatible python objects and encode them with json.dumps
+    field = serialization.adapter(responses.ItemPageResponseSchema)
+    content = field.dump_python(field.validate_python(page), mode="json", by_alias=True)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_path(engine, restaurant_id: int, size: int):
+    """
+        Serializes the menu with column-only rows and a cached TypeAdapter.
+
+        :return: JSON bytes.
+    """
+    with Session(engine) as db:
+        rows = db.execute(
+            select(*models.Item.__table__.columns).where(models.Item.restaurant_id == restaurant_id)
+        ).all()
+    return serialization.dump_json(responses.ItemPageResponseSchema, {"items": rows, "limit": size})
+
+
+def measure(func, *args, repeat: int):
+    """
+        Runs a function repeatedly and keeps the fastest run.
+
+        :return: Tuple of (result of the last run, best time in seconds).
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main(sizes):
+    print(f"{'items':>8} {'old ms':>10} {'fast ms':>10} {'speedup':>8} {'bytes':>10}")
+    for size in sizes:
+        engine, restaurant_id = build_menu(size)
+        repeat = 3 if size >= 100_000 else 20
+        old, old_time = measure(old_path, engine, restaurant_id, size, repeat=repeat)
+        fast, fast_time = measure(fast_path, engine, restaurant_id, size, repeat=repeat)
+        assert old == fast, f"payloads differ for {size} items"
+        print(
+            f"{size:>8} {old_time * 1000:>10.2f} {fast_time * 1000:>10.2f}"
+            f" {old_time / fast_time:>7.1f}x {len(fast):>10}"
+        )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or SIZES)
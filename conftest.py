@@ -0,0 +1,33 @@
+"""Python 3.11"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The tests run on a copy of the tracked development database, in a temporary directory, so
+# the rows they create and the tables of the newer models never end up in database.db.
+# The settings read DATABASE_URL when they are first imported, before the test modules.
+_directory = tempfile.mkdtemp(prefix="test-database-")
+if "DATABASE_URL" not in os.environ:
+    _path = os.path.join(_directory, "database.db")
+    shutil.copyfile(os.path.join(os.path.dirname(__file__), "database.db"), _path)
+    os.environ["DATABASE_URL"] = f"sqlite:///{_path}"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database_schema():
+    """
+    Brings the copied database up to date, as the startup event of the application does, and
+    removes it after the tests.
+    """
+    # pylint: disable=import-outside-toplevel
+    from database import geo, media, search
+    from database.factory import engine, init_db
+    init_db(engine)
+    search.create_index(engine)
+    geo.create_index(engine)
+    media.create_triggers(engine)
+    yield
+    engine.dispose()
+    shutil.rmtree(_directory, ignore_errors=True)
@@ -0,0 +1,228 @@
+"""
+Async versions of the functions in database.crud.
+
+Every function accepts either an AsyncSession or a sync Session. With an AsyncSession
+the crud function runs through AsyncSession.run_sync, so its queries go through the
+async driver and the event loop is free while they wait on the database. With a sync
+Session the crud function runs in the threadpool, so it does not block the event loop either.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, geo, models, schema, search
+
+
+async def run(db: AsyncSession | Session, func, *args, **kwargs):
+    """
+        Runs a sync database function without blocking the event loop.
+
+        :param db: Async or sync database session.
+        :param func: Function taking a sync session as its first argument.
+        :param args: Positional arguments passed after the session.
+        :param kwargs: Keyword arguments passed to the function.
+        :return: Result of the function.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(func, *args, **kwargs)
+    return await run_in_threadpool(func, db, *args, **kwargs)
+
+
+# User related operation
+async def get_user(db: AsyncSession | Session, user_id: int):
+    """
+        Retrieves a user by user ID, see crud.get_user.
+    """
+    return await run(db, crud.get_user, user_id)
+
+
+async def get_user_by_token(db: AsyncSession | Session, token_str: str):
+    """
+        Retrieves a token and its user by token string, see crud.get_user_by_token.
+    """
+    return await run(db, crud.get_user_by_token, token_str)
+
+
+async def get_user_by_email(db: AsyncSession | Session, email: str):
+    """
+        Retrieves a user by email, see crud.get_user_by_email.
+    """
+    return await run(db, crud.get_user_by_email, email)
+
+
+async def get_users(db: AsyncSession | Session, cursor: str = None, limit: int = 100):
+    """
+        Retrieves a page of users, see crud.get_users.
+    """
+    return await run(db, crud.get_users, cursor, limit)
+
+
+async def update_user(db: AsyncSession | Session, user: models.User):
+    """
+        Persists pending changes of a user, see crud.update_user.
+    """
+    return await run(db, crud.update_user, user)
+
+
+# Token related operation
+async def add_token(db: AsyncSession | Session, user_id: int, token_factory=None):
+    """
+        Adds a token for a user, see crud.add_token.
+    """
+    return await run(db, crud.add_token, user_id, token_factory)
+
+
+async def revoke_token(db: AsyncSession | Session, token_str: str):
+    """
+        Revokes a token, see crud.revoke_token.
+    """
+    return await run(db, crud.revoke_token, token_str)
+
+
+async def revoke_signed_token(db: AsyncSession | Session, signature: str, expiry):
+    """
+        Records the revocation of a signed token, see crud.revoke_signed_token.
+    """
+    return await run(db, crud.revoke_signed_token, signature, expiry)
+
+
+async def delete_expired_tokens(db: AsyncSession | Session, batch_size: int = 500):
+    """
+        Deletes one batch of expired tokens, see crud.delete_expired_tokens.
+    """
+    return await run(db, crud.delete_expired_tokens, batch_size)
+
+
+# Replication related operation
+async def write_heartbeat(db: AsyncSession | Session):
+    """
+        Writes the replication heartbeat, see crud.write_heartbeat.
+    """
+    return await run(db, crud.write_heartbeat)
+
+
+async def get_heartbeat(db: AsyncSession | Session):
+    """
+        Retrieves the last replication heartbeat, see crud.get_heartbeat.
+    """
+    return await run(db, crud.get_heartbeat)
+
+
+# Restaurant related operation
+async def get_restaurant(db: AsyncSession | Session, user_id: int):
+    """
+        Retrieves a restaurant by user ID, see crud.get_restaurant.
+    """
+    return await run(db, crud.get_restaurant, user_id)
+
+
+async def get_restaurant_version(db: AsyncSession | Session, user_id: int):
+    """
+        Retrieves the version of a user's restaurant, see crud.get_restaurant_version.
+    """
+    return await run(db, crud.get_restaurant_version, user_id)
+
+
+async def get_restaurant_by_id(db: AsyncSession | Session, restaurant_id: int):
+    """
+        Retrieves a restaurant by restaurant ID, see crud.get_restaurant_by_id.
+    """
+    return await run(db, crud.get_restaurant_by_id, restaurant_id)
+
+
+async def update_restaurant(db: AsyncSession | Session, user_id: int,
+                            data: schema.RestaurantSchema):
+    """
+        Updates or creates a restaurant, see crud.update_restaurant.
+    """
+    return await run(db, crud.update_restaurant, user_id, data)
+
+
+async def nearest_restaurants(db: AsyncSession | Session, lat: float, lon: float, limit: int = 10,
+                              radius_km: float = None, initial_radius_km: float = 5.0):
+    """
+        Retrieves the restaurants nearest to a point, see geo.nearest_restaurants.
+    """
+    return await run(db, geo.nearest_restaurants, lat, lon, limit, radius_km, initial_radius_km)
+
+
+# Item related operation
+async def get_items(db: AsyncSession | Session, restaurant_id: int,
+                    filters: schema.ItemFilterSchema = None, cursor: str = None, limit: int = 50):
+    """
+        Retrieves a page of items for a restaurant, see crud.get_items.
+    """
+    return await run(db, crud.get_items, restaurant_id, filters, cursor, limit)
+
+
+async def search_items(db: AsyncSession | Session, query: str, restaurant_id: int = None,
+                       cursor: str = None, limit: int = 50):
+    """
+        Searches the items by name and description, see search.search_items.
+    """
+    return await run(db, search.search_items, query, restaurant_id, cursor, limit)
+
+
+async def create_item(db: AsyncSession | Session, data: schema.CreateItemSchema):
+    """
+        Creates an item, see crud.create_item.
+    """
+    return await run(db, crud.create_item, data)
+
+
+async def get_existing_restaurant_ids(db: AsyncSession | Session, restaurant_ids: set):
+    """
+        Retrieves which of the given restaurant IDs exist, see crud.get_existing_restaurant_ids.
+    """
+    return await run(db, crud.get_existing_restaurant_ids, restaurant_ids)
+
+
+async def bulk_create_items(db: AsyncSession | Session, rows: list):
+    """
+        Creates many items in one statement, see crud.bulk_create_items.
+    """
+    return await run(db, crud.bulk_create_items, rows)
+
+
+async def update_item(db: AsyncSession | Session, item_id: int, data: schema.UpdateItemSchema):
+    """
+        Updates an item, see crud.update_item.
+    """
+    return await run(db, crud.update_item, item_id, data)
+
+
+async def update_items(db: AsyncSession | Session, restaurant_id: int,
+                       data: schema.BatchUpdateItemSchema):
+    """
+        Applies a partial update to many items, see crud.update_items.
+    """
+    return await run(db, crud.update_items, restaurant_id, data)
+
+
+async def delete_item(db: AsyncSession | Session, item_id: int):
+    """
+        Deletes an item, see crud.delete_item.
+    """
+    return await run(db, crud.delete_item, item_id)
+
+
+async def count_items(db: AsyncSession | Session, restaurant_id: int, is_active: bool = None):
+    """
+        Counts the items of a restaurant, see crud.count_items.
+    """
+    return await run(db, crud.count_items, restaurant_id, is_active)
+
+
+async def get_menu_version(db: AsyncSession | Session, restaurant_id: int):
+    """
+        Retrieves the version of a restaurant's items, see crud.get_menu_version.
+    """
+    return await run(db, crud.get_menu_version, restaurant_id)
+
+
+async def delete_all_item(db: AsyncSession | Session, restaurant_id: int, is_active: bool = None,
+                          limit: int = None):
+    """
+        Deletes the items of a restaurant, see crud.delete_all_item.
+    """
+    return await run(db, crud.delete_all_item, restaurant_id, is_active, limit)
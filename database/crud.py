@@ -1,9 +1,13 @@
 import datetime
 import uuid
 
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, insert, select, true, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 
-from . import models, schema
+from utils.cache import response_cache, token_cache
+from . import models, pagination, schema
+from .factory import utcnow
 
 
 # User related operation
@@ -15,19 +19,25 @@ def get_user(db: Session, user_id: int):
         :param user_id: ID of the user to retrieve.
         :return: User object if found, otherwise None.
     """
-    return db.query(models.User).get(models.User.id == user_id)
+    return db.get(models.User, user_id)
 
 
 def get_user_by_token(db: Session, token_str: str):
     """
         Retrieves a user by token.
 
+        Expired tokens are ignored, the lookup is served by the (token, expiry) index.
+        The user is loaded in the same query.
+
         :param db: Database session.
         :param token_str: Token string associated with the user.
-        :return: User object if found, otherwise None.
+        :return: Token object if found and not expired, otherwise None.
     """
     # noinspection PyTypeChecker
-    return db.query(models.Token).filter(models.Token.token == token_str).first()
+    return db.query(models.Token).options(joinedload(models.Token.user)).filter(
+        models.Token.token == token_str,
+        models.Token.expiry > datetime.datetime.utcnow()
+    ).first()
 
 
 def get_user_by_email(db: Session, email: str):
@@ -42,25 +52,43 @@ def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
+def get_users(db: Session, cursor: str = None, limit: int = 100):
     """
-       Retrieves a list of users with optional pagination.
+       Retrieves a page of users ordered by ID.
 
        :param db: Database session.
-       :param skip: Number of records to skip.
+       :param cursor: Cursor of the requested page, None for the first page.
        :param limit: Maximum number of records to retrieve.
-       :return: List of user objects.
+       :return: Page of user objects.
+       :raises ValueError: If the cursor is invalid.
+    """
+    return pagination.paginate(
+        db, select(models.User), "id", models.User.id, models.User.id, cursor, limit
+    )
+
+
+def update_user(db: Session, user: models.User):
+    """
+       Persists pending changes of a user.
+
+       :param db: Database session.
+       :param user: User object with pending changes.
+       :return: Updated user object.
     """
-    return db.query(models.User).offset(skip).limit(limit).all()
+    db.add(user)
+    db.commit()
+    return user
 
 
 # Token related operation
-def add_token(db: Session, user_id: int):
+def add_token(db: Session, user_id: int, token_factory=None):
     """
        Adds a token for a user.
 
        :param db: Database session.
        :param user_id: ID of the user for whom the token is being added.
+       :param token_factory: Optional callable building the token string from the user ID
+       and expiry, a random UUID is used when omitted.
        :return: Token object.
     """
     # noinspection PyTypeChecker
@@ -69,17 +97,123 @@ def add_token(db: Session, user_id: int):
         models.Token.expiry > datetime.datetime.utcnow()
     ).first()
     if not token:
-        token = models.Token(
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(days=14)
+        token = db.scalar(insert(models.Token).values(
             user_id=user_id,
-            token=uuid.UUID(str(uuid.uuid4())).hex,
-            expiry=datetime.datetime.utcnow() + datetime.timedelta(days=14)
-        )
-        db.add(token)
+            token=token_factory(user_id, expiry) if token_factory else uuid.uuid4().hex,
+            expiry=expiry
+        ).returning(models.Token))
         db.commit()
-        db.refresh(token)
+        token_cache.invalidate(token.token)
     return token
 
 
+def revoke_token(db: Session, token_str: str):
+    """
+       Revokes a token and drops it from the token cache.
+
+       :param db: Database session.
+       :param token_str: Token string to revoke.
+       :return: True if the token was revoked, otherwise False.
+    """
+    # noinspection PyTypeChecker
+    deleted = db.query(models.Token).filter(models.Token.token == token_str).delete()
+    db.commit()
+    # Only once committed, or a concurrent verification could cache the token again
+    token_cache.invalidate(token_str)
+    return deleted > 0
+
+
+def revoke_signed_token(db: Session, signature: str, expiry: datetime.datetime):
+    """
+       Records the revocation of a signed token until it expires.
+
+       :param db: Database session.
+       :param signature: Signature of the token.
+       :param expiry: Expiry date of the token.
+       :return: True if the token was revoked, False if it already was.
+    """
+    try:
+        db.execute(insert(models.RevokedToken).values(signature=signature, expiry=expiry))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+def get_revocations(db: Session):
+    """
+       Retrieves the revocations of signed tokens that have not expired yet.
+
+       :param db: Database session.
+       :return: List of (signature, expiry) rows.
+    """
+    return db.execute(
+        select(models.RevokedToken.signature, models.RevokedToken.expiry)
+        .where(models.RevokedToken.expiry > datetime.datetime.utcnow())
+    ).all()
+
+
+def delete_expired_revocations(db: Session, batch_size: int = 500):
+    """
+       Deletes one batch of revocations of signed tokens that have expired anyway.
+
+       :param db: Database session.
+       :param batch_size: Maximum number of revocations deleted in the batch.
+       :return: Number of deleted revocations.
+    """
+    expired_ids = select(models.RevokedToken.id).where(
+        models.RevokedToken.expiry <= datetime.datetime.utcnow()
+    ).limit(batch_size)
+    result = db.execute(delete(models.RevokedToken).where(models.RevokedToken.id.in_(expired_ids)))
+    db.commit()
+    return result.rowcount
+
+
+def delete_expired_tokens(db: Session, batch_size: int = 500):
+    """
+       Deletes one batch of expired tokens.
+
+       Each batch is committed on its own, so the write lock is only held for one batch.
+
+       :param db: Database session.
+       :param batch_size: Maximum number of tokens deleted in the batch.
+       :return: Number of deleted tokens.
+    """
+    expired_ids = select(models.Token.id).where(
+        models.Token.expiry <= datetime.datetime.utcnow()
+    ).limit(batch_size)
+    result = db.execute(delete(models.Token).where(models.Token.id.in_(expired_ids)))
+    db.commit()
+    return result.rowcount
+
+
+# Replication related operation
+def write_heartbeat(db: Session):
+    """
+       Writes the replication heartbeat on the primary database.
+
+       :param db: Database session on the primary.
+       :return: Heartbeat object.
+    """
+    heartbeat = db.get(models.ReplicaHeartbeat, 1) or models.ReplicaHeartbeat(id=1)
+    heartbeat.beat_at = datetime.datetime.utcnow()
+    db.add(heartbeat)
+    db.commit()
+    return heartbeat
+
+
+def get_heartbeat(db: Session):
+    """
+       Retrieves the time of the last replication heartbeat seen by a database.
+
+       :param db: Database session.
+       :return: Date and time of the heartbeat, or None if there is none.
+    """
+    return db.scalar(select(models.ReplicaHeartbeat.beat_at).where(models.ReplicaHeartbeat.id == 1))
+
+
 # Restaurant related operation
 def get_restaurant(db: Session, user_id: int):
     """
@@ -93,6 +227,23 @@ def get_restaurant(db: Session, user_id: int):
     return db.query(models.Restaurant).filter(models.Restaurant.user_id == user_id).first()
 
 
+def get_restaurant_version(db: Session, user_id: int):
+    """
+        Retrieves the version of a user's restaurant, without loading the restaurant.
+
+        The restaurant's updated_at changes whenever the restaurant or its logo variants do,
+        and it is read from the user_id index.
+
+        :param db: Database session.
+        :param user_id: ID of the user owning the restaurant.
+        :return: Row of (id, updated_at), or None if the user has no restaurant.
+    """
+    return db.execute(
+        select(models.Restaurant.id, models.Restaurant.updated_at)
+        .where(models.Restaurant.user_id == user_id)
+    ).first()
+
+
 # Restaurant related operation
 def get_restaurant_by_id(db: Session, restaurant_id: int):
     """
@@ -106,77 +257,244 @@ def get_restaurant_by_id(db: Session, restaurant_id: int):
     return db.query(models.Restaurant).filter(models.Restaurant.id == restaurant_id).first()
 
 
+def touch_restaurant(db: Session, restaurant_id: int):
+    """
+        Sets the updated_at of a restaurant to now, without committing.
+
+        Deleting items leaves no row whose updated_at could change, so deletions are
+        recorded on their restaurant instead.
+
+        :param db: Database session.
+        :param restaurant_id: ID of the restaurant.
+    """
+    db.execute(
+        update(models.Restaurant).where(models.Restaurant.id == restaurant_id)
+        .values(updated_at=utcnow()),
+        execution_options={"synchronize_session": False}
+    )
+
+
 def update_restaurant(db: Session, user_id: int, data: schema.RestaurantSchema):
     """
         Updates or creates a restaurant.
 
+        The restaurant is updated with a single UPDATE ... RETURNING statement,
+        and only created (INSERT ... RETURNING) if the update matched no row.
+        Optional fields left unset in the data keep their current value. A new logo
+        clears the variants of the previous one.
+
         :param db: Database session.
         :param user_id: ID of the user owning the restaurant.
         :param data: Data to update or create the restaurant.
         :return: Updated or created restaurant object.
     """
-    # noinspection PyTypeChecker
-    restaurant = db.query(models.Restaurant).filter(models.Restaurant.user_id == user_id).first()
-    if restaurant:
-        for key, value in data.dict().items():
-            setattr(restaurant, key, value)
-    else:
-        restaurant = models.Restaurant(**data.dict(), user_id=user_id)
-    db.add(restaurant)
+    values = data.dict(exclude_unset=True)
+    if "logo" in values:
+        values["logo_variants"] = None
+    restaurant = db.scalar(
+        update(models.Restaurant).where(models.Restaurant.user_id == user_id)
+        .values(values).returning(models.Restaurant)
+    )
+    if not restaurant:
+        restaurant = db.scalar(
+            insert(models.Restaurant).values(**values, user_id=user_id).returning(models.Restaurant)
+        )
     db.commit()
-    db.refresh(restaurant)
+    response_cache.invalidate(restaurant.id)
     return restaurant
 
 
+def set_restaurant_logo_variants(db: Session, restaurant_id: int, logo: str, variants: dict):
+    """
+        Records the resized versions of a restaurant logo.
+
+        Nothing is recorded if the restaurant got another logo meanwhile.
+
+        :param db: Database session.
+        :param restaurant_id: ID of the restaurant.
+        :param logo: Path of the logo the variants were generated from.
+        :param variants: Dictionary of size name -> path of the variant.
+        :return: True if the restaurant was updated, otherwise False.
+    """
+    updated = db.scalar(
+        update(models.Restaurant)
+        .where(models.Restaurant.id == restaurant_id, models.Restaurant.logo == logo)
+        .values(logo_variants=variants).returning(models.Restaurant.id)
+    )
+    db.commit()
+    if updated is None:
+        return False
+    response_cache.invalidate(restaurant_id)
+    return True
+
+
 # Item related operation
-def get_items(db: Session, restaurant_id: int):
+def get_items(db: Session, restaurant_id: int, filters: schema.ItemFilterSchema = None,
+              cursor: str = None, limit: int = 50):
     """
-        Retrieves items for a restaurant.
+        Retrieves a page of items for a restaurant.
+
+        Only the columns are fetched, the rows are read-only named tuples rather than ORM
+        objects, which is all the response serialization needs.
 
         :param db: Database session.
         :param restaurant_id: ID of the restaurant.
-        :return: List of item objects.
+        :param filters: Optional filters and sort of the items.
+        :param cursor: Cursor of the requested page, None for the first page.
+        :param limit: Maximum number of items to retrieve.
+        :return: Page of item rows.
+        :raises ValueError: If the cursor is invalid.
     """
-    # noinspection PyTypeChecker
-    return db.query(models.Item).filter(models.Item.restaurant_id == restaurant_id).all()
+    filters = filters or schema.ItemFilterSchema()
+    statement = select(*models.Item.__table__.columns).where(
+        models.Item.restaurant_id == restaurant_id
+    )
+    if filters.is_active is not None:
+        statement = statement.where(models.Item.is_active == filters.is_active)
+    if filters.min_price is not None:
+        statement = statement.where(models.Item.price >= filters.min_price)
+    if filters.max_price is not None:
+        statement = statement.where(models.Item.price <= filters.max_price)
+    sort = filters.sort.value
+    return pagination.paginate(
+        db, statement, sort, getattr(models.Item, sort.lstrip("-")), models.Item.id,
+        cursor, limit, descending=sort.startswith("-"), scalars=False
+    )
 
 
 def create_item(db: Session, data: schema.CreateItemSchema):
     """
-       Creates an item.
+       Creates an item with a single INSERT ... RETURNING statement.
 
        :param db: Database session.
        :param data: Data to create the item.
        :return: Created item object.
     """
-    item = models.Item(**data.dict())
-    db.add(item)
+    item = db.scalar(insert(models.Item).values(**data.dict()).returning(models.Item))
     db.commit()
-    db.refresh(item)
+    response_cache.invalidate(item.restaurant_id)
     return item
 
 
+def iter_item_batches(db: Session, restaurant_id: int = None, batch_size: int = 1000):
+    """
+        Iterates over the items of a restaurant, or of all restaurants, in batches.
+
+        The rows are fetched from the cursor batch by batch (yield_per) as the iteration goes,
+        so memory use is bounded by the batch size and not by the number of items.
+
+        :param db: Database session, used by a single statement until the iteration ends.
+        :param restaurant_id: ID of the restaurant, None for the items of all restaurants.
+        :param batch_size: Number of rows fetched at a time.
+        :yield: Lists of item rows (columns only), ordered by ID.
+    """
+    statement = select(*models.Item.__table__.columns).order_by(models.Item.id)
+    if restaurant_id is not None:
+        statement = statement.where(models.Item.restaurant_id == restaurant_id)
+    yield from db.execute(statement, execution_options={"yield_per": batch_size}).partitions()
+
+
+def get_existing_restaurant_ids(db: Session, restaurant_ids: set):
+    """
+        Retrieves which of the given restaurant IDs exist.
+
+        :param db: Database session.
+        :param restaurant_ids: Restaurant IDs to look up.
+        :return: Set of the existing restaurant IDs.
+    """
+    return set(db.scalars(
+        select(models.Restaurant.id).where(models.Restaurant.id.in_(restaurant_ids))
+    ))
+
+
+def bulk_create_items(db: Session, rows: list):
+    """
+       Creates many items with a single multi-row INSERT and commits them.
+
+       :param db: Database session.
+       :param rows: List of dictionaries with the fields of schema.ItemDataSchema.
+       :return: Number of created items.
+    """
+    if not rows:
+        return 0
+    db.execute(insert(models.Item).values(rows))
+    db.commit()
+    for restaurant_id in {row["restaurant_id"] for row in rows}:
+        response_cache.invalidate(restaurant_id)
+    return len(rows)
+
+
 def update_item(db: Session, item_id: int, data: schema.UpdateItemSchema):
     """
-        Updates an item.
+        Updates an item with a single UPDATE ... RETURNING statement.
+
+        The variants of the previous image are cleared, as the image is replaced.
 
         :param db: Database session.
         :param item_id: ID of the item to update.
         :param data: Data to update the item.
         :return: Updated item object if found, otherwise None.
     """
-    # noinspection PyTypeChecker
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
-    if not item:
-        return None
-    for key, value in data.dict().items():
-        setattr(item, key, value)
-    db.add(item)
+    item = db.scalar(
+        update(models.Item).where(models.Item.id == item_id)
+        .values(**data.dict(), image_variants=None).returning(models.Item)
+    )
     db.commit()
-    db.refresh(item)
+    if item:
+        response_cache.invalidate(item.restaurant_id)
     return item
 
 
+def set_item_image_variants(db: Session, item_id: int, image: str, variants: dict):
+    """
+        Records the resized versions of an item image.
+
+        Nothing is recorded if the item got another image meanwhile.
+
+        :param db: Database session.
+        :param item_id: ID of the item.
+        :param image: Path of the image the variants were generated from.
+        :param variants: Dictionary of size name -> path of the variant.
+        :return: True if the item was updated, otherwise False.
+    """
+    updated = db.execute(
+        update(models.Item).where(models.Item.id == item_id, models.Item.image == image)
+        .values(image_variants=variants).returning(models.Item.restaurant_id)
+    ).first()
+    db.commit()
+    if updated is None:
+        return False
+    response_cache.invalidate(updated.restaurant_id)
+    return True
+
+
+def update_items(db: Session, restaurant_id: int, data: schema.BatchUpdateItemSchema):
+    """
+        Applies a partial update to many items of a restaurant with a single UPDATE statement.
+
+        :param db: Database session.
+        :param restaurant_id: ID of the restaurant owning the items.
+        :param data: Changes to apply and the IDs of the items to change.
+        :return: List of the updated item rows.
+    """
+    values = {
+        key: value for key, value in data.dict(include={"price", "cost", "is_active"}).items()
+        if value is not None
+    }
+    if data.price_change_percent is not None:
+        values["price"] = func.round(models.Item.price * (1 + data.price_change_percent / 100), 2)
+    statement = update(models.Item).where(models.Item.restaurant_id == restaurant_id)
+    if data.item_ids:
+        statement = statement.where(models.Item.id.in_(data.item_ids))
+    rows = db.execute(
+        statement.values(values).returning(*models.Item.__table__.columns),
+        execution_options={"synchronize_session": False}
+    ).all()
+    db.commit()
+    response_cache.invalidate(restaurant_id)
+    return rows
+
+
 def delete_item(db: Session, item_id: int):
     """
         Deletes an item.
@@ -185,24 +503,89 @@ def delete_item(db: Session, item_id: int):
         :param item_id: ID of the item to delete.
         :return: True if item was deleted successfully, otherwise False.
     """
-    # noinspection PyTypeChecker
-    item = db.query(models.Item).filter(models.Item.id == item_id).first()
-    if not item:
+    deleted = db.execute(
+        delete(models.Item).where(models.Item.id == item_id).returning(models.Item.restaurant_id)
+    ).first()
+    if not deleted:
         return False
-    db.delete(item)
+    if deleted.restaurant_id is not None:
+        touch_restaurant(db, deleted.restaurant_id)
     db.commit()
+    response_cache.invalidate(deleted.restaurant_id)
     return True
 
 
-def delete_all_item(db: Session):
+def count_items(db: Session, restaurant_id: int, is_active: bool = None):
     """
-        Deletes all the items.
+        Counts the items of a restaurant.
 
         :param db: Database session.
-        :return: True if all items were deleted successfully, otherwise False.
+        :param restaurant_id: ID of the restaurant.
+        :param is_active: Only count active (True) or inactive (False) items when given.
+        :return: Number of items.
     """
-    items = db.query(models.Item).all()
-    for item in items:
-        db.delete(item)
+    statement = select(func.count()).select_from(models.Item).where(
+        models.Item.restaurant_id == restaurant_id
+    )
+    if is_active is not None:
+        statement = statement.where(models.Item.is_active == is_active)
+    return db.scalar(statement)
+
+
+def get_menu_version(db: Session, restaurant_id: int):
+    """
+        Retrieves the version of a restaurant's items with a single aggregate query.
+
+        The count and max(id) change when items are created or deleted, max(updated_at)
+        when they are updated, and the restaurant's updated_at when they are deleted, so
+        together they change whenever the menu does. No item row is loaded, the aggregate
+        is read from the (restaurant_id, updated_at) index.
+
+        :param db: Database session.
+        :param restaurant_id: ID of the restaurant.
+        :return: Row of (count, max_id, items_updated_at, restaurant_updated_at),
+        or None if the restaurant does not exist.
+    """
+    items = (
+        select(
+            func.count(models.Item.id).label("count"),
+            func.max(models.Item.id).label("max_id"),
+            func.max(models.Item.updated_at).label("updated_at"),
+        )
+        .where(models.Item.restaurant_id == restaurant_id)
+        .subquery()
+    )
+    return db.execute(
+        select(items.c.count, items.c.max_id, items.c.updated_at.label("items_updated_at"),
+               models.Restaurant.updated_at.label("restaurant_updated_at"))
+        .join_from(models.Restaurant, items, true())
+        .where(models.Restaurant.id == restaurant_id)
+    ).first()
+
+
+def delete_all_item(db: Session, restaurant_id: int, is_active: bool = None, limit: int = None):
+    """
+        Deletes the items of a restaurant with a single DELETE statement.
+
+        :param db: Database session.
+        :param restaurant_id: ID of the restaurant.
+        :param is_active: Only delete active (True) or inactive (False) items when given.
+        :param limit: Maximum number of items deleted, all matching items when omitted.
+        :return: Number of deleted items.
+    """
+    conditions = [models.Item.restaurant_id == restaurant_id]
+    if is_active is not None:
+        conditions.append(models.Item.is_active == is_active)
+    statement = delete(models.Item)
+    if limit:
+        batch_ids = select(models.Item.id).where(*conditions).limit(limit)
+        statement = statement.where(models.Item.id.in_(batch_ids))
+    else:
+        statement = statement.where(*conditions)
+    result = db.execute(statement)
+    if result.rowcount:
+        touch_restaurant(db, restaurant_id)
     db.commit()
-    return True
+    if result.rowcount:
+        response_cache.invalidate(restaurant_id)
+    return result.rowcount
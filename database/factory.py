@@ -1,15 +1,170 @@
-from sqlalchemy import create_engine, Column, DateTime
+import datetime
+import itertools
+
+from sqlalchemy import create_engine, event, inspect, text, Column, DateTime
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.sql import func, sqltypes
+from starlette.requests import Request
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///database.db"
+from database import instrumentation
+from utils import settings
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL
+
+
+def engine_options(url: str):
+    """
+        Builds the create_engine keyword arguments for a database URL from the settings.
+
+        :param url: Database URL.
+        :return: Dictionary of engine options.
+    """
+    url = make_url(url)
+    options = {"pool_pre_ping": settings.DATABASE_POOL_PRE_PING}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases live in a single connection, they have no pool to size
+            return options
+    options.update(
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+    )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, _connection_record):
+    """
+        Applies the configured pragmas to a new SQLite connection.
+
+        WAL lets readers run concurrently with a writer, and busy_timeout makes a writer
+        wait for the lock instead of failing with "database is locked".
+
+        :param dbapi_connection: Raw DBAPI connection.
+        :param _connection_record: Pool connection record (unused).
+    """
+    cursor = dbapi_connection.cursor()
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def set_sqlite_query_only(dbapi_connection, _connection_record):
+    """
+        Makes a SQLite connection read-only.
+
+        :param dbapi_connection: Raw DBAPI connection.
+        :param _connection_record: Pool connection record (unused).
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def build_engine(url: str, read_only: bool = False):
+    """
+        Creates an engine for a database URL with the configured pool and pragmas.
+
+        :param url: Database URL.
+        :param read_only: Whether SQLite connections are opened in query_only mode.
+        :return: Engine.
+    """
+    new_engine = create_engine(url, **engine_options(url))
+    instrumentation.instrument_engine(new_engine)
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine, "connect", set_sqlite_pragmas)
+        if read_only:
+            event.listen(new_engine, "connect", set_sqlite_query_only)
+    return new_engine
+
+
+def build_async_engine(url: str, read_only: bool = False):
+    """
+        Creates an async engine for a database URL with the configured pool and pragmas.
+
+        :param url: Async database URL.
+        :param read_only: Whether SQLite connections are opened in query_only mode.
+        :return: Async engine.
+    """
+    options = engine_options(url)
+    if "pool_size" in options:
+        # aiosqlite defaults to NullPool, a queue pool keeps connections (and their pragmas) alive
+        options["poolclass"] = AsyncAdaptedQueuePool
+    new_engine = create_async_engine(url, **options)
+    instrumentation.instrument_engine(new_engine.sync_engine)
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", set_sqlite_pragmas)
+        if read_only:
+            event.listen(new_engine.sync_engine, "connect", set_sqlite_query_only)
+    return new_engine
+
+
+def build_read_engines(primary_url: str, replica_urls: list, builder):
+    """
+        Creates the engines serving read sessions.
+
+        Without replicas a SQLite file primary gets its own query_only pool, which WAL lets
+        read alongside the writer, any other primary serves reads itself (None is returned).
+
+        :param primary_url: URL of the primary database.
+        :param replica_urls: URLs of the read replicas.
+        :param builder: build_engine or build_async_engine.
+        :return: List of read engines, or None if reads use the primary engine.
+    """
+    if replica_urls:
+        return [builder(url, read_only=True) for url in replica_urls]
+    url = make_url(primary_url)
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        return [builder(primary_url, read_only=True)]
+    return None
+
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
+# Objects are not expired on commit, so reading them afterwards does not reload them
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
+instrumentation.instrument_models(Base)
+read_engines = build_read_engines(
+    SQLALCHEMY_DATABASE_URL, settings.DATABASE_READ_URLS, build_engine
+) or [engine]
+_read_engine_cycle = itertools.cycle(read_engines)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+# The async engines need the async driver, so they are only created when enabled
+async_engine = (
+    build_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL) if settings.DATABASE_ASYNC else None
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+async_read_engines = (build_read_engines(
+    SQLALCHEMY_ASYNC_DATABASE_URL, settings.ASYNC_DATABASE_READ_URLS, build_async_engine
+) or [async_engine]) if settings.DATABASE_ASYNC else []
+_async_read_engine_cycle = itertools.cycle(async_read_engines)
+AsyncReadSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+# HTTP methods served by read sessions
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def utcnow():
+    """
+        Returns the current UTC time, with microseconds.
+
+        Used for updated_at on updates: the database CURRENT_TIMESTAMP only has a precision of
+        a second, so two updates within the same second would leave the same updated_at,
+        and the validators of the cached representations would not change.
+
+        :return: Naive datetime in UTC, like CURRENT_TIMESTAMP.
+    """
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
 
 
 class BaseModel(Base):
@@ -25,12 +180,89 @@ class BaseModel(Base):
     __abstract__ = True
     id = Column(sqltypes.Integer, primary_key=True, index=True, autoincrement=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=utcnow)
+
+
+def add_missing_columns(bind):
+    """
+        Adds the nullable columns of the models that are missing from existing tables.
+
+        create_all only creates missing tables, so a nullable column added to an existing
+        model is added here with ALTER TABLE. Other schema changes still need a migration.
+
+        :param bind: Engine or connection to update the schema on.
+    """
+    inspector = inspect(bind)
+    preparer = bind.dialect.identifier_preparer
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        statements.extend(
+            f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+            f"{preparer.format_column(column)} {column.type.compile(bind.dialect)}"
+            for column in table.columns if column.name not in existing and column.nullable
+        )
+    if statements:
+        with bind.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+
+
+def init_db(bind):
+    """
+        Creates all tables and indexes defined in the Base metadata.
+
+        Tables are created by create_all, which skips the columns and indexes of tables that
+        already exist, so columns and indexes added to existing models are created separately.
+
+        :param bind: Engine to create the schema on.
+    """
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
 
 
-def get_db():
+def read_session():
     """
-        Provides a database session for the application.
+        Creates a session on the next read engine (round robin).
+
+        :return: Database session for read-only work.
+    """
+    return ReadSessionLocal(bind=next(_read_engine_cycle))
+
+
+def async_read_session():
+    """
+        Creates an async session on the next async read engine (round robin).
+
+        :return: Async database session for read-only work.
+    """
+    return AsyncReadSessionLocal(bind=next(_async_read_engine_cycle))
+
+
+def use_primary(request: Request):
+    """
+        Tells whether a request must be served by the primary database.
+
+        Requests with a write method go to the primary, and so do reads sent with the
+        "X-Read-Your-Writes: true" header, for clients that must see their own writes
+        before they reach the replicas.
+
+        :param request: Incoming HTTP request.
+        :return: True if the request needs a primary session.
+    """
+    if request.method not in READ_METHODS:
+        return True
+    return request.headers.get("X-Read-Your-Writes", "").lower() in ("1", "true")
+
+
+def get_write_db():
+    """
+        Provides a database session on the primary database.
 
         This function yields a database session using the SessionLocal context manager.
         It ensures that the session is closed properly after its use.
@@ -42,3 +274,72 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """
+        Provides a read-only database session on a read replica.
+
+        :yield: Database session.
+    """
+    db = read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_db(request: Request):
+    """
+        Provides a database session routed by the request method.
+
+        Reads get a read session and writes a primary session, see use_primary.
+
+        :param request: Incoming HTTP request.
+        :yield: Database session.
+    """
+    db = SessionLocal() if use_primary(request) else read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_write_db():
+    """
+        Provides an async database session on the primary database.
+
+        Objects are not expired on commit, so their attributes can be read
+        after the session is committed without an implicit (blocking) reload.
+
+        :yield: Async database session.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """
+        Provides a read-only async database session on a read replica.
+
+        :yield: Async database session.
+    """
+    async with async_read_session() as db:
+        yield db
+
+
+async def get_async_db(request: Request):
+    """
+        Provides an async database session routed by the request method, see get_db.
+
+        :param request: Incoming HTTP request.
+        :yield: Async database session.
+    """
+    async with (AsyncSessionLocal() if use_primary(request) else async_read_session()) as db:
+        yield db
+
+
+# Session dependencies used by the endpoints, selected by DATABASE_ASYNC
+get_session = get_async_db if settings.DATABASE_ASYNC else get_db
+get_write_session = get_async_write_db if settings.DATABASE_ASYNC else get_write_db
+get_read_session = get_async_read_db if settings.DATABASE_ASYNC else get_read_db
@@ -0,0 +1,173 @@
+"""Python 3.11"""
+import math
+
+from sqlalchemy import and_, column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from . import models
+
+EARTH_RADIUS_KM = 6371.0088
+# Longest distance between two points of the earth
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# R*Tree index of the restaurant coordinates, every restaurant is a point (min == max)
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_rtree
+USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+"""
+
+CREATE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_rtree_ai AFTER INSERT ON restaurants
+    WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN
+        INSERT INTO restaurants_rtree
+        VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_rtree_ad AFTER DELETE ON restaurants BEGIN
+        DELETE FROM restaurants_rtree WHERE id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS restaurants_rtree_au
+    AFTER UPDATE OF latitude, longitude ON restaurants BEGIN
+        DELETE FROM restaurants_rtree WHERE id = old.id;
+        INSERT INTO restaurants_rtree
+        SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude
+        WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;
+    END
+    """,
+)
+
+FILL_TABLE = """
+INSERT OR REPLACE INTO restaurants_rtree
+SELECT id, latitude, latitude, longitude, longitude FROM restaurants
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+"""
+
+restaurants_rtree = table(
+    "restaurants_rtree",
+    column("id"), column("min_lat"), column("max_lat"), column("min_lon"), column("max_lon")
+)
+
+
+def create_index(bind):
+    """
+        Creates the spatial index of the restaurants and the triggers keeping it in sync.
+
+        The index is filled from the existing restaurants when it is created. Other databases
+        than SQLite have no R*Tree module, nothing is created for them.
+
+        :param bind: Engine to create the index on.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'restaurants_rtree'"
+        )).first()
+        conn.execute(text(CREATE_TABLE))
+        for statement in CREATE_TRIGGERS:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text(FILL_TABLE))
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float):
+    """
+        Computes the great-circle distance between two points (haversine formula).
+
+        :param lat1: Latitude of the first point in degrees.
+        :param lon1: Longitude of the first point in degrees.
+        :param lat2: Latitude of the second point in degrees.
+        :param lon2: Longitude of the second point in degrees.
+        :return: Distance in kilometers.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float):
+    """
+        Computes the latitude/longitude box containing a circle.
+
+        :param lat: Latitude of the center in degrees.
+        :param lon: Longitude of the center in degrees.
+        :param radius_km: Radius of the circle in kilometers.
+        :return: Tuple of (min_lat, max_lat, longitude ranges), the longitude ranges are split
+        in two when the box crosses the antimeridian.
+    """
+    d_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90 or radius_km >= MAX_DISTANCE_KM / 2:
+        # The circle contains a pole (or a whole hemisphere), so every longitude
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+    d_lon = math.degrees(math.asin(
+        min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))
+    ))
+    min_lon, max_lon = lon - d_lon, lon + d_lon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def _within(db: Session, lat: float, lon: float, radius_km: float):
+    """
+        Retrieves the restaurants within a radius, using the R*Tree for the bounding box.
+
+        :param db: Database session.
+        :param lat: Latitude of the center in degrees.
+        :param lon: Longitude of the center in degrees.
+        :param radius_km: Radius in kilometers.
+        :return: List of (restaurant, distance in km) tuples, nearest first.
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+    statement = (
+        select(models.Restaurant)
+        .join(restaurants_rtree, restaurants_rtree.c.id == models.Restaurant.id)
+        .where(
+            restaurants_rtree.c.max_lat >= min_lat, restaurants_rtree.c.min_lat <= max_lat,
+            or_(*(and_(restaurants_rtree.c.max_lon >= low, restaurants_rtree.c.min_lon <= high)
+                  for low, high in lon_ranges))
+        )
+    )
+    found = []
+    for restaurant in db.scalars(statement):
+        distance = distance_km(lat, lon, restaurant.latitude, restaurant.longitude)
+        if distance <= radius_km:
+            found.append((restaurant, distance))
+    found.sort(key=lambda pair: (pair[1], pair[0].id))
+    return found
+
+
+def nearest_restaurants(db: Session, lat: float, lon: float, limit: int = 10,
+                        radius_km: float = None, initial_radius_km: float = 5.0):
+    """
+        Retrieves the restaurants nearest to a point.
+
+        With a radius, only the restaurants within it are returned. Without one, the search
+        starts with initial_radius_km and widens it until enough restaurants are found, so
+        only the neighbourhood of the point is read from the index rather than every row.
+
+        :param db: Database session.
+        :param lat: Latitude of the point in degrees.
+        :param lon: Longitude of the point in degrees.
+        :param limit: Maximum number of restaurants to return.
+        :param radius_km: Maximum distance in kilometers, None for the k nearest at any distance.
+        :param initial_radius_km: Radius of the first search when no radius is given.
+        :return: List of (restaurant, distance in km) tuples, nearest first.
+    """
+    if radius_km is not None:
+        return _within(db, lat, lon, min(radius_km, MAX_DISTANCE_KM))[:limit]
+    radius = initial_radius_km
+    while True:
+        found = _within(db, lat, lon, radius)
+        if len(found) >= limit or radius >= MAX_DISTANCE_KM:
+            return found[:limit]
+        radius = min(radius * 4, MAX_DISTANCE_KM)
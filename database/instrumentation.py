@@ -0,0 +1,125 @@
+"""Python 3.11"""
+import contextvars
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+
+
+@dataclass
+class QueryStats:
+    """
+    SQL statistics of one unit of work, usually a request.
+
+    Args:
+        statements (int): Number of statements sent to the database.
+        duration (float): Seconds spent executing the statements.
+        rows (int): Rows changed by writes plus ORM objects loaded by reads.
+        shapes (Counter): Number of executions of every statement text.
+    """
+    statements: int = 0
+    duration: float = 0.0
+    rows: int = 0
+    shapes: Counter = field(default_factory=Counter)
+
+    def repeated(self, threshold: int):
+        """
+            Returns the statements executed at least threshold times, likely N+1 patterns.
+
+            :param threshold: Minimum number of executions of a statement.
+            :return: List of (statement, executions) tuples, most executed first.
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+# Statistics of the running request, None outside of a request
+_current: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar(
+    "query_stats", default=None
+)
+
+
+def start():
+    """
+        Starts collecting statistics for the current context.
+
+        The statistics object is shared with the threadpool and the async driver greenlets,
+        which run with a copy of the context.
+
+        :return: Tuple of (QueryStats, token to pass to stop).
+    """
+    stats = QueryStats()
+    return stats, _current.set(stats)
+
+
+def stop(token: contextvars.Token):
+    """
+        Stops collecting statistics for the current context.
+
+        :param token: Token returned by start.
+    """
+    _current.reset(token)
+
+
+def current():
+    """
+        Returns the statistics of the current context.
+
+        :return: QueryStats object, or None if no collection is running.
+    """
+    return _current.get()
+
+
+def _before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    """
+        Stores the start time of a statement on its connection.
+    """
+    if _current.get() is not None:
+        conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, _parameters, _context, _executemany):
+    """
+        Adds an executed statement to the statistics of the current context.
+    """
+    stats = _current.get()
+    started = conn.info.pop("query_started", None)
+    if stats is None or started is None:
+        return
+    stats.statements += 1
+    stats.duration += time.perf_counter() - started
+    stats.shapes[statement] += 1
+    if cursor.description is None and cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+def _on_load(_target, _context):
+    """
+        Counts an ORM object loaded from a row.
+    """
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += 1
+
+
+def instrument_engine(engine):
+    """
+        Registers the statement counters on an engine.
+
+        :param engine: Engine, or the sync_engine of an async engine.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def instrument_models(base):
+    """
+        Counts the ORM objects loaded for the models of a declarative base.
+
+        The DBAPI cursor does not tell how many rows a SELECT returned before they are fetched,
+        so reads are counted as the objects built from their rows.
+
+        :param base: Declarative base of the models.
+    """
+    event.listen(base, "load", _on_load, propagate=True)
@@ -0,0 +1,133 @@
+"""Python 3.11"""
+import datetime
+
+from sqlalchemy import case, delete, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .factory import utcnow
+
+# Reference counting of the stored media files. Only paths registered by register() are counted,
+# so the default images and the files stored before the media store are never collected.
+CREATE_TRIGGERS = tuple(
+    statement.format(table=table, column=column)
+    for table, column in (("items", "image"), ("restaurants", "logo"))
+    for statement in (
+        """
+        CREATE TRIGGER IF NOT EXISTS {table}_{column}_refcount_ai AFTER INSERT ON {table} BEGIN
+            UPDATE media_blobs SET refcount = refcount + 1, unreferenced_since = NULL
+            WHERE path = new.{column};
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {table}_{column}_refcount_ad AFTER DELETE ON {table} BEGIN
+            UPDATE media_blobs SET refcount = refcount - 1, unreferenced_since = CASE
+                WHEN refcount = 1 THEN CURRENT_TIMESTAMP ELSE unreferenced_since END
+            WHERE path = old.{column};
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS {table}_{column}_refcount_au
+        AFTER UPDATE OF {column} ON {table}
+        WHEN old.{column} IS NOT new.{column} BEGIN
+            UPDATE media_blobs SET refcount = refcount - 1, unreferenced_since = CASE
+                WHEN refcount = 1 THEN CURRENT_TIMESTAMP ELSE unreferenced_since END
+            WHERE path = old.{column};
+            UPDATE media_blobs SET refcount = refcount + 1, unreferenced_since = NULL
+            WHERE path = new.{column};
+        END
+        """,
+    )
+)
+
+
+def create_triggers(bind):
+    """
+        Creates the triggers keeping the reference counts of the media files up to date.
+
+        Only SQLite is supported. On other databases the reference counts never move, and
+        background.collect_media_garbage leaves their files alone.
+
+        :param bind: Engine to create the triggers on.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        for statement in CREATE_TRIGGERS:
+            conn.execute(text(statement))
+
+
+def register(db: Session, path: str, size: int):
+    """
+        Registers a stored file, without committing.
+
+        A new file starts unreferenced, and the grace period of an unreferenced file starts
+        again, so it is not collected before the row using it is written. The first statement
+        is a write, which locks the row (the database for SQLite) until the transaction ends,
+        so the file can be put in place before a concurrent collection sees the row. It must
+        be the first statement of the transaction, which is rolled back on a concurrent insert.
+
+        :param db: Database session.
+        :param path: Path of the file.
+        :param size: Size of the file in bytes.
+        :return: True if the file was already registered.
+    """
+    now = utcnow()
+    touch = (
+        update(models.MediaBlob).where(models.MediaBlob.path == path)
+        .values(unreferenced_since=case((models.MediaBlob.refcount == 0, now),
+                                        else_=models.MediaBlob.unreferenced_since))
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(touch).rowcount:
+        return True
+    try:
+        db.execute(insert(models.MediaBlob).values(
+            path=path, size=size, refcount=0, unreferenced_since=now
+        ))
+    except IntegrityError:
+        # Registered by a concurrent upload after the update, which now holds the row
+        db.rollback()
+        db.execute(touch)
+        return True
+    return False
+
+
+def collectable(db: Session, grace: datetime.timedelta, limit: int = 500):
+    """
+        Lists the files unreferenced for longer than the grace period.
+
+        :param db: Database session.
+        :param grace: Grace period.
+        :param limit: Maximum number of paths returned.
+        :return: List of paths.
+    """
+    return list(db.scalars(
+        select(models.MediaBlob.path)
+        .where(models.MediaBlob.refcount == 0,
+               models.MediaBlob.unreferenced_since < utcnow() - grace)
+        .order_by(models.MediaBlob.unreferenced_since).limit(limit)
+    ))
+
+
+def forget(db: Session, path: str, grace: datetime.timedelta):
+    """
+        Unregisters a file if it is still unreferenced for longer than the grace period,
+        without committing.
+
+        The row stays locked until the transaction ends, so the file must be deleted before
+        committing, and a concurrent upload of the same content waits for both.
+
+        :param db: Database session.
+        :param path: Path of the file.
+        :param grace: Grace period.
+        :return: True if the file was unregistered and can be deleted.
+    """
+    result = db.execute(
+        delete(models.MediaBlob).where(
+            models.MediaBlob.path == path, models.MediaBlob.refcount == 0,
+            models.MediaBlob.unreferenced_since < utcnow() - grace
+        ).execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
@@ -1,12 +1,10 @@
-from passlib.context import CryptContext
-from sqlalchemy import Boolean, Column, ForeignKey
+from sqlalchemy import Boolean, Column, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import sqltypes
 
+from utils import hashing
 from .factory import BaseModel
 
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
-
 
 class User(BaseModel):
     """
@@ -36,16 +34,44 @@ class User(BaseModel):
 
             :param password: Password to be saved.
         """
-        self.hashed_password = pwd_context.hash(password)
+        self.hashed_password = hashing.hash_password(password)
 
     def varify_password(self, password):
         """
             Verifies the provided password against the stored hashed password.
 
+            If the stored hash uses outdated parameters it is replaced by a fresh hash,
+            which is persisted with the next commit of the session.
+
             :param password: Password to be verified.
             :return: True if the password matches, otherwise False.
         """
-        return pwd_context.verify(password, self.hashed_password)
+        valid, new_hash = hashing.verify_password(password, self.hashed_password)
+        if new_hash:
+            self.hashed_password = new_hash
+        return valid
+
+    async def save_password_async(self, password):
+        """
+            Hashes and saves the user's password on the hashing executor.
+
+            :param password: Password to be saved.
+        """
+        self.hashed_password = await hashing.run(hashing.hash_password, password)
+
+    async def varify_password_async(self, password):
+        """
+            Verifies the provided password on the hashing executor.
+
+            Behaves like varify_password, including the rehash of outdated hashes.
+
+            :param password: Password to be verified.
+            :return: True if the password matches, otherwise False.
+        """
+        valid, new_hash = await hashing.run(hashing.verify_password, password, self.hashed_password)
+        if new_hash:
+            self.hashed_password = new_hash
+        return valid
 
 
 class Token(BaseModel):
@@ -60,13 +86,36 @@ class Token(BaseModel):
         :ivar expiry: Expiry date of the token.
     """
     __tablename__ = "tokens"
+    __table_args__ = (
+        Index("ix_tokens_token_expiry", "token", "expiry"),
+        Index("ix_tokens_expiry", "expiry"),
+    )
     user_id = Column(sqltypes.Integer, ForeignKey("users.id"))
-    token = Column(sqltypes.String(30), index=True, nullable=False)
+    token = Column(sqltypes.String(255), nullable=False)
     expiry = Column(sqltypes.DATETIME, nullable=False)
 
     user = relationship("User", back_populates="tokens")
 
 
+class RevokedToken(BaseModel):
+    """
+        Model representing a revoked signed token.
+
+        Signed tokens are validated without the tokens table, so their revocations are kept
+        here until the token itself expires, and every worker copies them to its in-process
+        revocation list, see background.refresh_revocations.
+
+        :ivar signature: Signature of the revoked token.
+        :ivar expiry: Expiry date of the revoked token, the row can be deleted after it.
+    """
+    __tablename__ = "revoked_tokens"
+    __table_args__ = (
+        Index("ix_revoked_tokens_expiry", "expiry"),
+    )
+    signature = Column(sqltypes.String(64), nullable=False, unique=True)
+    expiry = Column(sqltypes.DATETIME, nullable=False)
+
+
 class Restaurant(BaseModel):
     """
         Model representing a restaurant.
@@ -82,10 +131,14 @@ class Restaurant(BaseModel):
         :ivar opening_time: Opening time of the restaurant.
         :ivar closing_time: Closing time of the restaurant.
         :ivar logo: URL to the restaurant's logo image.
+        :ivar logo_variants: Resized WebP versions of the logo, size name -> URL, filled in
+        the background.
+        :ivar latitude: Latitude of the restaurant in degrees, indexed in restaurants_rtree.
+        :ivar longitude: Longitude of the restaurant in degrees, indexed in restaurants_rtree.
         :ivar items: Relationship with Item model.
     """
     __tablename__ = "restaurants"
-    user_id = Column(sqltypes.Integer, ForeignKey("users.id"))
+    user_id = Column(sqltypes.Integer, ForeignKey("users.id"), index=True)
     name = Column(sqltypes.String(30), nullable=False)
     email = Column(sqltypes.String(30), nullable=False)
     mobile = Column(sqltypes.String(30), nullable=False)
@@ -93,6 +146,9 @@ class Restaurant(BaseModel):
     opening_time = Column(sqltypes.String(30))
     closing_time = Column(sqltypes.String(30))
     logo = Column(sqltypes.String(100), default='media/default.png')
+    logo_variants = Column(sqltypes.JSON, nullable=True)
+    latitude = Column(sqltypes.Float, nullable=True)
+    longitude = Column(sqltypes.Float, nullable=True)
 
     items = relationship("Item", back_populates="restaurant")
 
@@ -107,6 +163,8 @@ class Item(BaseModel):
         :ivar restaurant_id: ID of the restaurant to which the item belongs.
         :ivar name: Name of the item.
         :ivar image: URL to the item's image.
+        :ivar image_variants: Resized WebP versions of the image, size name -> URL, filled in
+        the background.
         :ivar description: Description of the item.
         :ivar cost: Cost of the item.
         :ivar price: Price of the item.
@@ -114,12 +172,55 @@ class Item(BaseModel):
         :ivar restaurant: Relationship with Restaurant model.
     """
     __tablename__ = "items"
+    __table_args__ = (
+        Index("ix_items_restaurant_id_id", "restaurant_id", "id"),
+        Index("ix_items_restaurant_id_price_id", "restaurant_id", "price", "id"),
+        # Covers the version of a menu (count, max(updated_at), max(id)) without reading the rows
+        Index("ix_items_restaurant_id_updated_at", "restaurant_id", "updated_at"),
+    )
     restaurant_id = Column(sqltypes.Integer, ForeignKey("restaurants.id"))
     name = Column(sqltypes.String(30), nullable=False)
     image = Column(sqltypes.String(100), default='media/default.png')
+    image_variants = Column(sqltypes.JSON, nullable=True)
     description = Column(sqltypes.String)
     cost = Column(sqltypes.Numeric(precision=10, scale=2), nullable=False)
     price = Column(sqltypes.Numeric(precision=10, scale=2), nullable=False)
     is_active = Column(Boolean, default=True)
 
     restaurant = relationship("Restaurant", back_populates="items")
+
+
+class ReplicaHeartbeat(BaseModel):
+    """
+        Model representing the replication heartbeat.
+
+        A single row written periodically on the primary database. Comparing its value
+        on the primary and on a replica gives the replication lag of the replica.
+
+        :ivar beat_at: Date and time of the last heartbeat (UTC).
+    """
+    __tablename__ = "replica_heartbeat"
+    beat_at = Column(sqltypes.DATETIME, nullable=False)
+
+
+class MediaBlob(BaseModel):
+    """
+        Model representing a stored media file, named after the hash of its content.
+
+        The reference count is kept up to date by the triggers of database.media, from the
+        items and restaurants whose image or logo is the file.
+
+        :ivar path: Path of the file, such as "media/image/ab/<sha256>.png".
+        :ivar size: Size of the file in bytes.
+        :ivar refcount: Number of items and restaurants using the file.
+        :ivar unreferenced_since: Date and time the file was last stored or lost its last reference,
+        None while it is referenced. Unreferenced files are collected after a grace period.
+    """
+    __tablename__ = "media_blobs"
+    __table_args__ = (
+        Index("ix_media_blobs_refcount_unreferenced_since", "refcount", "unreferenced_since"),
+    )
+    path = Column(sqltypes.String(100), nullable=False, unique=True)
+    size = Column(sqltypes.Integer, nullable=False)
+    refcount = Column(sqltypes.Integer, nullable=False, default=0)
+    unreferenced_since = Column(sqltypes.DateTime, nullable=True)
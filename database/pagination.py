@@ -0,0 +1,146 @@
+"""Python 3.11"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy import Select, literal, tuple_
+from sqlalchemy.orm import Session
+
+
+@dataclass
+class Page:
+    """
+    One page of a keyset paginated query.
+
+    Args:
+        rows (list): Rows of the page, in the requested order.
+        next_cursor (str): Opaque cursor of the following page, or None on the last page.
+        prev_cursor (str): Opaque cursor of the preceding page, or None on the first page.
+        limit (int): Maximum number of rows per page.
+    """
+    rows: list
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+    limit: int
+
+
+def _dump(value: Any):
+    """
+        Converts a key value to a JSON compatible value.
+
+        :param value: Column value.
+        :return: JSON compatible value.
+    """
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _load(column, value: Any):
+    """
+        Converts a JSON value back to the python type of a column.
+
+        :param column: Column the value belongs to.
+        :param value: JSON value.
+        :return: Column value.
+    """
+    python_type = column.type.python_type
+    if value is None or isinstance(value, python_type):
+        return value
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(sort: str, values: list, direction: str):
+    """
+        Encodes the position of a row into an opaque cursor.
+
+        :param sort: Sort the cursor was created for.
+        :param values: Key values (sort column, id) of the row.
+        :param direction: "next" for the rows after the key, "prev" for the rows before it.
+        :return: Cursor string.
+    """
+    payload = json.dumps({"s": sort, "k": [_dump(value) for value in values], "d": direction})
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, sort: str, columns: list):
+    """
+        Decodes a cursor created by encode_cursor.
+
+        :param cursor: Cursor string.
+        :param sort: Sort of the current request.
+        :param columns: Key columns (sort column, id) of the query.
+        :return: Tuple of (key values, direction).
+        :raises ValueError: If the cursor is malformed or was created for another sort.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values, direction = payload["k"], payload["d"]
+        if payload["s"] != sort or direction not in ("next", "prev") or len(values) != len(columns):
+            raise ValueError("Cursor does not match the query")
+        return [_load(column, value) for column, value in zip(columns, values)], direction
+    except (binascii.Error, json.JSONDecodeError, KeyError, TypeError,
+            decimal.InvalidOperation) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def paginate(db: Session, statement: Select, sort: str, sort_column, id_column,
+             cursor: str = None, limit: int = 50, descending: bool = False, scalars: bool = True):
+    """
+        Runs a keyset paginated query.
+
+        Rows are ordered by (sort_column, id_column) and a page starts right after (or before)
+        the key stored in the cursor, so every page is an index range scan no matter how deep
+        it is, unlike OFFSET which reads and discards all the preceding rows.
+
+        :param db: Database session.
+        :param statement: Select statement of an ORM entity (or of columns) with the filters
+        applied.
+        :param sort: Name of the sort, stored in the cursors.
+        :param sort_column: Column the rows are sorted by.
+        :param id_column: Unique column breaking ties of the sort column.
+        :param cursor: Cursor of the requested page, None for the first page.
+        :param limit: Maximum number of rows in the page.
+        :param descending: Whether the rows are sorted in descending order.
+        :param scalars: Whether the statement selects an ORM entity (True) or columns (False).
+        :return: Page of rows.
+        :raises ValueError: If the cursor is invalid.
+    """
+    columns = [sort_column, id_column] if sort_column is not id_column else [id_column]
+
+    def key(row):
+        return [getattr(row, column.key) for column in columns]
+
+    direction = "next"
+    if cursor:
+        values, direction = decode_cursor(cursor, sort, columns)
+        row_key = tuple_(*columns)
+        cursor_key = tuple_(
+            *(literal(value, column.type) for column, value in zip(columns, values))
+        )
+        after = row_key < cursor_key if descending else row_key > cursor_key
+        before = row_key > cursor_key if descending else row_key < cursor_key
+        statement = statement.where(after if direction == "next" else before)
+    backwards = direction == "prev"
+    order = [column.desc() if descending != backwards else column.asc() for column in columns]
+    result = db.execute(statement.order_by(*order).limit(limit + 1))
+    rows = list(result.scalars() if scalars else result)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return Page(rows, None, None, limit)
+    first = encode_cursor(sort, key(rows[0]), "prev")
+    last = encode_cursor(sort, key(rows[-1]), "next")
+    if backwards:
+        return Page(rows, last, first if has_more else None, limit)
+    return Page(rows, last if has_more else None, first if cursor else None, limit)
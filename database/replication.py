@@ -0,0 +1,49 @@
+"""Python 3.11"""
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from utils import settings
+from . import crud
+from .factory import SessionLocal, read_engines
+
+
+def write_heartbeat():
+    """
+        Writes the replication heartbeat on the primary database.
+    """
+    with SessionLocal() as db:
+        crud.write_heartbeat(db)
+
+
+def replica_lag():
+    """
+        Measures the replication lag of every read engine.
+
+        The lag is the difference between the heartbeat on the primary and the heartbeat
+        seen by the replica, both written by the application, so clock skew between
+        database hosts does not matter. Reads served by the primary itself, or by a
+        query_only pool on the same SQLite file, have no lag.
+
+        :return: Dictionary mapping read engine URLs (without passwords) to the lag
+        in seconds, or None if the lag cannot be measured.
+    """
+    if not settings.DATABASE_READ_URLS:
+        return {
+            read_engine.url.render_as_string(hide_password=True): 0.0
+            for read_engine in read_engines
+        }
+    lags = {}
+    with SessionLocal() as db:
+        primary_beat = crud.get_heartbeat(db)
+    for read_engine in read_engines:
+        name = read_engine.url.render_as_string(hide_password=True)
+        try:
+            with Session(bind=read_engine) as db:
+                replica_beat = crud.get_heartbeat(db)
+        except SQLAlchemyError:
+            replica_beat = None
+        if primary_beat is None or replica_beat is None:
+            lags[name] = None
+        else:
+            lags[name] = max((primary_beat - replica_beat).total_seconds(), 0.0)
+    return lags
@@ -1,8 +1,9 @@
 from datetime import datetime
 from enum import Enum
+from typing import List, Optional
 
 from fastapi import UploadFile
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 
 class BaseSchema(BaseModel):
@@ -72,6 +73,8 @@ class RestaurantSchema(BaseModel):
         :ivar opening_time: Opening time of the restaurant.
         :ivar closing_time: Closing time of the restaurant.
         :ivar logo: Image file representing the restaurant's logo.
+        :ivar latitude: Latitude of the restaurant in degrees, kept unchanged when omitted.
+        :ivar longitude: Longitude of the restaurant in degrees, kept unchanged when omitted.
     """
     name: str
     email: str
@@ -80,11 +83,13 @@ class RestaurantSchema(BaseModel):
     opening_time: str
     closing_time: str
     logo: UploadFile
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 
-class CreateItemSchema(BaseModel):
+class ItemDataSchema(BaseModel):
     """
-        Schema representing data for creating an item.
+        Schema representing the data fields of an item, without its image.
 
         :ivar restaurant_id: ID of the restaurant to which the item belongs.
         :ivar name: Name of the item.
@@ -92,7 +97,6 @@ class CreateItemSchema(BaseModel):
         :ivar cost: Cost of the item.
         :ivar price: Price of the item.
         :ivar is_active: Boolean indicating whether the item is active.
-        :ivar image: Image file representing the item.
     """
     restaurant_id: int
     name: str
@@ -100,6 +104,16 @@ class CreateItemSchema(BaseModel):
     cost: float
     price: float
     is_active: bool
+
+
+class CreateItemSchema(ItemDataSchema):
+    """
+        Schema representing data for creating an item.
+
+        Inherits from ItemDataSchema.
+
+        :ivar image: Image file representing the item.
+    """
     image: UploadFile
 
 
@@ -120,3 +134,62 @@ class UpdateItemSchema(BaseModel):
     price: float
     is_active: bool
     image: UploadFile
+
+
+class ItemSort(str, Enum):
+    """
+        Sort orders of item listings, a leading "-" sorts in descending order.
+    """
+    ID = "id"
+    ID_DESC = "-id"
+    PRICE = "price"
+    PRICE_DESC = "-price"
+
+
+class ItemFilterSchema(BaseModel):
+    """
+        Schema representing the filters and sort of an item listing.
+
+        :ivar is_active: Only return active (True) or inactive (False) items.
+        :ivar min_price: Lowest price of the returned items.
+        :ivar max_price: Highest price of the returned items.
+        :ivar sort: Sort order of the items.
+    """
+    is_active: Optional[bool] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    sort: ItemSort = ItemSort.ID
+
+
+class BatchUpdateItemSchema(BaseModel):
+    """
+        Schema representing a partial update applied to many items at once.
+
+        :ivar item_ids: IDs of the items to update, all items of the restaurant when omitted.
+        :ivar price: New price of the items.
+        :ivar price_change_percent: Percentage added to (or, if negative, removed from) the
+        current prices.
+        :ivar cost: New cost of the items.
+        :ivar is_active: New state of the items.
+    """
+    item_ids: Optional[List[int]] = Field(None, min_length=1, max_length=1000)
+    price: Optional[float] = Field(None, ge=0)
+    price_change_percent: Optional[float] = Field(None, gt=-100)
+    cost: Optional[float] = Field(None, ge=0)
+    is_active: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def check_changes(self):
+        """
+            Checks that the update changes something and sets the price only one way.
+
+            :return: The validated schema.
+            :raises ValueError: If no change is given or both price and price_change_percent
+            are given.
+        """
+        if self.price is not None and self.price_change_percent is not None:
+            raise ValueError("price and price_change_percent are mutually exclusive")
+        changes = (self.price, self.price_change_percent, self.cost, self.is_active)
+        if all(value is None for value in changes):
+            raise ValueError("At least one change is required")
+        return self
@@ -0,0 +1,149 @@
+"""Python 3.11"""
+import argparse
+import re
+
+from sqlalchemy import Float, column, func, literal, literal_column, select, table, text, tuple_
+from sqlalchemy.orm import Session
+
+from . import models, pagination
+from .factory import engine
+
+# Weights of the name and description columns in the bm25 rank, a match in the name counts more
+WEIGHTS = (10.0, 1.0)
+
+# External content FTS5 index over items, the text is read from the items table
+# so only the index itself is stored twice
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    name, description,
+    content='items', content_rowid='id',
+    prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+CREATE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, description ON items BEGIN
+        INSERT INTO items_fts(items_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO items_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+)
+
+items_fts = table("items_fts", column("rowid"))
+rank = func.bm25(literal_column("items_fts"), *WEIGHTS)
+rank_column = column("rank", Float)
+
+
+def create_index(bind):
+    """
+        Creates the full-text index of the items and the triggers keeping it in sync.
+
+        The index is filled from the existing items when it is created. Other databases
+        than SQLite have no FTS5, nothing is created for them.
+
+        :param bind: Engine to create the index on.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'items_fts'"
+        )).first()
+        conn.execute(text(CREATE_TABLE))
+        for statement in CREATE_TRIGGERS:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+
+
+def rebuild_index(bind):
+    """
+        Rebuilds the full-text index from the content of the items table.
+
+        :param bind: Engine of the database.
+    """
+    create_index(bind)
+    with bind.begin() as conn:
+        conn.execute(text("INSERT INTO items_fts(items_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO items_fts(items_fts) VALUES ('optimize')"))
+
+
+def match_expression(query: str):
+    """
+        Turns a user query into an FTS5 match expression.
+
+        Every word becomes a quoted term, so the FTS5 query syntax cannot be injected, and all
+        terms must match. The last word also matches as a prefix, for search as you type.
+
+        :param query: Search text entered by the user.
+        :return: Match expression, or None if the query has no words.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def search_items(db: Session, query: str, restaurant_id: int = None, cursor: str = None,
+                 limit: int = 50):
+    """
+        Searches the items by name and description, best matches first.
+
+        Pages are keyed by (rank, id) like the item listing, so a deep page costs the same
+        as the first one.
+
+        :param db: Database session.
+        :param query: Search text entered by the user.
+        :param restaurant_id: Only search the items of this restaurant when given.
+        :param cursor: Cursor of the requested page, None for the first page.
+        :param limit: Maximum number of items in the page.
+        :return: Page of item rows (columns only, plus the rank).
+        :raises ValueError: If the query has no words or the cursor is invalid.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        raise ValueError("Empty search query")
+    sort = f"search:{expression}"
+    statement = (
+        select(*models.Item.__table__.columns, rank.label("rank"))
+        .join_from(items_fts, models.Item, models.Item.id == items_fts.c.rowid)
+        .where(literal_column("items_fts").op("MATCH")(expression))
+    )
+    if restaurant_id is not None:
+        statement = statement.where(models.Item.restaurant_id == restaurant_id)
+    if cursor:
+        values, direction = pagination.decode_cursor(cursor, sort, [rank_column, models.Item.id])
+        if direction != "next":
+            raise ValueError("Search results are only paged forwards")
+        statement = statement.where(
+            tuple_(rank, models.Item.id) > tuple_(literal(values[0]), literal(values[1]))
+        )
+    rows = db.execute(statement.order_by(rank, models.Item.id).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.encode_cursor(sort, [rows[-1].rank, rows[-1].id], "next")
+    return pagination.Page(rows, next_cursor, None, limit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the full-text index of the items.")
+    parser.add_argument(
+        "command", choices=["rebuild"], help="rebuild: recreate the index from the items table"
+    )
+    parser.parse_args()
+    rebuild_index(engine)
+    print("Item search index rebuilt")
@@ -52,7 +52,7 @@ function generateRestaurantHtml(restaurantInfo) {
     var infoDiv = document.getElementById("restaurantInfo");
 
     infoDiv.innerHTML = `
-    <img style="max-height: 300px; width: auto;" src="${serverURL+restaurantInfo.logo}" class="card-img-top" alt="${restaurantInfo.name}">
+    <img style="max-height: 300px; width: auto;" src="${serverURL+restaurantInfo.logo}" srcset="${imageSrcset(restaurantInfo.logo_variants)}" sizes="300px" class="card-img-top" alt="${restaurantInfo.name}">
     <div class="card-body">
         <h5 class="card-title">${restaurantInfo.name}</h5>
         <p class="card-text">Email: ${restaurantInfo.email}</p>
@@ -128,6 +128,13 @@ formData.append("address", document.getElementById("address").value);
 formData.append("opening_time", document.getElementById("opening_time").value);
 formData.append("closing_time", document.getElementById("closing_time").value);
 formData.append("logo", document.getElementById("logo").files[0], document.getElementById("logo").files[0].name);
+// Coordinates are optional, the current ones are kept when they are left empty
+["latitude", "longitude"].forEach(name => {
+    var value = document.getElementById(name).value;
+    if (value !== "") {
+        formData.append(name, value);
+    }
+});
 
   
     // TODO: Send form data to server
@@ -194,6 +201,26 @@ function deleteFood(itemId) {
     });
 }
 
+/**
+ * Function to build the srcset attribute of an image from its resized variants.
+ *
+ * The variants are generated in the background after an upload, so an image may have none yet,
+ * the browser then loads the original image.
+ *
+ * @param {Object} [variants] - The variant URLs of the image by size name.
+ * @returns {string} The srcset value, empty if there are no variants.
+ */
+function imageSrcset(variants) {
+    if (!variants) {
+        return '';
+    }
+    const widths = {thumb: 160, small: 480, medium: 960};
+    return Object.keys(widths)
+        .filter(size => variants[size])
+        .map(size => serverURL + variants[size] + ' ' + widths[size] + 'w')
+        .join(', ');
+}
+
 /**
  * Function to generate HTML content for a list of items.
  *
@@ -212,7 +239,7 @@ function generateItemstHtml(items) {
         const itemCard = `
           <div class="col-md-4">
             <div class="card">
-              <img src="${serverURL+item.image}" class="card-img-top" alt="${item.name}">
+              <img src="${serverURL+item.image}" srcset="${imageSrcset(item.image_variants)}" sizes="(min-width: 768px) 33vw, 100vw" class="card-img-top" alt="${item.name}">
               <div class="card-body">
                 <h5 class="card-title">${item.name}</h5>
                 <p class="card-text">${item.description}</p>
@@ -258,12 +285,63 @@ function generateItemstHtml(items) {
 /**
  * Function to fetch items associated with a specific restaurant from the server.
  *
- * This function sends a GET request to the server to retrieve the items for the restaurant identified by the
- * `temp_res_id` stored in local storage. If the request is successful, it generates the HTML to display the items.
- * If the request fails, it shows an alert with the error message.
+ * This function sends a GET request to the server to retrieve one page of the items for the restaurant identified
+ * by the `temp_res_id` stored in local storage. If the request is successful, it generates the HTML to display the
+ * items and fetches the next page, if there is one. If the request fails, it shows an alert with the error message.
+ *
+ * @param {string} [cursor] - The cursor of the page to fetch, omitted for the first page.
+ */
+
+function getItems(cursor) {
+    var request = {
+        method: 'GET',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': localStorage.getItem("token") 
+        }
+    };
+    var query = cursor ? '?cursor=' + encodeURIComponent(cursor) : '';
+
+    fetch(serverURL + 'items/'+localStorage.getItem('temp_res_id')+'/' + query, request)
+    .then(response => {
+        if (response.ok) {
+            return response.json();
+        }
+        return Promise.reject(response); 
+    })
+    .then(data=>{
+        generateItemstHtml(data.items);
+        if (data.next_cursor) {
+            getItems(data.next_cursor);
+        }
+    }).catch((response) => {
+        response.json().then(data=>{
+            alert("Error " + response.status + ": " + data.detail);
+        })
+    });
+
+}
+
+/**
+ * Function to search the items of the restaurant by name and description.
+ *
+ * This function clears the displayed items and sends a GET request to the search endpoint with the text of the
+ * `searchItems` input, scoped to the restaurant identified by the `temp_res_id` stored in local storage. The best
+ * matches are displayed first and the following pages are fetched while there are any. An empty search text
+ * displays all the items again. If the request fails, it shows an alert with the error message.
+ *
+ * @param {string} [cursor] - The cursor of the page to fetch, omitted for the first page.
  */
 
-function getItems() {
+function searchItems(cursor) {
+    var text = document.getElementById("searchItems").value.trim();
+    if (!cursor) {
+        document.getElementById("items").innerHTML = '';
+    }
+    if (!text) {
+        getItems();
+        return;
+    }
     var request = {
         method: 'GET',
         headers: {
@@ -271,8 +349,12 @@ function getItems() {
             'Authorization': localStorage.getItem("token") 
         }
     };
+    var query = '?q=' + encodeURIComponent(text) + '&restaurant_id=' + localStorage.getItem('temp_res_id');
+    if (cursor) {
+        query += '&cursor=' + encodeURIComponent(cursor);
+    }
 
-    fetch(serverURL + 'items/'+localStorage.getItem('temp_res_id')+'/', request)
+    fetch(serverURL + 'items/search/' + query, request)
     .then(response => {
         if (response.ok) {
             return response.json();
@@ -280,7 +362,10 @@ function getItems() {
         return Promise.reject(response); 
     })
     .then(data=>{
-        generateItemstHtml(data);
+        generateItemstHtml(data.items);
+        if (data.next_cursor) {
+            searchItems(data.next_cursor);
+        }
     }).catch((response) => {
         response.json().then(data=>{
             alert("Error " + response.status + ": " + data.detail);
@@ -418,7 +503,7 @@ function deleteAllItems() {
         return Promise.reject(response); 
     })
     .then(data=>{
-        alert("All items deleted successfully");
+        alert(data.detail);
         window.location.reload();
     }).catch((response) => {
         response.json().then(data=>{
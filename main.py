@@ -1,22 +1,33 @@
 """Python 3.11"""
-from typing import List, Any
+import functools
+from typing import List, Any, Optional
 
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import ValidationError, parse_obj_as
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from database import schema, crud, helper
-from database.factory import engine, Base, get_db
+from database import schema, async_crud, geo, helper, media, replication, search
+from database.factory import engine, get_session, get_write_session, init_db
 from utils import auth_utils, image_utils, responses, swagger, auxiliary_service
+from utils import background, hashing, http_cache, image_variants, item_export, item_import, jobs
+from utils import media_files, metrics, serialization, settings
+from utils.cache import response_cache
+from utils.middleware import MetricsMiddleware, QueryStatsMiddleware
+
+# Sizes of the image variants accepted by the image_size parameters
+IMAGE_SIZE_PATTERN = f"^({'|'.join(image_variants.SIZES)})$"
 
 origins = [
     "*"
 ]
 
-app = FastAPI()
-app.openapi = swagger.generate_custom_openapi
+# The OpenAPI document and the documentation pages are served pre-encoded by the routes below
+app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+app.openapi = functools.partial(swagger.generate_custom_openapi, app)
 # noinspection PyTypeChecker
 app.add_middleware(
     CORSMiddleware,
@@ -25,19 +36,100 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+if settings.SQL_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     """
     Function executed on application startup.
-    This function creates all database tables defined in the Base metadata binding to the engine.
+    This function creates all database tables and indexes defined in the Base metadata
+    binding to the engine, creates the full-text index of the items, the spatial index of the
+    restaurants and the reference counting of the media files, encodes the OpenAPI document and
+    starts the background jobs.
+    """
+    init_db(engine)
+    search.create_index(engine)
+    geo.create_index(engine)
+    media.create_triggers(engine)
+    swagger.build(app)
+    background.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """
+    Function executed on application shutdown.
+    This function stops the background jobs, the password hashing executor and the image
+    variant workers.
+    """
+    await background.stop()
+    hashing.shutdown()
+    image_variants.shutdown()
+
+
+@app.get(swagger.OPENAPI_URL, include_in_schema=False)
+async def get_openapi_document(request: Request):
+    """
+        Endpoint serving the OpenAPI document, encoded once at startup.
+
+        :param request: Request object, for the conditional and encoding headers.
+        :return: Response with the OpenAPI document.
+    """
+    return swagger.document_of(app, "openapi").response(request)
+
+
+@app.get(swagger.DOCS_URL, include_in_schema=False)
+async def get_docs(request: Request):
+    """
+        Endpoint serving the Swagger UI page.
+
+        :param request: Request object, for the conditional and encoding headers.
+        :return: Response with the Swagger UI page.
+    """
+    return swagger.document_of(app, "docs").response(request)
+
+
+@app.get(swagger.OAUTH2_REDIRECT_URL, include_in_schema=False)
+async def get_docs_oauth2_redirect(request: Request):
+    """
+        Endpoint serving the OAuth2 redirect page of the Swagger UI.
+
+        :param request: Request object, for the conditional and encoding headers.
+        :return: Response with the redirect page.
+    """
+    return swagger.document_of(app, "oauth2-redirect").response(request)
+
+
+@app.get(swagger.REDOC_URL, include_in_schema=False)
+async def get_redoc(request: Request):
+    """
+        Endpoint serving the ReDoc page.
+
+        :param request: Request object, for the conditional and encoding headers.
+        :return: Response with the ReDoc page.
     """
-    Base.metadata.create_all(bind=engine)
+    return swagger.document_of(app, "redoc").response(request)
+
+
+@app.api_route("/media/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_media(path: str, request: Request):
+    """
+        Endpoint serving the uploaded images and their variants, such as
+        /media/image/ab/<sha256>.png.
+
+        :param path: Path of the file under media/.
+        :param request: Request object, for the conditional, range and encoding headers.
+        :return: Response with the file or a byte range of it.
+        :raises HTTPException 404: If there is no such file.
+    """
+    return await media_files.response(request, path)
 
 
 @app.get("/")
-async def root(db: Session = Depends(get_db)):
+async def root(db: Session = Depends(get_write_session)):
     """
        Root endpoint of the API.
 
@@ -48,7 +140,7 @@ async def root(db: Session = Depends(get_db)):
        :return: Greeting message.
     """
     try:
-        helper.create_user(db)
+        await async_crud.run(db, helper.create_user)
     except SQLAlchemyError:
         pass
     return {"msg": "Hello "}
@@ -57,7 +149,7 @@ async def root(db: Session = Depends(get_db)):
 @app.post("/auth/login/")
 async def login(
         data: schema.LoginSchema,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_session)
 ) -> responses.LoginResponseSchema:
     """
        Endpoint for user login.
@@ -70,30 +162,77 @@ async def login(
        :param db: Database session.
        :return: Token response schema.
     """
-    user = crud.get_user_by_email(db, data.email)
-    if user and user.varify_password(data.password):
-        token = crud.add_token(db, user.id)
+    user = await async_crud.get_user_by_email(db, data.email)
+    if user and await user.varify_password_async(data.password):
+        if db.is_modified(user):
+            await async_crud.update_user(db, user)
+        token = await auth_utils.issue_token(db, user)
         return responses.LoginResponseSchema.from_orm(token)
     raise HTTPException(status_code=400, detail="Invalid credentials")
 
 
-@app.get("/restaurant/")
+@app.post("/auth/logout/")
+async def logout(
+        token_str: str = Depends(auth_utils.get_token),
+        context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
+) -> Any:
+    """
+       Endpoint for user logout.
+
+       This endpoint revokes the token used to authenticate the request,
+       so it can no longer be used, even if it is still held in the token cache.
+
+       :param token_str: Authorization token string.
+       :param context: Custom context containing user information.
+       :return: Success message upon logout.
+    """
+    await auth_utils.revoke_token(context.db, token_str)
+    return {"detail": "Logged out successfully"}
+
+
+@app.get("/restaurant/", response_model=responses.RestaurantResponseSchema)
 async def get_restaurant(
+        request: Request,
+        image_size: Optional[str] = Query(None, pattern=IMAGE_SIZE_PATTERN),
         context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
-) -> responses.RestaurantResponseSchema:
+) -> Response:
     """
         Endpoint to retrieve restaurant details.
 
         This endpoint retrieves details of the restaurant associated with the authenticated user.
         If no restaurant is found, it raises a 404 HTTPException.
-
+        The encoded response is kept in the response cache under the version of the restaurant,
+        read on every request, so a write committed by another worker is seen on the next
+        request. The response has an ETag and a Last-Modified header, a 304 response is
+        returned if the client's copy is still current.
+
+        :param request: Request object containing the conditional headers.
+        :param image_size: Size of the logo ("thumb", "small" or "medium"), the logo is the
+        original image if omitted or if its variants are not generated yet.
         :param context: Custom context containing user information.
         :return: Restaurant response schema containing restaurant details.
     """
-    restaurant = crud.get_restaurant(context.db, context.user.id)
-    if not restaurant:
+    version = await async_crud.get_restaurant_version(context.db, context.user.id)
+    if not version:
         raise HTTPException(status_code=404, detail="No data found")
-    return responses.RestaurantResponseSchema.from_orm(restaurant)
+
+    async def load():
+        restaurant = await async_crud.get_restaurant(context.db, context.user.id)
+        if not restaurant:
+            raise HTTPException(status_code=404, detail="No data found")
+        data = responses.RestaurantResponseSchema.model_validate(restaurant)
+        data.logo = image_variants.pick(restaurant.logo, restaurant.logo_variants, image_size)
+        representation = http_cache.Representation(
+            serialization.dump_json(responses.RestaurantResponseSchema, data),
+            http_cache.weak_etag(restaurant.id, restaurant.updated_at, image_size),
+            restaurant.updated_at
+        )
+        return representation, restaurant.id, representation.size
+
+    representation = await response_cache.get_or_create(
+        ("restaurant", context.user.id, image_size, version.updated_at), load
+    )
+    return representation.response(request)
 
 
 @app.put("/restaurant/", openapi_extra=swagger.generate_form_input(schema.RestaurantSchema))
@@ -116,41 +255,207 @@ async def update_restaurant(
     form = await request.form()
     try:
         data = schema.RestaurantSchema(**form)
-        data.logo = image_utils.save_image(data.logo, 'logo')
-        restaurant = crud.update_restaurant(context.db, context.user.id, data)
+        data.logo = await image_utils.save_image(data.logo, 'logo')
+        restaurant = await async_crud.update_restaurant(context.db, context.user.id, data)
+        image_variants.submit("restaurant", restaurant.id, restaurant.logo)
         return responses.RestaurantResponseSchema.from_orm(restaurant)
     except ValidationError:
         raise HTTPException(status_code=400, detail="Invalid data")
 
 
-@app.get("/items/{restaurant_id}/")
+@app.get("/restaurants/nearby/")
+async def get_nearby_restaurants(
+        request: Request,
+        lat: Optional[float] = Query(None, ge=-90, le=90),
+        lon: Optional[float] = Query(None, ge=-180, le=180),
+        radius_km: Optional[float] = Query(None, gt=0),
+        limit: int = Query(settings.NEARBY_LIMIT, ge=1, le=settings.NEARBY_LIMIT_MAX),
+        db: Session = Depends(get_session)
+) -> List[responses.NearbyRestaurantResponseSchema]:
+    """
+        Endpoint to retrieve the restaurants nearest to a location.
+
+        This endpoint returns the restaurants nearest to the given coordinates, nearest first,
+        limited to the given radius if any. Without coordinates, the location of the client
+        is resolved from its IP address like in the location endpoint. The endpoint is public,
+        so only the public details of the restaurants are returned, without owner and contact.
+        If only one coordinate is given, it raises a 400 HTTPException.
+        If the location of the client cannot be resolved, it raises a 503 HTTPException.
+
+        :param request: Request object containing client's IP address.
+        :param lat: Latitude of the location in degrees.
+        :param lon: Longitude of the location in degrees.
+        :param radius_km: Maximum distance in kilometers, omitted for the nearest at any distance.
+        :param limit: Maximum number of restaurants to return.
+        :param db: Database session.
+        :return: List of nearby restaurant response schemas.
+    """
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="Both lat and lon are required")
+    if lat is None:
+        ip_address = auxiliary_service.get_client_ip(request)
+        data = await run_in_threadpool(auxiliary_service.ip_to_location, ip_address)
+        if not data or data.get("lat") is None or data.get("lon") is None:
+            raise HTTPException(status_code=503, detail="Auxiliary service is not available")
+        lat, lon = data["lat"], data["lon"]
+    found = await async_crud.nearest_restaurants(
+        db, lat, lon, limit, radius_km, settings.NEARBY_INITIAL_RADIUS_KM
+    )
+    return [
+        responses.NearbyRestaurantResponseSchema(
+            **responses.PublicRestaurantResponseSchema.from_orm(restaurant).model_dump(),
+            distance_km=distance
+        )
+        for restaurant, distance in found
+    ]
+
+
+@app.get("/items/export/", responses={200: {"content": {
+    "text/csv": {"schema": {"type": "string"}},
+    "application/x-ndjson": {"schema": {"type": "string"}}
+}}})
+async def export_items(
+        restaurant_id: Optional[int] = None,
+        data_format: str = Query("ndjson", alias="format", pattern="^(csv|ndjson)$"),
+        context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
+) -> StreamingResponse:
+    """
+        Endpoint to export the items of a restaurant, or of all restaurants.
+
+        This endpoint streams the items as NDJSON (one item response object per line) or as CSV
+        with a header line, ordered by ID. The rows are written as they are fetched from the
+        database, so the whole export is never held in memory.
+        If the restaurant does not exist, it raises a 404 HTTPException.
+
+        :param restaurant_id: ID of the restaurant, omitted to export all items.
+        :param data_format: "ndjson" or "csv".
+        :param context: Custom context containing user information.
+        :return: Streamed file of the items.
+    """
+    if restaurant_id is not None and not await async_crud.get_restaurant_by_id(
+            context.db, restaurant_id
+    ):
+        raise HTTPException(status_code=404, detail="Invalid Restaurant ID")
+    filename = f"items-{restaurant_id if restaurant_id is not None else 'all'}.{data_format}"
+    return StreamingResponse(
+        item_export.export_items(restaurant_id, data_format, settings.EXPORT_BATCH_SIZE),
+        media_type=item_export.MEDIA_TYPES[data_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/items/search/", response_model=responses.ItemPageResponseSchema)
+async def search_items(
+        q: str = Query(..., min_length=1, max_length=200),
+        restaurant_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(settings.ITEMS_PAGE_LIMIT, ge=1, le=settings.ITEMS_PAGE_LIMIT_MAX),
+        context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
+) -> Response:
+    """
+        Endpoint to search the items by name and description.
+
+        This endpoint returns one page of the items matching every word of the query, best
+        matches first, optionally limited to the items of one restaurant. The last word also
+        matches as a prefix.
+        If the query has no words or the cursor is invalid, it raises a 400 HTTPException.
+
+        :param q: Search text.
+        :param restaurant_id: ID of the restaurant to search in, omitted to search all restaurants.
+        :param cursor: Cursor of the requested page, omitted for the first page.
+        :param limit: Maximum number of items in the page.
+        :param context: Custom context containing user information.
+        :return: Page of item response schemas.
+    """
+    try:
+        page = await async_crud.search_items(context.db, q, restaurant_id, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid search query or cursor")
+    return serialization.json_response(responses.ItemPageResponseSchema, {
+        "items": page.rows, "next_cursor": page.next_cursor, "prev_cursor": page.prev_cursor,
+        "limit": page.limit
+    })
+
+
+@app.get("/items/{restaurant_id}/", response_model=responses.ItemPageResponseSchema)
 async def get_items(
+        request: Request,
         restaurant_id: int,
+        filters: schema.ItemFilterSchema = Depends(),
+        cursor: Optional[str] = None,
+        limit: int = Query(settings.ITEMS_PAGE_LIMIT, ge=1, le=settings.ITEMS_PAGE_LIMIT_MAX),
+        image_size: Optional[str] = Query(None, pattern=IMAGE_SIZE_PATTERN),
         context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
-) -> list[responses.ItemResponseSchema]:
+) -> Response:
     """
         Endpoint to retrieve items for a specific restaurant.
 
-        This endpoint retrieves items associated with the specified restaurant ID.
-        It expects an authenticated user and returns a list of item response schemas.
-        If no items are found for the given restaurant ID, an empty list is returned.
-
+        This endpoint retrieves one page of the items associated with the specified restaurant ID,
+        optionally filtered by state and price range and sorted by ID or price.
+        It expects an authenticated user and returns the items with the cursors of the
+        next and previous pages.
+        If no items are found for the given restaurant ID, an empty page is returned.
+        Encoded pages are kept in the response cache under the version of the menu, read on
+        every request with a single aggregate query, so a write committed by another worker
+        is seen on the next request.
+        The response has an ETag and a Last-Modified header computed from the version of the
+        menu, and a 304 response is returned if the client's copy is still current.
+
+        :param request: Request object containing the conditional headers.
         :param restaurant_id: ID of the restaurant.
+        :param filters: Filters and sort of the items.
+        :param cursor: Cursor of the requested page, omitted for the first page.
+        :param limit: Maximum number of items in the page.
+        :param image_size: Size of the item images ("thumb", "small" or "medium"), an image is
+        the original if omitted or if its variants are not generated yet.
         :param context: Custom context containing user information.
-        :return: List of item response schemas.
+        :return: Page of item response schemas.
     """
-    restaurant = crud.get_restaurant_by_id(context.db, restaurant_id)
-    if not restaurant:
+    version = await async_crud.get_menu_version(context.db, restaurant_id)
+    if not version:
         raise HTTPException(status_code=404, detail="Invalid Restaurant ID")
-    items = crud.get_items(context.db, restaurant_id)
-    return parse_obj_as(List[responses.ItemResponseSchema], items)
 
-
-@app.post("/items/", openapi_extra=swagger.generate_form_input(schema.CreateItemSchema))
+    async def load():
+        try:
+            page = await async_crud.get_items(context.db, restaurant_id, filters, cursor, limit)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Every page and filter of the menu has the same version, the query string tells them apart
+        last_modified = max(
+            filter(None, (version.items_updated_at, version.restaurant_updated_at)), default=None
+        )
+        items = page.rows
+        if image_size:
+            items = [
+                {
+                    **row._mapping,
+                    "image": image_variants.pick(row.image, row.image_variants, image_size)
+                }
+                for row in page.rows
+            ]
+        representation = http_cache.Representation(
+            serialization.dump_json(responses.ItemPageResponseSchema, {
+                "items": items, "next_cursor": page.next_cursor, "prev_cursor": page.prev_cursor,
+                "limit": page.limit
+            }),
+            http_cache.weak_etag(*version, request.url.query), last_modified
+        )
+        return representation, restaurant_id, representation.size
+
+    representation = await response_cache.get_or_create(
+        ("items", restaurant_id, request.url.query, tuple(version)), load
+    )
+    return representation.response(request)
+
+
+@app.post(
+    "/items/", response_model=responses.ItemResponseSchema,
+    openapi_extra=swagger.generate_form_input(schema.CreateItemSchema)
+)
 async def create_item(
         request: Request,
         context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
-) -> responses.ItemResponseSchema:
+) -> Response:
     """
         Endpoint to create a new item.
 
@@ -166,18 +471,58 @@ async def create_item(
     form = await request.form()
     try:
         data = schema.CreateItemSchema(**form)
-        data.image = image_utils.save_image(data.image, 'image')
-        item = crud.create_item(context.db, data)
-        return responses.ItemResponseSchema.from_orm(item)
+        data.image = await image_utils.save_image(data.image, 'image')
+        item = await async_crud.create_item(context.db, data)
+        image_variants.submit("item", item.id, item.image)
+        return serialization.json_response(responses.ItemResponseSchema, item)
     except ValidationError:
         raise HTTPException(status_code=400, detail="Invalid data")
 
 
-@app.put("/items/{item_id}/", openapi_extra=swagger.generate_form_input(schema.UpdateItemSchema))
+@app.post("/items/import/", openapi_extra={"requestBody": {"content": {
+    "text/csv": {"schema": {"type": "string"}},
+    "application/x-ndjson": {"schema": {"type": "string"}}
+}, "required": True}})
+async def import_items(
+        request: Request,
+        data_format: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$"),
+        batch_size: int = Query(
+            settings.IMPORT_BATCH_SIZE, ge=1, le=settings.IMPORT_BATCH_SIZE_MAX
+        ),
+        context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
+) -> responses.ImportReportSchema:
+    """
+        Endpoint to import many items at once.
+
+        This endpoint allows an authenticated user to create items from a CSV file (with a header
+        line) or an NDJSON file, sent as the request body. The body is read as a stream and the
+        valid rows are inserted in batches, each batch in its own transaction.
+        Invalid rows are skipped and reported with their errors.
+        If the format is neither given nor recognised from the content type, it raises a 415
+        HTTPException.
+
+        :param request: Request object containing the streamed file.
+        :param data_format: "csv" or "ndjson", taken from the content type when omitted.
+        :param batch_size: Number of rows inserted per transaction.
+        :param context: Custom context containing user information.
+        :return: Import report with the number of inserted and failed rows.
+    """
+    content_type = request.headers.get("Content-Type", "").split(";")[0].strip()
+    data_format = data_format or item_import.FORMATS.get(content_type)
+    if not data_format:
+        raise HTTPException(status_code=415, detail="Expected a CSV or NDJSON body")
+    report = await item_import.import_items(context.db, request.stream(), data_format, batch_size)
+    return responses.ImportReportSchema(**report)
+
+
+@app.put(
+    "/items/{item_id}/", response_model=responses.ItemResponseSchema,
+    openapi_extra=swagger.generate_form_input(schema.UpdateItemSchema)
+)
 async def update_item(
         item_id: int, request: Request,
         context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
-) -> responses.ItemResponseSchema:
+) -> Response:
     """
        Endpoint to update an existing item.
 
@@ -195,33 +540,100 @@ async def update_item(
     form = await request.form()
     try:
         data = schema.UpdateItemSchema(**form)
-        data.image = image_utils.save_image(data.image, 'image')
-        item = crud.update_item(context.db, item_id, data)
+        data.image = await image_utils.save_image(data.image, 'image')
+        item = await async_crud.update_item(context.db, item_id, data)
         if not item:
             raise HTTPException(status_code=404, detail="Item not found")
-        return responses.ItemResponseSchema.from_orm(item)
+        image_variants.submit("item", item.id, item.image)
+        return serialization.json_response(responses.ItemResponseSchema, item)
     except ValidationError:
         raise HTTPException(status_code=400, detail="Invalid data")
 
 
+@app.patch("/items/", response_model=List[responses.ItemResponseSchema])
+async def update_items(
+        data: schema.BatchUpdateItemSchema,
+        context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
+) -> Response:
+    """
+        Endpoint to update many items at once.
+
+        This endpoint allows an authenticated user to change the price, cost or state of many
+        items of their restaurant, or of all of them when no item IDs are given, in a single
+        transaction.
+        The price can be set or adjusted by a percentage.
+        Upon successful update, it returns the updated items. Items of other restaurants are left
+        unchanged.
+        If the user has no restaurant, it raises a 404 HTTPException.
+
+        :param data: Changes to apply and the IDs of the items to change.
+        :param context: Custom context containing user information.
+        :return: List of the updated item response schemas.
+    """
+    restaurant = await async_crud.get_restaurant(context.db, context.user.id)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="No data found")
+    items = await async_crud.update_items(context.db, restaurant.id, data)
+    return serialization.json_response(List[responses.ItemResponseSchema], items)
+
+
 @app.delete("/items/all/")
 async def delete_all_item(
+        response: Response,
+        background_tasks: BackgroundTasks,
+        is_active: Optional[bool] = None,
         context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
 ) -> Any:
     """
-        Endpoint to delete an existing item.
+        Endpoint to delete all the items of the user's restaurant.
+
+        This endpoint allows an authenticated user to delete all the items of their restaurant,
+        or only the active or inactive ones, with set-based DELETE statements.
+        Upon successful deletion, it returns a success message with the number of deleted items.
+        Deletes of more than BULK_DELETE_SYNC_LIMIT items run in chunks as a background job:
+        the endpoint then returns a 202 status code with the ID of the job, whose progress
+        is available at "/jobs/{job_id}/".
+        If the user has no restaurant, it raises a 404 HTTPException.
+
+        :param response: Response object, used to set the 202 status code.
+        :param background_tasks: Background tasks running the chunked delete.
+        :param is_active: Only delete active (True) or inactive (False) items when given.
+        :param context: Custom context containing user information.
+        :return: Success message with the number of deleted items, or the job ID.
+    """
+    restaurant = await async_crud.get_restaurant(context.db, context.user.id)
+    if not restaurant:
+        raise HTTPException(status_code=404, detail="No data found")
+    total = await async_crud.count_items(context.db, restaurant.id, is_active)
+    if total > settings.BULK_DELETE_SYNC_LIMIT:
+        job = jobs.create("delete_items", context.user.id, total)
+        background_tasks.add_task(
+            jobs.run, job, background.delete_items_batch, restaurant.id, is_active
+        )
+        response.status_code = 202
+        return {"detail": "Items are being deleted", "job_id": job.id}
+    deleted = await async_crud.delete_all_item(context.db, restaurant.id, is_active)
+    return {"detail": "All items deleted successfully", "deleted": deleted}
+
+
+@app.get("/jobs/{job_id}/")
+async def get_job(
+        job_id: str,
+        context: auth_utils.CustomContext = Depends(auth_utils.get_current_user)
+) -> responses.JobResponseSchema:
+    """
+        Endpoint to retrieve the progress of a background job.
 
-        This endpoint allows an authenticated user to delete all the items from db.
-        Upon successful deletion, it returns a success message.
-        If the item is not found, it raises a 404 HTTPException.
+        If the job is not found or was started by another user, it raises a 404 HTTPException.
 
+        :param job_id: ID of the job.
         :param context: Custom context containing user information.
-        :return: Success message upon deletion.
+        :return: Job response schema with the progress of the job.
     """
-    is_success = crud.delete_all_item(context.db)
-    if is_success:
-        return {"detail": "All items deleted successfully"}
-    raise HTTPException(status_code=500, detail="Error while deleting items")
+    job = jobs.get(job_id)
+    if not job or job.user_id != context.user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return responses.JobResponseSchema.from_orm(job)
 
 
 @app.delete("/items/{item_id}/")
@@ -240,7 +652,7 @@ async def delete_item(
         :param context: Custom context containing user information.
         :return: Success message upon deletion.
     """
-    is_success = crud.delete_item(context.db, item_id)
+    is_success = await async_crud.delete_item(context.db, item_id)
     if is_success:
         return {"detail": "Item deleted successfully"}
     raise HTTPException(status_code=404, detail="Item not found")
@@ -265,3 +677,24 @@ async def get_location(
     if data:
         return data
     raise HTTPException(status_code=503, detail="Auxiliary service is not available")
+
+
+@app.get("/health/replicas/")
+async def get_replica_lag() -> Any:
+    """
+        Endpoint to retrieve the replication lag of the read replicas.
+
+        :return: Dictionary mapping read replica URLs to their lag in seconds
+        (None if the lag cannot be measured).
+    """
+    return await run_in_threadpool(replication.replica_lag)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+        Endpoint exposing the service metrics in the Prometheus text format.
+
+        :return: Response with the request, database pool and cache metrics.
+    """
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
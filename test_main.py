@@ -1,14 +1,47 @@
 # import pydicom as pydicom
+import asyncio
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
 import os
+from typing import List
 
+import pydantic
+import pytest
+from fastapi import FastAPI, HTTPException, Query, UploadFile
 from fastapi.testclient import TestClient
+from starlette.requests import Request
+from passlib.context import CryptContext
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from database import async_crud, crud, models, schema
+from database import factory, geo, instrumentation, search
+from database.factory import SessionLocal, SQLALCHEMY_ASYNC_DATABASE_URL, build_async_engine, engine
 from main import app
+from utils import background, hashing, image_utils, image_variants, item_export, media_files
+from utils import responses, serialization, settings, signed_tokens, swagger
 from utils.auxiliary_service import ip_to_location
+from utils.cache import ResponseCache, TTLCache, response_cache, token_cache
 
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def media_root(monkeypatch, tmp_path):
+    """
+    Stores the uploads of every test in its temporary directory instead of the media/ tree.
+
+    The image variants still being generated are waited for before MEDIA_ROOT is restored.
+    """
+    monkeypatch.setattr(settings, "MEDIA_ROOT", str(tmp_path))
+    yield tmp_path
+    image_variants.wait()
+
+
 # Testing that server is working
 def test_read_main():
     """
@@ -49,6 +82,283 @@ def test_login_success():
     return token
 
 
+# Testing that validated tokens are served from the token cache
+def test_token_cache_hit():
+    """
+    Test to verify that repeated requests with the same token hit the token cache.
+
+    This test checks if a second authenticated request ("/restaurant/")
+    is answered from the cache instead of the database.
+    """
+    token = test_login_success()
+    token_cache.clear()
+    client.get("/restaurant/", headers={'Authorization': f"Token {token}"})
+    hits = token_cache.hits
+    client.get("/restaurant/", headers={'Authorization': f"Token {token}"})
+    assert token_cache.hits == hits + 1
+
+
+# Testing the token cache size based eviction
+def test_token_cache_eviction():
+    """
+    Test to verify the least recently used entry is evicted when the cache is full.
+
+    This test checks if the cache keeps at most max_size entries
+    and drops the entry that was used least recently.
+    """
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+# Testing the response cache of the restaurant and its items/foods
+def test_response_cache():
+    """
+    Test to verify that menu responses are served from the response cache until a write.
+
+    This test checks if a repeated request ("/items/{restaurant_id}/") only runs the
+    statement reading the version of the menu, if updating an item of the restaurant
+    invalidates the cached page, and if a write the cache did not see is served at once.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    item_id = test_create_item()
+    # Recording the variants of the new image invalidates the page too
+    image_variants.wait()
+    client.get("/items/1/", headers=headers)
+    response = client.get("/items/1/", headers=headers)
+    assert '"1 statements' in response.headers['Server-Timing']
+    client.patch("/items/", json={'item_ids': [item_id], 'price': 42}, headers=headers)
+    response = client.get("/items/1/", params={'limit': 200}, headers=headers)
+    assert next(item for item in response.json()['items'] if item['id'] == item_id)['price'] == 42
+    assert response_cache.stats()['invalidations'] > 0
+
+    # A write committed by another worker does not invalidate this cache, but changes the version
+    with SessionLocal() as db:
+        db.execute(update(models.Item).where(models.Item.id == item_id).values(price=43))
+        db.commit()
+    response = client.get("/items/1/", params={'limit': 200}, headers=headers)
+    assert next(item for item in response.json()['items'] if item['id'] == item_id)['price'] == 43
+    client.get("/restaurant/", headers=headers)
+    with SessionLocal() as db:
+        db.execute(update(models.Restaurant).where(models.Restaurant.id == 1).values(name='other'))
+        db.commit()
+    assert client.get("/restaurant/", headers=headers).json()['name'] == 'other'
+
+
+# Testing the byte budget and request coalescing of the response cache
+def test_response_cache_coalescing():
+    """
+    Test to verify that concurrent misses build a response once and that the byte budget is kept.
+
+    This test checks if ResponseCache runs a single build for simultaneous misses of a key,
+    evicts the least recently used entries beyond its budget and ignores a response built
+    while its tag was invalidated.
+    """
+    cache = ResponseCache(max_bytes=100, ttl=60)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return "menu", 1, 40
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_create("a", build) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["menu"] * 10
+    assert len(builds) == 1 and cache.stats()["coalesced"] == 9
+    cache.set("b", "b", 2, 40)
+    cache.set("c", "c", 3, 40)
+    assert cache.get("a") is None and cache.stats()["bytes"] == 80
+    generation = cache.generation()
+    cache.invalidate(2)
+    assert cache.get("b") is None
+    cache.set("b", "stale", 2, 40, generation)
+    assert cache.get("b") is None
+
+
+# Testing logout revokes the cached token
+def test_logout(monkeypatch):
+    """
+    Test to verify that a token cannot be used after logout.
+
+    This test checks if the endpoint ("/auth/logout/") revokes the token, drops it from the
+    token cache only once the deletion is committed, and a following request with the same
+    token returns a 401 status code.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    assert client.get("/restaurant/", headers=headers).status_code == 200
+    committed = []
+
+    def invalidate(key):
+        with SessionLocal() as db:
+            committed.append(crud.get_user_by_token(db, key) is None)
+        TTLCache.invalidate(token_cache, key)
+
+    monkeypatch.setattr(token_cache, "invalidate", invalidate)
+    response = client.post("/auth/logout/", headers=headers)
+    assert response.status_code == 200
+    assert committed == [True]
+    monkeypatch.undo()
+    assert client.get("/restaurant/", headers=headers).status_code == 401
+
+
+# Testing outdated password hashes are rehashed on login
+def test_password_rehash():
+    """
+    Test to verify that a hash with outdated parameters is replaced on verification.
+
+    This test checks if verifying a password against a hash with fewer rounds
+    than configured returns a new hash that uses the configured rounds.
+    """
+    context = CryptContext(schemes=["sha256_crypt"], sha256_crypt__default_rounds=1000)
+    outdated = context.hash("1234")
+    valid, new_hash = hashing.verify_password("1234", outdated)
+    assert valid
+    assert new_hash and not hashing.pwd_context.needs_update(new_hash)
+    assert hashing.verify_password("wrong", outdated) == (False, None)
+
+
+# Testing expired tokens are rejected and purged
+def test_expired_token_purge():
+    """
+    Test to verify that expired tokens are rejected and removed by the purge job.
+
+    This test checks if the endpoint ("/restaurant/") returns a 401 status code
+    for an expired token and if the purge job deletes it in bounded batches.
+    """
+    with SessionLocal() as db:
+        db.add(models.Token(
+            user_id=1, token="expired-token",
+            expiry=datetime.datetime.utcnow() - datetime.timedelta(days=1)
+        ))
+        db.commit()
+    response = client.get("/restaurant/", headers={'Authorization': 'Token expired-token'})
+    assert response.status_code == 401
+    report = background.purge_expired_tokens(batch_size=1)
+    assert sum(deleted for deleted, _ in report) >= 1
+    assert all(deleted <= 1 for deleted, _ in report)
+    with SessionLocal() as db:
+        assert crud.delete_expired_tokens(db) == 0
+
+
+# Testing signed tokens are validated without the tokens table
+def test_signed_token(monkeypatch):
+    """
+    Test to verify authentication with stateless signed tokens.
+
+    This test checks if the endpoint ("/restaurant/") accepts a signed token that has
+    no row in the tokens table without reading the user, rejects a tampered or revoked one (also
+    in a worker that loads the revocations of the others), and keeps accepting tokens signed
+    with a rotated out key that is still configured.
+    """
+    monkeypatch.setattr(settings, "AUTH_TOKEN_MODE", "signed")
+    monkeypatch.setattr(signed_tokens, "signing_keys", {"old": b"old secret", "new": b"new secret"})
+    monkeypatch.setattr(signed_tokens, "active_key_id", "old")
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    old_token = signed_tokens.sign(1, expiry)
+    monkeypatch.setattr(signed_tokens, "active_key_id", "new")
+    token = signed_tokens.sign(1, expiry)
+    assert token.startswith("new.")
+    for valid in (old_token, token):
+        response = client.get("/restaurant/", headers={'Authorization': f"Token {valid}"})
+        assert response.status_code == 200
+    # A token carrying the user needs no read to authenticate it, only the restaurant version
+    with SessionLocal() as db:
+        user = crud.get_user_by_email(db, "admin@admin.com")
+    claims = schema.UserSchema(**vars(user)).model_dump(mode="json")
+    headers = {'Authorization': f"Token {signed_tokens.sign(user.id, expiry, claims)}"}
+    response = client.get("/restaurant/", headers=headers)
+    assert response.status_code == 200
+    assert '"1 statements' in response.headers['Server-Timing']
+    assert client.post("/auth/logout/", headers=headers).status_code == 200
+    tampered = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+    response = client.get("/restaurant/", headers={'Authorization': f"Token {tampered}"})
+    assert response.status_code == 401
+    response = client.post("/auth/logout/", headers={'Authorization': f"Token {token}"})
+    assert response.status_code == 200
+    response = client.get("/restaurant/", headers={'Authorization': f"Token {token}"})
+    assert response.status_code == 401
+    # Another worker, with an empty cache and revocation list, sees it once it loads the table
+    token_cache.clear()
+    monkeypatch.setattr(signed_tokens, "revoked", {})
+    response = client.get("/restaurant/", headers={'Authorization': f"Token {token}"})
+    assert response.status_code == 200
+    token_cache.clear()
+    assert background.refresh_revocations() >= 1
+    response = client.get("/restaurant/", headers={'Authorization': f"Token {token}"})
+    assert response.status_code == 401
+    with SessionLocal() as db:
+        assert signed_tokens.signature_of(token) in dict(crud.get_revocations(db))
+
+
+# Testing the async crud functions with an AsyncSession
+def test_async_crud():
+    """
+    Test to verify the async crud functions on an aiosqlite backed AsyncSession.
+
+    This test checks if the same user and restaurant are returned
+    through an AsyncSession as through the sync crud functions.
+    """
+    async def fetch():
+        async_engine = build_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL)
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                user = await async_crud.get_user_by_email(db, "admin@admin.com")
+                restaurant = await async_crud.get_restaurant(db, user.id)
+                return user.id, restaurant.id if restaurant else None
+        finally:
+            await async_engine.dispose()
+
+    with SessionLocal() as db:
+        user = crud.get_user_by_email(db, "admin@admin.com")
+        restaurant = crud.get_restaurant(db, user.id)
+        expected = user.id, restaurant.id if restaurant else None
+    assert asyncio.run(fetch()) == expected
+
+
+# Testing the SQLite connection pragmas
+def test_sqlite_pragmas():
+    """
+    Test to verify that new SQLite connections use the configured pragmas.
+
+    This test checks if connections from the engine run in WAL mode
+    with the configured busy timeout.
+    """
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == "wal"
+        busy_timeout = connection.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        assert busy_timeout == settings.SQLITE_PRAGMAS["busy_timeout"]
+
+
+# Testing read/write session routing
+def test_read_write_routing():
+    """
+    Test to verify that reads are routed to read-only sessions and writes to the primary.
+
+    This test checks if GET requests use a read session unless they ask to read their
+    own writes, and if read sessions refuse to write.
+    """
+    def request(method, headers=None):
+        return Request({"type": "http", "method": method, "headers": headers or []})
+
+    assert not factory.use_primary(request("GET"))
+    assert factory.use_primary(request("GET", [(b"x-read-your-writes", b"true")]))
+    assert factory.use_primary(request("POST"))
+    with factory.read_session() as db:
+        assert db.connection().exec_driver_sql("PRAGMA query_only").scalar() == 1
+    response = client.get("/health/replicas/")
+    assert response.status_code == 200
+    assert all(lag == 0.0 for lag in response.json().values())
+
+
 # Testing get restaurant for the unregistered user
 def test_get_restaurant_failed():
     """
@@ -152,6 +462,310 @@ def test_get_items_success():
     assert response.status_code == 200
 
 
+# Testing the per-request SQL statistics
+def test_query_stats():
+    """
+    Test to verify the SQL statistics of a request and the detection of repeated statements.
+
+    This test checks if the endpoint ("/items/{restaurant_id}/") reports its statements in the
+    Server-Timing header and if a statement executed repeatedly is flagged as a likely N+1 pattern.
+    """
+    token = test_login_success()
+    restaurant_id = test_get_restaurant()
+    token_cache.clear()
+    response_cache.clear()
+    response = client.get(f"/items/{restaurant_id}/", headers={'Authorization': f"Token {token}"})
+    assert response.status_code == 200
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    # Token lookup, menu version and page
+    assert '3 statements' in response.headers['Server-Timing']
+    stats, stats_token = instrumentation.start()
+    try:
+        with SessionLocal() as db:
+            for user_id in range(3):
+                crud.get_restaurant(db, user_id)
+    finally:
+        instrumentation.stop(stats_token)
+    assert stats.statements == 3
+    assert len(stats.repeated(3)) == 1
+    assert instrumentation.current() is None
+
+
+# Testing the Prometheus metrics endpoint
+def test_metrics():
+    """
+    Test to verify the request, database pool and cache metrics.
+
+    This test checks if the endpoint ("/metrics") reports requests labelled with
+    their route template instead of the raw path, in the Prometheus text format.
+    """
+    token = test_login_success()
+    client.get("/items/500/", headers={'Authorization': f"Token {token}"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/items/{restaurant_id}/",status="404"}' in body
+    route = 'route="/items/{restaurant_id}/"'
+    assert f'http_request_duration_seconds_bucket{{method="GET",{route},le="+Inf"}}' in body
+    assert '/items/500/' not in body
+    assert 'db_pool_connections_checked_out{engine="primary"}' in body
+    assert 'cache_hit_ratio{cache="token"}' in body
+
+
+# Testing the fast serialization path of the item list
+def test_fast_serialization():
+    """
+    Test to verify that the fast serialization path keeps the response bytes unchanged.
+
+    This test checks if the endpoint ("/items/{restaurant_id}/") returns exactly the bytes
+    FastAPI produced from ORM objects converted with parse_obj_as before the fast path.
+    """
+    token = test_login_success()
+    restaurant_id = test_get_restaurant()
+    response = client.get(
+        f"/items/{restaurant_id}/", params={'limit': 200},
+        headers={'Authorization': f"Token {token}"}
+    )
+    assert response.status_code == 200
+    with SessionLocal() as db:
+        items = db.scalars(
+            select(models.Item)
+            .where(models.Item.restaurant_id == restaurant_id)
+            .order_by(models.Item.id)
+        ).all()
+    page = responses.ItemPageResponseSchema(
+        items=[responses.ItemResponseSchema.model_validate(item) for item in items], limit=200
+    )
+    field = serialization.adapter(responses.ItemPageResponseSchema)
+    expected = json.dumps(
+        field.dump_python(field.validate_python(page), mode="json", by_alias=True),
+        ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+    assert response.content == expected
+
+
+# Testing conditional requests of the restaurant and its items/foods
+def test_conditional_get():
+    """
+    Test to verify ETag and Last-Modified validation of the restaurant and its items/foods.
+
+    This test checks if the endpoints ("/restaurant/" and "/items/{restaurant_id}/") return a 304
+    status code for a current copy, and a new ETag once items are created, updated or deleted,
+    even within the same second.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    test_get_restaurant()
+    response = client.get("/restaurant/", headers=headers)
+    assert response.status_code == 200
+    response = client.get(
+        "/restaurant/", headers={**headers, 'If-None-Match': response.headers['etag']}
+    )
+    assert response.status_code == 304
+
+    url = "/items/1/"
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag, last_modified = response.headers['etag'], response.headers['last-modified']
+    assert etag.startswith('W/"')
+    response = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304 and response.content == b""
+    response = client.get(url, headers={**headers, 'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+    response = client.get(url, params={'limit': 5}, headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+
+    etags = {etag}
+    item_id = test_create_item()
+    for change in ({'price': 10}, {'price': 20}):
+        client.patch("/items/", json={'item_ids': [item_id], **change}, headers=headers)
+        response = client.get(url, headers={**headers, 'If-None-Match': ", ".join(etags)})
+        assert response.status_code == 200
+        etags.add(response.headers['etag'])
+    client.delete(f"/items/{item_id}/", headers=headers)
+    response = client.get(url, headers={**headers, 'If-None-Match': ", ".join(etags)})
+    assert response.status_code == 200
+    assert client.get("/items/999999/", headers=headers).status_code == 404
+
+
+# Testing the streamed export of items/foods
+def test_export_items():
+    """
+    Test to verify the streamed NDJSON and CSV export of items/foods.
+
+    This test checks if the endpoint ("/items/export/") returns every item of the restaurant
+    in ID order in both formats, and a 404 status code for an unknown restaurant.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    test_create_item()
+    with SessionLocal() as db:
+        expected = list(db.scalars(
+            select(models.Item.id).where(models.Item.restaurant_id == 1).order_by(models.Item.id)
+        ))
+        batches = list(crud.iter_item_batches(db, 1, batch_size=3))
+    assert [row.id for rows in batches for row in rows] == expected
+    assert max(len(rows) for rows in batches) == 3
+    response = client.get("/items/export/", params={'restaurant_id': 1}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line['id'] for line in lines] == expected
+    assert lines[0]['links']['self'] == f"/api/items/{expected[0]}/"
+    response = client.get(
+        "/items/export/", params={'restaurant_id': 1, 'format': 'csv'}, headers=headers
+    )
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(row['id']) for row in rows] == expected
+    assert rows[0].keys() == set(item_export.CSV_COLUMNS)
+    response = client.get("/items/export/", params={'restaurant_id': 999999}, headers=headers)
+    assert response.status_code == 404
+
+
+# Testing keyset pagination of items/foods
+def test_get_items_pagination():
+    """
+    Test to verify cursor based pagination, filtering and sorting of items/foods.
+
+    This test checks if walking the pages of the endpoint ("/items/{restaurant_id}/")
+    forwards and backwards returns every item exactly once in the requested order.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    url = f"/items/{test_get_restaurant()}/"
+    expected = [item['id'] for item in client.get(
+        url, params={'sort': '-id', 'limit': 200}, headers=headers
+    ).json()['items']]
+    pages, cursor = [], None
+    while True:
+        params = {'sort': '-id', 'limit': 3, **({'cursor': cursor} if cursor else {})}
+        page = client.get(url, params=params, headers=headers).json()
+        pages.append(page)
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert [item['id'] for page in pages for item in page['items']] == expected
+    assert expected == sorted(expected, reverse=True)
+    if len(pages) > 1:
+        previous = client.get(url, params={
+            'sort': '-id', 'limit': 3, 'cursor': pages[-1]['prev_cursor']
+        }, headers=headers).json()
+        assert previous['items'] == pages[-2]['items']
+    response = client.get(url, params={'max_price': 0}, headers=headers)
+    assert response.json()['items'] == []
+    response = client.get(
+        url, params={'sort': 'price', 'cursor': pages[0]['next_cursor'] or 'x'}, headers=headers
+    )
+    assert response.status_code == 400
+    response = client.get(url, params={'limit': 100000}, headers=headers)
+    assert response.status_code == 422
+
+
+# Testing full-text search of items/foods
+def test_search_items():
+    """
+    Test to verify ranked, paginated full-text search of items/foods.
+
+    This test checks if the endpoint ("/items/search/") ranks name matches first,
+    follows the cursors, matches prefixes and sees inserted, updated and deleted items.
+    """
+    search.create_index(engine)
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    with SessionLocal() as db:
+        restaurant_id = crud.get_restaurant(db, crud.get_user_by_email(db, "admin@admin.com").id).id
+        fields = {
+            'restaurant_id': restaurant_id, 'cost': 1, 'price': 2, 'is_active': True,
+            'image': 'media/default.png'
+        }
+        risotto = crud.create_item(db, schema.CreateItemSchema.model_construct(
+            name='Saffron risotto', description='Creamy zafferano rice', **fields
+        ))
+        pudding = crud.create_item(db, schema.CreateItemSchema.model_construct(
+            name='Zafferano pudding', description='Sweet', **fields
+        ))
+    try:
+        url = "/items/search/"
+        response = client.get(url, params={
+            'q': 'zafferano', 'limit': 1, 'restaurant_id': restaurant_id
+        }, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert [item['id'] for item in page['items']] == [pudding.id]
+        page = client.get(url, params={
+            'q': 'zafferano', 'limit': 1, 'restaurant_id': restaurant_id,
+            'cursor': page['next_cursor']
+        }, headers=headers).json()
+        assert [item['id'] for item in page['items']] == [risotto.id]
+        assert page['next_cursor'] is None
+        page = client.get(url, params={'q': 'saff'}, headers=headers).json()
+        assert [item['id'] for item in page['items']] == [risotto.id]
+        assert client.get(url, params={'q': '"*'}, headers=headers).status_code == 400
+        with SessionLocal() as db:
+            crud.update_item(db, risotto.id, schema.UpdateItemSchema.model_construct(
+                name='Mushroom risotto', description='Rice', cost=1, price=2, is_active=True,
+                image='media/default.png'
+            ))
+        assert client.get(url, params={'q': 'saffron'}, headers=headers).json()['items'] == []
+    finally:
+        with SessionLocal() as db:
+            crud.delete_item(db, risotto.id)
+            crud.delete_item(db, pudding.id)
+    assert client.get(url, params={'q': 'zafferano'}, headers=headers).json()['items'] == []
+
+
+# Testing the nearest restaurants search
+def test_nearby_restaurants():
+    """
+    Test to verify k-nearest and radius queries of restaurants.
+
+    This test checks if the endpoint ("/restaurants/nearby/") returns the restaurants nearest
+    first without their owner and contact details, limits them to the radius and follows
+    coordinate changes of a restaurant.
+    """
+    places = {
+        'Louvre': (48.8606, 2.3376), 'Eiffel': (48.8584, 2.2945), 'Versailles': (48.8049, 2.1204),
+        'Lyon': (45.7640, 4.8357), 'Fiji': (-17.7134, 178.0650), 'Samoa': (-13.7590, -172.1046)
+    }
+    with SessionLocal() as db:
+        user_id = crud.get_user_by_email(db, "admin@admin.com").id
+        ids = db.scalars(insert(models.Restaurant).returning(models.Restaurant.id), [
+            {'user_id': user_id, 'name': name, 'email': 'e', 'mobile': 'm', 'address': 'a',
+             'opening_time': '8', 'closing_time': '22', 'latitude': lat, 'longitude': lon}
+            for name, (lat, lon) in places.items()
+        ]).all()
+        db.commit()
+    try:
+        url = "/restaurants/nearby/"
+        response = client.get(url, params={'lat': 48.8530, 'lon': 2.3499, 'limit': 3})
+        assert response.status_code == 200
+        names = [restaurant['name'] for restaurant in response.json()]
+        assert names == ['Louvre', 'Eiffel', 'Versailles']
+        assert response.json()[0]['distance_km'] < 2
+        assert not {'user_id', 'email', 'mobile'} & response.json()[0].keys()
+        names = [restaurant['name'] for restaurant in client.get(url, params={
+            'lat': 48.8530, 'lon': 2.3499, 'radius_km': 10
+        }).json()]
+        assert names == ['Louvre', 'Eiffel']
+        names = [restaurant['name'] for restaurant in client.get(url, params={
+            'lat': -15.0, 'lon': 179.9, 'radius_km': 1000
+        }).json()]
+        assert names == ['Fiji', 'Samoa']
+        assert client.get(url, params={'lat': 48.8530}).status_code == 400
+        with SessionLocal() as db:
+            db.execute(update(models.Restaurant).where(models.Restaurant.id == ids[3]).values(
+                latitude=48.8530, longitude=2.3500
+            ))
+            db.commit()
+            assert geo.nearest_restaurants(db, 48.8530, 2.3499, limit=1)[0][0].name == 'Lyon'
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(models.Restaurant).where(models.Restaurant.id.in_(ids)))
+            db.commit()
+            assert geo.nearest_restaurants(db, 48.8530, 2.3499, radius_km=10) == []
+
+
 # Testing create item/food with authorized user
 def test_create_item():
     """
@@ -178,6 +792,199 @@ def test_create_item():
     return item_id
 
 
+# Testing the chunked image upload and its size limit
+def test_save_image(monkeypatch, tmp_path):
+    """
+    Test to verify that images are stored once per content and that oversized images are refused.
+
+    This test checks if image_utils.save_image stores an upload under the hash of its content,
+    leaves the file untouched when the same content is uploaded again, and if the endpoint
+    ("/items/") returns a 413 status code for an image above the maximum size without writing
+    a file.
+    """
+    def stored_files():
+        return sorted(
+            os.path.join(root, name) for root, _, names in os.walk(tmp_path) for name in names
+        )
+
+    def save(content, filename, max_size=None):
+        upload = UploadFile(io.BytesIO(content), filename=filename)
+        return asyncio.run(image_utils.save_image(upload, "nested", max_size))
+
+    monkeypatch.setattr(settings, "IMAGE_CHUNK_SIZE", 7)
+    content = os.urandom(100)
+    path = save(content, "../a.PNG")
+    try:
+        digest = hashlib.sha256(content).hexdigest()
+        assert path == f"media/nested/{digest[:2]}/{digest}.png"
+        file_path = tmp_path / "nested" / digest[:2] / f"{digest}.png"
+        assert file_path.read_bytes() == content
+        stat = os.stat(file_path)
+        assert save(content, "b.png") == path
+        stored = os.stat(file_path)
+        assert (stored.st_ino, stored.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns)
+        with SessionLocal() as db:
+            blob = db.scalars(select(models.MediaBlob).where(models.MediaBlob.path == path)).one()
+            assert (blob.size, blob.refcount) == (100, 0)
+
+        before = stored_files()
+        with pytest.raises(HTTPException) as exc_info:
+            save(os.urandom(100), "c.png", 50)
+        assert exc_info.value.status_code == 413
+        token = test_login_success()
+        monkeypatch.setattr(settings, "IMAGE_MAX_SIZE", 10)
+        response = client.post("/items/", data={
+            'restaurant_id': 1, 'name': 'new item', 'description': 'description', 'cost': 500,
+            'price': 1000, 'is_active': True
+        }, files={"image": ("SportBuddy.png", open("SportBuddy.png", "rb"), "image/png")},
+            headers={'Authorization': f"Token {token}"})
+        assert response.status_code == 413
+        assert stored_files() == before
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(models.MediaBlob).where(models.MediaBlob.path == path))
+            db.commit()
+
+
+# Testing the reference counting and garbage collection of the media files
+def test_media_garbage_collection(tmp_path):
+    """
+    Test to verify that media files are counted while in use and deleted once unused.
+
+    This test checks if two items sharing an uploaded image keep a single file referenced twice,
+    and if background.collect_media_garbage deletes the file only once no item uses it anymore.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    content = os.urandom(64)
+    item_ids = []
+    for name in ("shared image 1", "shared image 2"):
+        response = client.post("/items/", data={
+            'restaurant_id': 1, 'name': name, 'description': 'description', 'cost': 500,
+            'price': 1000, 'is_active': True
+        }, files={"image": ("shared.png", content, "image/png")}, headers=headers)
+        assert response.status_code == 200
+        item_ids.append(response.json()["id"])
+    image_variants.wait()
+    with SessionLocal() as db:
+        path = db.get(models.Item, item_ids[0]).image
+        assert db.get(models.Item, item_ids[1]).image == path
+    file_path = media_files.local_path(path)
+    assert file_path.startswith(str(tmp_path))
+
+    def refcount():
+        with SessionLocal() as db:
+            return db.scalar(select(models.MediaBlob.refcount).where(models.MediaBlob.path == path))
+
+    try:
+        assert refcount() == 2
+        client.delete(f"/items/{item_ids[0]}/", headers=headers)
+        assert refcount() == 1
+        background.collect_media_garbage(grace=0)
+        assert os.path.exists(file_path)
+
+        client.delete(f"/items/{item_ids[1]}/", headers=headers)
+        assert refcount() == 0
+        assert background.collect_media_garbage(grace=3600) == 0
+        assert os.path.exists(file_path)
+        assert background.collect_media_garbage(grace=0) >= 1
+        assert not os.path.exists(file_path) and refcount() is None
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(models.Item).where(models.Item.id.in_(item_ids)))
+            db.execute(delete(models.MediaBlob).where(models.MediaBlob.path == path))
+            db.commit()
+
+
+# Testing the serving of the media files
+def test_media_files(monkeypatch):
+    """
+    Test to verify that media files are served with immutable caching, byte ranges and
+    precompressed copies.
+
+    This test checks if the endpoint ("/media/{path}") returns a stored image with its validators,
+    a 304 status code for a matching If-None-Match, a 206 status code for a byte range, a 416
+    status code for a range after the end of the file, the gzip copy of the file when it exists,
+    and a 404 status code for paths outside the media directory.
+    """
+    content = os.urandom(1000)
+    upload = UploadFile(io.BytesIO(content), filename="served.png")
+    path = asyncio.run(image_utils.save_image(upload, "nested"))
+    try:
+        url = "/" + path
+        identity = {'Accept-Encoding': 'identity'}
+        response = client.get(url, headers=identity)
+        assert response.status_code == 200 and response.content == content
+        assert response.headers['Content-Type'] == 'image/png'
+        cache_control = f'public, max-age={settings.MEDIA_MAX_AGE}, immutable'
+        assert response.headers['Cache-Control'] == cache_control
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        etag = response.headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+        response = client.get(url, headers={'Range': 'bytes=10-19', **identity})
+        assert response.status_code == 206 and response.content == content[10:20]
+        assert response.headers['Content-Range'] == 'bytes 10-19/1000'
+        response = client.get(url, headers={'Range': 'bytes=-5', **identity})
+        assert response.status_code == 206 and response.content == content[-5:]
+        response = client.get(url, headers={'Range': 'bytes=10-19', 'If-Range': '"stale"'})
+        assert response.status_code == 200 and response.content == content
+        response = client.get(url, headers={'Range': 'bytes=1000-'})
+        assert response.status_code == 416 and response.headers['Content-Range'] == 'bytes */1000'
+
+        with open(media_files.local_path(path) + ".gz", "wb") as file:
+            file.write(gzip.compress(content))
+        response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip' and response.content == content
+        assert response.headers['ETag'] != etag
+        response = client.get(url, headers=identity)
+        assert 'Content-Encoding' not in response.headers and response.headers['ETag'] == etag
+
+        monkeypatch.setattr(settings, "MEDIA_ACCEL_REDIRECT", "/protected-media/")
+        response = client.get(url, headers=identity)
+        redirect = "/protected-media/" + path.removeprefix("media/")
+        assert response.headers['X-Accel-Redirect'] == redirect
+        assert response.content == b""
+        for missing in ("nested/%2e%2e/%2e%2e/database.db", "nested/.hidden", "nested/none.png"):
+            assert client.get("/media/" + missing).status_code == 404
+    finally:
+        with SessionLocal() as db:
+            db.execute(delete(models.MediaBlob).where(models.MediaBlob.path == path))
+            db.commit()
+
+
+# Testing the resized variants of the uploaded images
+def test_image_variants(tmp_path):
+    """
+    Test to verify that resized WebP variants are generated in the background and can be requested.
+
+    This test checks if image_variants.generate never enlarges an image, and if the endpoint
+    ("/items/{restaurant_id}/") returns the thumbnail of a new item with image_size=thumb.
+    """
+    image_module = pytest.importorskip("PIL.Image")
+    path = str(tmp_path / "photo.jpg")
+    image_module.new("RGB", (2000, 1000), "red").save(path)
+    variants = image_variants.generate(path)
+    sizes = {size: image_module.open(variant).size for size, variant in variants.items()}
+    assert sizes == {"medium": (960, 480), "small": (480, 240), "thumb": (160, 80)}
+    path = str(tmp_path / "icon.png")
+    image_module.new("RGBA", (300, 200)).save(path)
+    variants = image_variants.generate(path)
+    assert variants["medium"] == variants["small"]
+    assert image_module.open(variants["small"]).size == (300, 200)
+
+    token = test_login_success()
+    item_id = test_create_item()
+    image_variants.wait()
+    response = client.get("/items/1/", params={'limit': 200, 'image_size': 'thumb'},
+                          headers={'Authorization': f"Token {token}"})
+    item = next(item for item in response.json()['items'] if item['id'] == item_id)
+    assert item['image'] == item['image_variants']['thumb']
+    assert item['image'].endswith(".thumb.webp")
+    thumbnail = media_files.local_path(item['image'])
+    assert os.path.getsize(thumbnail) < os.path.getsize("SportBuddy.png")
+
+
 # Testing create item/food with authorized user
 def test_create_item_failed():
     """
@@ -202,6 +1009,77 @@ def test_create_item_failed():
     assert response.status_code == 400
 
 
+# Testing bulk import of items/foods from CSV and NDJSON
+def test_import_items(monkeypatch):
+    """
+    Test to verify the bulk import of items/foods.
+
+    This test checks if the endpoint ("/items/import/") inserts the valid rows
+    of CSV and NDJSON bodies in batches and reports the invalid ones, including
+    a record with an unterminated quoted field, lines that are not valid UTF-8
+    and lines over the size limit.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}", 'Content-Type': 'text/csv'}
+    body = (
+        "restaurant_id,name,description,cost,price,is_active\n"
+        "1,imported item,\"multi\nline\",5,10,true\n"
+        "1,imported item,no price,5,,true\n"
+        "1,imported item,too,few\n"
+        "1000,imported item,unknown restaurant,5,10,false\n"
+        "1,imported item,second,5,10,false\n"
+    )
+    response = client.post(
+        "/items/import/", params={'batch_size': 1}, content=body, headers=headers
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report['inserted'] == 2
+    assert [error['row'] for error in report['errors']] == [2, 3, 4]
+    # Testing an unbalanced quote is reported instead of swallowing the rest of the body
+    broken = (
+        "restaurant_id,name,description,cost,price,is_active\n"
+        "1,imported item,\"unterminated description,5,10,true\n"
+    )
+    body = broken + "1,imported item,third,5,10,true\n" + "1,imported item,fourth,5,10,true\n"
+    with monkeypatch.context() as patch:
+        patch.setattr(settings, "IMPORT_MAX_RECORD_SIZE", len(broken.splitlines()[1]))
+        report = client.post("/items/import/", content=body, headers=headers).json()
+    assert report['inserted'] == 2
+    assert report['errors'] == [{'row': 1, 'errors': ["Unterminated quoted field"]}]
+    report = client.post("/items/import/", content=broken, headers=headers).json()
+    assert report['inserted'] == 0
+    assert report['errors'] == [{'row': 1, 'errors': ["Unterminated quoted field"]}]
+    # Testing a field over the limit of the csv module is a row error
+    large = f"1,imported item,{'x' * (csv.field_size_limit() + 1)},5,10,true\n"
+    with monkeypatch.context() as patch:
+        patch.setattr(settings, "IMPORT_MAX_RECORD_SIZE", 2 * csv.field_size_limit())
+        response = client.post("/items/import/", content=broken.splitlines()[0] + "\n" + large,
+                               headers=headers)
+    assert response.status_code == 200
+    assert response.json()['errors'][0]['errors'][0].startswith("Invalid CSV")
+    headers['Content-Type'] = 'application/x-ndjson'
+    body = '{"restaurant_id": 1, "name": "imported item", "description": "", "cost": 1, ' \
+           '"price": 2, "is_active": true}\nnot json\n'
+    report = client.post("/items/import/", content=body, headers=headers).json()
+    assert report['inserted'] == 1 and report['failed'] == 1
+    # Testing invalid UTF-8 and too long lines are row errors, not server errors
+    line = body.splitlines()[0].encode()
+    content = line + b'\n{"name": "\xff"}\n"' + b"x" * 200 + b'"\n' + line + b'\n' + b"y" * 200
+    with monkeypatch.context() as patch:
+        patch.setattr(settings, "IMPORT_MAX_RECORD_SIZE", 150)
+        response = client.post("/items/import/", content=content, headers=headers)
+    assert response.status_code == 200
+    assert response.json()['inserted'] == 2
+    assert response.json()['errors'] == [
+        {'row': 2, 'errors': ["Invalid UTF-8 at byte 10"]},
+        {'row': 3, 'errors': ["Line longer than 150 bytes"]},
+        {'row': 5, 'errors': ["Line longer than 150 bytes"]},
+    ]
+    headers['Content-Type'] = 'text/plain'
+    assert client.post("/items/import/", content=body, headers=headers).status_code == 415
+
+
 # Testing update item/food with complete/valid parameters
 def test_update_item():
     """
@@ -228,6 +1106,70 @@ def test_update_item():
     assert response.status_code == 200
 
 
+# Testing batch update of items/foods
+def test_batch_update_items():
+    """
+    Test to verify partial updates of many items/foods in one request.
+
+    This test checks if the endpoint ("/items/") applies a percentage price change and
+    a new state to the given items and rejects contradictory changes with a 422 status code.
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    item_ids = [test_create_item(), test_create_item()]
+    response = client.patch("/items/", json={
+        'item_ids': item_ids, 'price_change_percent': 10, 'is_active': False
+    }, headers=headers)
+    assert response.status_code == 200
+    items = response.json()
+    assert sorted(item['id'] for item in items) == sorted(item_ids)
+    assert all(item['price'] == 1100 and not item['is_active'] for item in items)
+    response = client.patch("/items/", json={
+        'item_ids': item_ids, 'price': 5, 'price_change_percent': 10
+    }, headers=headers)
+    assert response.status_code == 422
+
+
+# Testing that every write of an item/food takes a single statement
+def test_write_statement_count():
+    """
+    Test to verify that creating and updating an item/food runs one statement each.
+
+    This test checks if the crud write functions use INSERT/UPDATE ... RETURNING
+    instead of selecting the row before the write and refreshing it afterwards.
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with SessionLocal() as db:
+        user = crud.get_user_by_email(db, "admin@admin.com")
+        restaurant = crud.get_restaurant(db, user.id)
+        fields = {
+            'restaurant_id': restaurant.id, 'name': 'name', 'description': 'description',
+            'cost': 500, 'price': 1000, 'is_active': True, 'image': 'media/image/test.png'
+        }
+        # Statements of the image variant workers would be counted too
+        image_variants.wait()
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            item = crud.create_item(db, schema.CreateItemSchema.model_construct(**fields))
+            assert len(statements) == 1
+            assert item.id and item.created_at
+            fields.pop('restaurant_id')
+            fields['price'] = 2000
+            item = crud.update_item(db, item.id, schema.UpdateItemSchema.model_construct(**fields))
+            assert len(statements) == 2
+            assert item.price == 2000
+            missing = schema.UpdateItemSchema.model_construct(**fields)
+            assert crud.update_item(db, 0, missing) is None
+            assert len(statements) == 3
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+        crud.delete_item(db, item.id)
+
+
 # Testing update item/food with passing incomplete parameters
 def test_update_item_failed():
     """
@@ -265,6 +1207,42 @@ def test_delete_item():
     assert response.status_code == 200
 
 
+# Testing set-based deletion of the inactive items/foods of the restaurant
+def test_delete_all_item(monkeypatch):
+    """
+    Test to verify deletion of all inactive items/foods of the user's restaurant.
+
+    This test checks if the endpoint ("/items/all/") returns the number of deleted items,
+    and if large deletes run as a chunked background job whose progress is reported
+    by the endpoint ("/jobs/{job_id}/").
+    """
+    token = test_login_success()
+    headers = {'Authorization': f"Token {token}"}
+    restaurant_id = test_get_restaurant()
+    body = "".join(
+        f'{{"restaurant_id": {restaurant_id}, "name": "inactive", "description": "", '
+        f'"cost": 1, "price": 2, "is_active": false}}\n' for _ in range(3)
+    )
+    client.post("/items/import/", content=body,
+                headers={**headers, 'Content-Type': 'application/x-ndjson'})
+    response = client.delete("/items/all/", params={'is_active': False}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()['deleted'] >= 3
+    client.post("/items/import/", content=body,
+                headers={**headers, 'Content-Type': 'application/x-ndjson'})
+    monkeypatch.setattr(settings, "BULK_DELETE_SYNC_LIMIT", 0)
+    monkeypatch.setattr(settings, "BULK_DELETE_BATCH_SIZE", 1)
+    response = client.delete("/items/all/", params={'is_active': False}, headers=headers)
+    assert response.status_code == 202
+    job = client.get(f"/jobs/{response.json()['job_id']}/", headers=headers).json()
+    assert job['status'] == 'done'
+    assert job['done'] == job['total'] == 3
+    page = client.get(
+        f"/items/{restaurant_id}/", params={'is_active': False}, headers=headers
+    ).json()
+    assert page['items'] == []
+
+
 # Testing delete item/food with passing wrong/invalid item_id
 def test_delete_item_failed():
     """
@@ -289,6 +1267,46 @@ def test_swagger():
     assert response.status_code == 200
 
 
+# Testing the pre-encoded OpenAPI document
+def test_openapi_document(tmp_path):
+    """
+    Test to verify that the OpenAPI document is served pre-encoded and revalidated by ETag.
+
+    This test checks if the endpoint ("/openapi.json") returns the gzip encoded document with
+    an ETag, answers a matching If-None-Match with 304 and round trips through the disk cache, and
+    if the fingerprint of the cached document changes with the parameters and response schemas.
+    """
+    response = client.get("/openapi.json")
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert '/items/{item_id}/' in response.json()['paths']
+    etag = response.headers['etag']
+    response = client.get("/openapi.json", headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+    response = client.get("/openapi.json", headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in response.headers
+    assert response.headers['etag'] == etag
+    cache_path = str(tmp_path / "openapi.json.gz")
+    swagger.save(app, cache_path)
+    assert swagger.load(app, cache_path) == response.content
+
+    def fingerprint_of(limit_max, schema_fields):
+        other = FastAPI()
+        model = pydantic.create_model("Model", **schema_fields)
+
+        @other.get("/models/", response_model=List[model])
+        async def list_models(limit: int = Query(10, le=limit_max)):
+            return []
+
+        return swagger.fingerprint(other)
+
+    fingerprint = fingerprint_of(100, {'name': (str, ...)})
+    assert fingerprint_of(100, {'name': (str, ...)}) == fingerprint
+    assert fingerprint_of(200, {'name': (str, ...)}) != fingerprint
+    assert fingerprint_of(100, {'name': (str, ...), 'latitude': (float, None)}) != fingerprint
+
+
 # Testing swagger documentation
 def test_auxiliary_service():
     """
@@ -1,11 +1,15 @@
 """Python 3.11"""
+import datetime
+import functools
 import typing
 
 from fastapi import Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
-from database import crud, factory, schema
+from database import async_crud, factory, schema
 from database.schema import UserSchema
+from utils import signed_tokens
+from utils.cache import token_cache
 
 
 class CustomContext:
@@ -59,21 +63,93 @@ async def verify_token(db, token_str):
     """
         Verifies the validity of an authorization token.
 
+        Validated tokens are kept in the token cache together with their expiry,
+        so repeated requests with the same token skip the database. Signed tokens are not
+        looked up in the tokens table, they carry the user and are checked against the
+        in-process revocation list, so validating them reads nothing from the database.
+
         :param db: Database session.
         :param token_str: Authorization token string to be verified.
-        :return: User associated with the valid token.
+        :return: User schema associated with the valid token.
         :raises HTTPException 401: If the token is missing or invalid.
     """
     if not token_str:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    token = crud.get_user_by_token(db, token_str)
-    if not token:
+    now = datetime.datetime.utcnow()
+    claims = None
+    if signed_tokens.enabled() and signed_tokens.is_signed(token_str):
+        claims = signed_tokens.verify(token_str)
+        if not claims or signed_tokens.is_revoked(token_str):
+            raise HTTPException(status_code=401, detail="Invalid token")
+    cached = token_cache.get(token_str)
+    if cached:
+        user, expiry = cached
+        if expiry > now:
+            return user
+        token_cache.invalidate(token_str)
+    if claims and claims[2] is not None:
+        _, expiry, user_claims = claims
+        user = UserSchema(**user_claims)
+        token_cache.set(token_str, (user, expiry), (expiry - now).total_seconds())
+        return user
+    if claims:
+        # Signed without the user details, the user is read from the database
+        user_id, expiry, _ = claims
+        db_user = await async_crud.get_user(db, user_id)
+    else:
+        token = await async_crud.get_user_by_token(db, token_str)
+        db_user, expiry = (token.user, token.expiry) if token else (None, None)
+    if not db_user:
         raise HTTPException(status_code=401, detail="Invalid token")
-    return token.user
+    user = UserSchema(**{k: v for k, v in vars(db_user).items()})
+    token_cache.set(token_str, (user, expiry), (expiry - now).total_seconds())
+    return user
+
+
+async def issue_token(db: Session, user):
+    """
+        Issues an authorization token for a user.
+
+        In "signed" mode the token is an HMAC signed token carrying the details of the user,
+        that verify_token can validate without reading the database, otherwise it is a
+        random UUID.
+
+        :param db: Database session.
+        :param user: User object.
+        :return: Token object.
+    """
+    sign = None
+    if signed_tokens.enabled():
+        claims = UserSchema(**vars(user)).model_dump(mode="json")
+        sign = functools.partial(signed_tokens.sign, claims=claims)
+    return await async_crud.add_token(db, user.id, sign)
+
+
+async def revoke_token(db: Session, token_str: str):
+    """
+        Revokes an authorization token.
+
+        Signed tokens are also recorded in the revoked_tokens table and in the revocation list
+        of this worker, since verify_token does not read the tokens table for them. The other
+        workers reject them once background.refresh_revocations has run, within
+        AUTH_REVOCATION_REFRESH_INTERVAL seconds. Like a deleted database token, a revoked
+        database token may still be accepted by another worker that cached it, for up to
+        TOKEN_CACHE_TTL seconds.
+
+        :param db: Database session.
+        :param token_str: Authorization token string.
+        :return: True if the token was revoked, otherwise False.
+    """
+    claims = signed_tokens.verify(token_str) if signed_tokens.is_signed(token_str) else None
+    if claims:
+        signature = signed_tokens.signature_of(token_str)
+        await async_crud.revoke_signed_token(db, signature, claims[1])
+        signed_tokens.revoke(signature, claims[1])
+    return await async_crud.revoke_token(db, token_str)
 
 
 async def get_current_user(
-        db: Session = Depends(factory.get_db), token_str=Depends(get_token),
+        db: Session = Depends(factory.get_session), token_str=Depends(get_token),
 ) -> CustomContext:
     """
       Retrieves the current user based on the provided authorization token.
@@ -83,4 +159,4 @@ async def get_current_user(
       :return: CustomContext containing user information.
     """
     user = await verify_token(db, token_str)
-    return CustomContext(UserSchema(**{k: v for k, v in vars(user).items()}), db)
+    return CustomContext(user, db)
@@ -0,0 +1,160 @@
+"""Python 3.11"""
+import asyncio
+import datetime
+import logging
+import os
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from database import crud, media, replication
+from database.factory import SessionLocal, engine
+from utils import image_variants, media_files, settings, signed_tokens
+
+logger = logging.getLogger(__name__)
+
+_tasks: list[asyncio.Task] = []
+
+
+def purge_expired_tokens(batch_size: int = settings.TOKEN_PURGE_BATCH_SIZE):
+    """
+        Deletes all expired tokens and revocations of expired signed tokens in bounded batches.
+
+        :param batch_size: Maximum number of rows deleted per batch.
+        :return: List of (deleted rows, seconds taken) tuples, one per batch.
+    """
+    report = []
+    with SessionLocal() as db:
+        for purge in (crud.delete_expired_tokens, crud.delete_expired_revocations):
+            while True:
+                started = time.perf_counter()
+                deleted = purge(db, batch_size)
+                elapsed = time.perf_counter() - started
+                report.append((deleted, elapsed))
+                logger.info("%s deleted %d rows in %.3fs", purge.__name__, deleted, elapsed)
+                if deleted < batch_size:
+                    break
+    logger.info(
+        "Token purge removed %d rows in %d batches",
+        sum(deleted for deleted, _ in report), len(report)
+    )
+    return report
+
+
+def refresh_revocations():
+    """
+        Copies the revocations of signed tokens recorded by every worker to the revocation
+        list of this worker.
+
+        :return: Number of revocations read.
+    """
+    with SessionLocal() as db:
+        revocations = crud.get_revocations(db)
+    signed_tokens.load_revocations(revocations)
+    return len(revocations)
+
+
+def collect_media_garbage(grace: float = None, batch_size: int = settings.MEDIA_GC_BATCH_SIZE):
+    """
+        Deletes the media files that no item or restaurant has used for longer than the grace
+        period.
+
+        Each file is unregistered and deleted, with its variants and precompressed copies, before
+        the transaction commits, so an upload of the same content waits and then stores the file
+        again. Reference counts are only kept on SQLite, nothing is deleted on other databases.
+
+        :param grace: Seconds a file is kept once unused, settings.MEDIA_GC_GRACE when omitted.
+        :param batch_size: Maximum number of files deleted per transaction.
+        :return: Number of deleted files.
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+    grace = datetime.timedelta(seconds=settings.MEDIA_GC_GRACE if grace is None else grace)
+    # Precompressed copies are deleted with the file
+    suffixes = ("", *(suffix for _, suffix in media_files.ENCODINGS))
+    collected = 0
+    while True:
+        with SessionLocal() as db:
+            paths = media.collectable(db, grace, batch_size)
+            for path in paths:
+                if not media.forget(db, path, grace):
+                    continue
+                variants = [
+                    image_variants.variant_path(path, size) for size in image_variants.SIZES
+                ]
+                for file_path in (path, *variants):
+                    for suffix in suffixes:
+                        try:
+                            os.remove(media_files.local_path(file_path) + suffix)
+                        except FileNotFoundError:
+                            pass
+                collected += 1
+            db.commit()
+        if len(paths) < batch_size:
+            break
+    logger.info("Media garbage collection deleted %d files", collected)
+    return collected
+
+
+def delete_items_batch(restaurant_id: int, is_active: bool = None):
+    """
+        Deletes one batch of the items of a restaurant, used as a jobs.run step.
+
+        :param restaurant_id: ID of the restaurant.
+        :param is_active: Only delete active (True) or inactive (False) items when given.
+        :return: Number of deleted items.
+    """
+    with SessionLocal() as db:
+        return crud.delete_all_item(db, restaurant_id, is_active, settings.BULK_DELETE_BATCH_SIZE)
+
+
+async def run_periodically(func, interval: float):
+    """
+        Runs a blocking job in the threadpool every interval seconds until cancelled.
+
+        Failures are logged and do not stop the job.
+
+        :param func: Function to run.
+        :param interval: Seconds between two runs.
+    """
+    while True:
+        try:
+            await run_in_threadpool(func)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Background job %s failed", func.__name__)
+        await asyncio.sleep(interval)
+
+
+def start():
+    """
+        Starts the configured background jobs on the running event loop.
+    """
+    if settings.AUTH_TOKEN_MODE == "signed":
+        # Loaded before serving, so no revoked token is accepted after a restart
+        refresh_revocations()
+        if settings.AUTH_REVOCATION_REFRESH_INTERVAL > 0:
+            _tasks.append(asyncio.create_task(run_periodically(
+                refresh_revocations, settings.AUTH_REVOCATION_REFRESH_INTERVAL
+            )))
+    if settings.TOKEN_PURGE_INTERVAL > 0:
+        _tasks.append(asyncio.create_task(
+            run_periodically(purge_expired_tokens, settings.TOKEN_PURGE_INTERVAL)
+        ))
+    if settings.MEDIA_GC_INTERVAL > 0:
+        _tasks.append(asyncio.create_task(
+            run_periodically(collect_media_garbage, settings.MEDIA_GC_INTERVAL)
+        ))
+    if settings.DATABASE_READ_URLS and settings.REPLICA_HEARTBEAT_INTERVAL > 0:
+        _tasks.append(asyncio.create_task(
+            run_periodically(replication.write_heartbeat, settings.REPLICA_HEARTBEAT_INTERVAL)
+        ))
+
+
+async def stop():
+    """
+        Cancels the background jobs and waits for them to finish.
+    """
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
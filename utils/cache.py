@@ -0,0 +1,309 @@
+"""Python 3.11"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+from utils import settings
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry time to live and LRU eviction.
+
+    Entries expire after ``ttl`` seconds (or earlier if a shorter ttl is given
+    when the entry is stored). When the cache holds ``max_size`` entries the
+    least recently used one is evicted. Access is guarded by a lock so the cache
+    can be shared between the event loop and the threadpool.
+
+    Args:
+        max_size (int): Maximum number of entries kept in the cache.
+        ttl (float): Default time to live of an entry in seconds.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+            Returns the cached value for a key and marks it as recently used.
+
+            :param key: Cache key.
+            :return: Cached value, or None if the key is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """
+            Stores a value, evicting the least recently used entries if the cache is full.
+
+            :param key: Cache key.
+            :param value: Value to be cached.
+            :param ttl: Time to live in seconds, capped at the cache default.
+        """
+        ttl = self._ttl if ttl is None else min(ttl, self._ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+            Removes a key from the cache if present.
+
+            :param key: Cache key.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+            Removes all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+            Returns the cache counters.
+
+            :return: Dictionary with size, hits, misses, evictions and hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ResponseCache:
+    """
+    In-process cache of encoded responses, bounded in bytes and invalidated by tag.
+
+    Every entry has a tag, such as the ID of the restaurant the response was built from, and
+    invalidating a tag drops all its entries. A response built while its tag is invalidated
+    is not stored, so a write committed during a miss cannot leave a stale entry behind.
+    When the entries exceed ``max_bytes`` the least recently used ones are evicted. Writes
+    made by other processes do not invalidate the cache, the keys hold a version read from the
+    database instead, and ``ttl`` bounds how long the entries of outdated versions are kept.
+
+    Concurrent misses of the same key are coalesced: the first one builds the response
+    and the others wait for its result instead of querying the database again.
+
+    Args:
+        max_bytes (int): Maximum total size of the cached responses, 0 disables the cache.
+        ttl (float): Time to live of an entry in seconds.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        # Key -> (value, tag, size, expiry)
+        self._entries = OrderedDict()
+        # Tag -> keys of its entries
+        self._keys = {}
+        # Tag -> generation of its last invalidation
+        self._invalidated = {}
+        self._generation = 0
+        self._cleared = 0
+        # Key -> future of the response being built
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+            Returns the cached value for a key and marks it as recently used.
+
+            :param key: Cache key.
+            :return: Cached value, or None if the key is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[3] <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tag, size: int, generation: int = None):
+        """
+            Stores a value, evicting the least recently used entries if the cache is full.
+
+            :param key: Cache key.
+            :param value: Value to be cached.
+            :param tag: Tag of the value, see invalidate.
+            :param size: Size of the value in bytes.
+            :param generation: Generation read before the value was built, the value is not
+            stored if its tag was invalidated since. None to store it unconditionally.
+        """
+        if size > self._max_bytes or self._ttl <= 0:
+            return
+        with self._lock:
+            invalidated = max(self._invalidated.get(tag, 0), self._cleared)
+            if generation is not None and invalidated > generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, tag, size, time.monotonic() + self._ttl)
+            self._keys.setdefault(tag, set()).add(key)
+            self.bytes += size
+            while self.bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        """
+            Removes an entry, the lock must be held.
+
+            :param key: Cache key.
+        """
+        _, tag, size, _ = self._entries.pop(key)
+        self.bytes -= size
+        keys = self._keys.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[tag]
+
+    def generation(self):
+        """
+            Returns the current generation, to be passed to set once the value is built.
+
+            :return: Generation number.
+        """
+        with self._lock:
+            return self._generation
+
+    def invalidate(self, tag):
+        """
+            Removes the entries of a tag, and prevents storing the values being built for it.
+
+            Must be called after the write is committed, so a value built afterwards sees it.
+
+            :param tag: Tag of the entries.
+        """
+        with self._lock:
+            self._generation += 1
+            self._invalidated[tag] = self._generation
+            self.invalidations += 1
+            for key in list(self._keys.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        """
+            Removes all entries from the cache.
+        """
+        with self._lock:
+            self._generation += 1
+            self._cleared = self._generation
+            self._invalidated.clear()
+            self._entries.clear()
+            self._keys.clear()
+            self.bytes = 0
+
+    async def get_or_create(self, key, create):
+        """
+            Returns the cached value for a key, building it on a miss.
+
+            Only one build per key runs at a time, concurrent misses wait for its result, or
+            for its exception. If the build is cancelled, one of the waiters builds it again.
+
+            :param key: Cache key.
+            :param create: Coroutine function building the value, returning (value, tag, size).
+            :return: Cached or built value.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        generation = self.generation()
+        try:
+            value, tag, size = await create()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark the exception as retrieved, there may be no waiter to receive it
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+        self.set(key, value, tag, size, generation)
+        future.set_result(value)
+        return value
+
+    def stats(self):
+        """
+            Returns the cache counters.
+
+            :return: Dictionary with size, bytes, hits, misses, coalesced misses, evictions,
+            invalidations and hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Token string -> (UserSchema, token expiry) of already validated tokens
+token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+# Encoded restaurant and item list responses, tagged with the restaurant ID
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_TTL)
@@ -0,0 +1,93 @@
+"""Python 3.11"""
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from utils import settings
+
+pwd_context = CryptContext(
+    schemes=["sha256_crypt"],
+    deprecated="auto",
+    sha256_crypt__default_rounds=settings.PASSWORD_HASH_ROUNDS,
+    sha256_crypt__min_rounds=settings.PASSWORD_HASH_ROUNDS,
+)
+
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_QUEUE_DEPTH)
+
+
+def hash_password(password):
+    """
+        Hashes a password with the configured scheme and cost.
+
+        :param password: Plain text password.
+        :return: Hashed password.
+    """
+    return pwd_context.hash(password)
+
+
+def verify_password(password, hashed_password):
+    """
+        Verifies a password and rehashes it if the stored hash is outdated.
+
+        :param password: Plain text password.
+        :param hashed_password: Stored hashed password.
+        :return: Tuple of (valid, new_hash) where new_hash is None unless a rehash is needed.
+    """
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def get_executor():
+    """
+        Returns the hashing executor, creating it on first use.
+
+        The executor is a thread pool by default, or a process pool when
+        PASSWORD_HASH_EXECUTOR is set to "process".
+
+        :return: Executor running the hashing jobs.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.PASSWORD_HASH_EXECUTOR == "process":
+                _executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="hashing"
+                )
+        return _executor
+
+
+def shutdown():
+    """
+        Shuts down the hashing executor, waiting for running jobs to finish.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+
+
+async def run(func, *args):
+    """
+        Runs a hashing function on the hashing executor without blocking the event loop.
+
+        :param func: Module level hashing function to run.
+        :param args: Arguments passed to the function.
+        :return: Result of the function.
+        :raises HTTPException 503: If the hashing queue is full.
+    """
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=503, detail="Too many login attempts, try again later",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+    finally:
+        _slots.release()
@@ -0,0 +1,213 @@
+"""Python 3.11"""
+import datetime
+import email.utils
+import gzip
+import hashlib
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def etag_matches(request: Request, etag: str):
+    """
+        Tells whether the If-None-Match header of a request matches an entity tag.
+
+        Entity tags are compared weakly, as required for If-None-Match.
+
+        :param request: Request object.
+        :param etag: Entity tag of the current representation, quoted.
+        :return: True if the client already has the representation.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == current for tag in header.split(","))
+
+
+def weak_etag(*parts):
+    """
+        Builds a weak entity tag from the parts identifying a representation.
+
+        :param parts: Values identifying the representation, such as a version and the query string.
+        :return: Weak entity tag, quoted.
+    """
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def http_date(value: datetime.datetime):
+    """
+        Formats a date for the Last-Modified header.
+
+        :param value: Date and time, naive values are taken as UTC.
+        :return: HTTP date, such as "Wed, 15 May 2024 17:28:32 GMT".
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return email.utils.format_datetime(value.astimezone(datetime.timezone.utc), usegmt=True)
+
+
+def modified_since(request: Request, last_modified: datetime.datetime):
+    """
+        Tells whether a representation changed after the If-Modified-Since date of a request.
+
+        HTTP dates have a precision of a second, so the last modification is truncated to
+        the second before comparing.
+
+        :param request: Request object.
+        :param last_modified: Date of the last modification, naive values are taken as UTC.
+        :return: False if the client already has the representation, True otherwise
+        (also when the header is missing or invalid).
+    """
+    header = request.headers.get("if-modified-since")
+    if not header or last_modified is None:
+        return True
+    try:
+        since = email.utils.parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=datetime.timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=datetime.timezone.utc)
+    return last_modified.replace(microsecond=0) > since
+
+
+def not_modified(request: Request, etag: str, last_modified: datetime.datetime = None):
+    """
+        Evaluates the conditional headers of a GET request.
+
+        If-Modified-Since is only used when the request has no If-None-Match, as the entity
+        tag is the more precise validator.
+
+        :param request: Request object.
+        :param etag: Entity tag of the current representation, quoted.
+        :param last_modified: Date of the last modification of the representation.
+        :return: True if a 304 response should be sent.
+    """
+    if "if-none-match" in request.headers:
+        return etag_matches(request, etag)
+    return not modified_since(request, last_modified)
+
+
+def validator_headers(etag: str, last_modified: datetime.datetime = None,
+                      cache_control: str = "private, no-cache"):
+    """
+        Builds the validator headers of a response.
+
+        The default Cache-Control lets the client keep the response but revalidate it on
+        every use, and keeps it out of shared caches.
+
+        :param etag: Entity tag of the representation, quoted.
+        :param last_modified: Date of the last modification of the representation.
+        :param cache_control: Cache-Control header.
+        :return: Dictionary of headers.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def accepts_encoding(request: Request, encoding: str):
+    """
+        Tells whether a request accepts responses with a content coding.
+
+        :param request: Request object.
+        :param encoding: Content coding, such as "gzip" or "br".
+        :return: True if the coding (or *) is listed in Accept-Encoding without q=0.
+    """
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in (encoding, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def accepts_gzip(request: Request):
+    """
+        Tells whether a request accepts gzip encoded responses.
+
+        :param request: Request object.
+        :return: True if gzip is listed in Accept-Encoding without q=0.
+    """
+    return accepts_encoding(request, "gzip")
+
+
+class Document:
+    """
+    Response body encoded once and served many times.
+
+    The body is compressed and hashed when the document is created, so serving it
+    only picks the right bytes: a 304 for a matching If-None-Match, the gzip bytes
+    for clients accepting gzip, the plain bytes otherwise.
+
+    Args:
+        body (bytes): Encoded response body.
+        media_type (str): Content type of the body.
+        cache_control (str): Cache-Control header of the responses.
+    """
+
+    def __init__(self, body: bytes, media_type: str, cache_control: str = "no-cache"):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.cache_control = cache_control
+
+    def response(self, request: Request):
+        """
+            Builds the response to a request for the document.
+
+            :param request: Request object.
+            :return: Response with the document, or an empty 304 response.
+        """
+        headers = {
+            "ETag": self.etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"
+        }
+        if etag_matches(request, self.etag):
+            return Response(status_code=304, headers=headers)
+        if accepts_gzip(request):
+            headers["Content-Encoding"] = "gzip"
+            return Response(self.gzip_body, media_type=self.media_type, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+class Representation:
+    """
+    Encoded response body with its validators, built once and served from the response cache.
+
+    Args:
+        body (bytes): Encoded JSON body.
+        etag (str): Entity tag of the body, quoted.
+        last_modified (datetime.datetime): Date of the last modification, or None.
+    """
+
+    def __init__(self, body: bytes, etag: str, last_modified: datetime.datetime = None):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.headers = validator_headers(etag, last_modified)
+
+    @property
+    def size(self):
+        """
+            Approximate memory used by the representation, for the byte budget of the cache.
+
+            :return: Size in bytes.
+        """
+        return len(self.body) + 256
+
+    def response(self, request: Request):
+        """
+            Builds the response to a request for the representation.
+
+            :param request: Request object.
+            :return: JSON response, or an empty 304 response if the client's copy is current.
+        """
+        if not_modified(request, self.etag, self.last_modified):
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type="application/json", headers=self.headers)
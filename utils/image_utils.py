@@ -1,15 +1,142 @@
-import uuid
+"""Python 3.11"""
+import hashlib
+import os
+import re
+import tempfile
 
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 
-def save_image(image, key):
+from database import media
+from database.factory import SessionLocal
+from utils import media_files, settings
+
+
+class ImageTooLarge(Exception):
+    """
+    Raised when an uploaded image exceeds the maximum size.
+    """
+
+
+def _hash(source, max_size: int, chunk_size: int):
+    """
+        Hashes a file object by chunks, from its start.
+
+        :param source: Readable and seekable binary file object.
+        :param max_size: Maximum number of bytes read.
+        :param chunk_size: Size of the read buffer.
+        :return: Tuple of (hex SHA-256 digest, size in bytes).
+        :raises ImageTooLarge: If the source is larger than max_size.
+    """
+    source.seek(0)
+    digest, size = hashlib.sha256(), 0
+    while chunk := source.read(chunk_size):
+        size += len(chunk)
+        if size > max_size:
+            raise ImageTooLarge()
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+
+def _write_temporary(source, directory: str, chunk_size: int):
+    """
+        Copies a file object by chunks to a new temporary file.
+
+        :param source: Readable and seekable binary file object.
+        :param directory: Directory of the temporary file, created if needed.
+        :param chunk_size: Size of the copy buffer.
+        :return: Path of the temporary file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(
+            "wb", dir=directory, prefix=".upload-", delete=False
+    ) as buffer:
+        try:
+            while chunk := source.read(chunk_size):
+                buffer.write(chunk)
+        except BaseException:
+            buffer.close()
+            os.unlink(buffer.name)
+            raise
+    return buffer.name
+
+
+def _extension(filename: str):
+    """
+        Returns the extension of an uploaded file name, if it is a plain one.
+
+        :param filename: File name sent by the client.
+        :return: Lower case extension with its dot, or an empty string.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if re.fullmatch(r"\.[a-z0-9]{1,8}", extension) else ""
+
+
+def _store(source, key: str, extension: str, max_size: int, chunk_size: int):
+    """
+        Stores a file object under the hash of its content, unless the same content is already
+        stored.
+
+        The file is registered in the media store and renamed into place in one transaction,
+        so a concurrent garbage collection cannot delete it in between.
+
+        :param source: Readable and seekable binary file object.
+        :param key: Unique identifier or category for organizing the saved images.
+        :param extension: Extension of the stored file, with its dot.
+        :param max_size: Maximum size of the file in bytes.
+        :param chunk_size: Size of the read buffer.
+        :return: Stored path of the file, such as "media/image/ab/<sha256>.png".
+        :raises ImageTooLarge: If the source is larger than max_size, nothing is written.
+    """
+    digest, size = _hash(source, max_size, chunk_size)
+    path = f"{media_files.PREFIX}{key}/{digest[:2]}/{digest}{extension}"
+    file_path = media_files.local_path(path)
+    directory = os.path.dirname(file_path)
+    # The copy is written before taking the lock, renaming it into place is all that is left
+    temporary = None
+    if not os.path.exists(file_path):
+        temporary = _write_temporary(source, directory, chunk_size)
+    try:
+        with SessionLocal() as db:
+            media.register(db, path, size)
+            if not os.path.exists(file_path):
+                if temporary is None:
+                    # Collected since the check above
+                    temporary = _write_temporary(source, directory, chunk_size)
+                os.replace(temporary, file_path)
+                temporary = None
+            db.commit()
+    finally:
+        if temporary is not None:
+            os.unlink(temporary)
+    return path
+
+
+async def save_image(image, key, max_size: int = None):
     """
         Saves an image file to the specified directory.
 
-        :param image: File-like object representing the image to be saved.
+        Images are stored once per content, under the SHA-256 of their bytes, so uploading an
+        image that is already stored writes nothing. Files no longer used by an item or a
+        restaurant are deleted by background.collect_media_garbage.
+
+        The upload is read by chunks in the threadpool, so neither the whole file is held in
+        memory nor the event loop blocked while it is written. The file is written under a
+        temporary name and renamed once complete, so a partial image is never visible.
+
+        :param image: Uploaded file representing the image to be saved.
         :param key: Unique identifier or category for organizing the saved images.
+        :param max_size: Maximum size of the image in bytes, settings.IMAGE_MAX_SIZE when omitted.
         :return: File path where the image is saved.
+        :raises HTTPException 413: If the image is larger than the maximum size.
     """
-    file_path = f"media/{key}/{uuid.uuid4()}-{image.filename}"
-    with open(file_path, "wb") as buffer:
-        buffer.write(image.file.read())
-    return file_path
+    max_size = settings.IMAGE_MAX_SIZE if max_size is None else max_size
+    if image.size is not None and image.size > max_size:
+        raise HTTPException(status_code=413, detail="Image too large")
+    try:
+        return await run_in_threadpool(
+            _store, image.file, key, _extension(image.filename), max_size, settings.IMAGE_CHUNK_SIZE
+        )
+    except ImageTooLarge:
+        raise HTTPException(status_code=413, detail="Image too large")
@@ -0,0 +1,196 @@
+"""Python 3.11"""
+import concurrent.futures
+import logging
+import os
+import tempfile
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional, without it images are only served as uploaded
+    Image = ImageOps = None
+
+from database import crud
+from database.factory import SessionLocal
+from utils import media_files, settings
+
+logger = logging.getLogger(__name__)
+
+# Size name -> longest side in pixels, largest first so each variant is resized from the
+# previous one
+SIZES = {"medium": 960, "small": 480, "thumb": 160}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def available():
+    """
+        Tells whether variants are generated, which needs Pillow and IMAGE_VARIANTS_ENABLED.
+
+        :return: True if variants are generated.
+    """
+    return Image is not None and settings.IMAGE_VARIANTS_ENABLED
+
+
+def variant_path(path: str, size: str):
+    """
+        Returns the path of a variant, next to the original image.
+
+        :param path: Path of the original image.
+        :param size: Size name.
+        :return: Path such as "media/image/<name>.thumb.webp".
+    """
+    return f"{os.path.splitext(path)[0]}.{size}.webp"
+
+
+def pick(path: str, variants: dict, size: str = None):
+    """
+        Selects the image to serve for a requested size.
+
+        :param path: Path of the original image.
+        :param variants: Dictionary of size name -> variant path, None if not generated yet.
+        :param size: Requested size name, None for the original.
+        :return: Path of the variant, or of the original if there is no such variant.
+    """
+    if size is None or not variants:
+        return path
+    return variants.get(size, path)
+
+
+def _save(image, path: str):
+    """
+        Encodes an image as WebP through a temporary file renamed into place.
+
+        :param image: Pillow image.
+        :param path: Destination path.
+    """
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile("wb", dir=directory, prefix=".variant-", delete=False) as file:
+        try:
+            image.save(file, "WEBP", quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+        except BaseException:
+            file.close()
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
+
+
+def plan(path: str, longest: int):
+    """
+        Lists the variant paths of an image, sizes at least as large as the image share one variant.
+
+        :param path: Path of the original image.
+        :param longest: Longest side of the image in pixels.
+        :return: Dictionary of size name -> variant path.
+    """
+    variants, previous = {}, None
+    for size, side in SIZES.items():
+        if previous is None or longest > side:
+            previous = variant_path(path, size)
+        variants[size] = previous
+    return variants
+
+
+def generate(path: str):
+    """
+        Generates the WebP variants of an image.
+
+        The image is decoded once (JPEG files directly at a reduced scale), oriented from its EXIF
+        data, and every size is resized from the previous, larger one. An image is never enlarged.
+        Images are stored under the hash of their content, so variants that already exist are
+        up to date and the image is not decoded again.
+
+        :param path: Stored path of the original image, the files are under MEDIA_ROOT.
+        :return: Dictionary of size name -> variant path.
+        :raises OSError: If the image cannot be read or a variant cannot be written.
+    """
+    with Image.open(media_files.local_path(path)) as source:
+        variants = plan(path, max(source.size))
+        if all(os.path.exists(media_files.local_path(variant)) for variant in variants.values()):
+            return variants
+        largest = max(SIZES.values())
+        source.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        transparent = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if transparent else "RGB")
+    saved = set()
+    for size, side in SIZES.items():
+        if max(image.size) > side:
+            image.thumbnail((side, side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if variants[size] not in saved:
+            _save(image, media_files.local_path(variants[size]))
+            saved.add(variants[size])
+    return variants
+
+
+def process(kind: str, row_id: int, path: str):
+    """
+        Generates the variants of an image and records them on its item or restaurant.
+
+        Failures are logged, the image is then only served as uploaded.
+
+        :param kind: "item" or "restaurant".
+        :param row_id: ID of the item or restaurant.
+        :param path: Path of the original image.
+        :return: Dictionary of size name -> variant path, or None if they could not be generated.
+    """
+    try:
+        variants = generate(path)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning("Cannot generate the variants of %s: %s", path, exc)
+        return None
+    with SessionLocal() as db:
+        if kind == "item":
+            crud.set_item_image_variants(db, row_id, path, variants)
+        else:
+            crud.set_restaurant_logo_variants(db, row_id, path, variants)
+    return variants
+
+
+def submit(kind: str, row_id: int, path: str):
+    """
+        Queues the generation of the variants of an uploaded image, off the request path.
+
+        To be called once the row referencing the image is committed.
+
+        :param kind: "item" or "restaurant".
+        :param row_id: ID of the item or restaurant.
+        :param path: Path of the original image.
+        :return: Future of the variants, or None if variants are not generated.
+    """
+    global _executor
+    if not available() or not path:
+        return None
+    with _lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix="image-variants"
+            )
+        future = _executor.submit(process, kind, row_id, path)
+        _pending.add(future)
+    future.add_done_callback(_pending.discard)
+    return future
+
+
+def wait(timeout: float = None):
+    """
+        Waits for the queued variants to be generated.
+
+        :param timeout: Maximum number of seconds to wait, None to wait until they are all done.
+    """
+    with _lock:
+        pending = list(_pending)
+    concurrent.futures.wait(pending, timeout)
+
+
+def shutdown():
+    """
+        Stops the worker threads once the queued variants are generated.
+    """
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,73 @@
+"""Python 3.11"""
+import csv
+import io
+
+from database import crud
+from database.factory import read_session
+from utils import serialization
+from utils.responses import ItemResponseSchema
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# CSV columns, the scalar item fields (without the links and image variants), readable by the
+# item import
+CSV_COLUMNS = [name for name in ItemResponseSchema.model_fields if name != "image_variants"]
+
+
+def _ndjson_chunk(rows):
+    """
+        Encodes item rows as NDJSON, one item response object per line.
+
+        :param rows: Item rows.
+        :return: UTF-8 encoded lines.
+    """
+    adapter = serialization.adapter(ItemResponseSchema)
+    return b"".join(
+        adapter.dump_json(adapter.validate_python(row, from_attributes=True)) + b"\n"
+        for row in rows
+    )
+
+
+def _csv_chunk(rows, header: bool = False):
+    """
+        Encodes item rows as CSV lines.
+
+        :param rows: Item rows.
+        :param header: Whether the chunk starts with the header line.
+        :return: UTF-8 encoded lines.
+    """
+    adapter = serialization.adapter(ItemResponseSchema)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        item = adapter.validate_python(row, from_attributes=True)
+        values = adapter.dump_python(item, mode="json")
+        writer.writerow(values[column] for column in CSV_COLUMNS)
+    return buffer.getvalue().encode("utf-8")
+
+
+def export_items(restaurant_id: int = None, data_format: str = "ndjson", batch_size: int = 1000):
+    """
+        Streams the items of a restaurant, or of all restaurants, as CSV (with a header line) or
+        NDJSON.
+
+        Rows are read from a cursor of their own read session batch by batch and every batch
+        is encoded and yielded as one chunk before the next one is fetched, so memory use stays
+        flat whatever the number of items. The session is closed when the iteration ends or
+        the generator is closed, for instance when the client disconnects.
+
+        :param restaurant_id: ID of the restaurant, None for the items of all restaurants.
+        :param data_format: "csv" or "ndjson".
+        :param batch_size: Number of rows fetched and encoded at a time.
+        :yield: Encoded chunks of the file.
+    """
+    with read_session() as db:
+        if data_format == "csv":
+            yield _csv_chunk([], header=True)
+        for rows in crud.iter_item_batches(db, restaurant_id, batch_size):
+            yield _csv_chunk(rows) if data_format == "csv" else _ndjson_chunk(rows)
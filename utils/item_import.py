@@ -0,0 +1,199 @@
+"""Python 3.11"""
+import codecs
+import csv
+import json
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from database import async_crud, schema
+from utils import settings
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def _decode(line: bytes):
+    """
+        Decodes one line of the body.
+
+        :param line: UTF-8 encoded line without its line feed.
+        :return: Tuple of (line or None, parse error message or None).
+    """
+    try:
+        return line.decode("utf-8").rstrip("\r"), None
+    except UnicodeDecodeError as exc:
+        return None, f"Invalid UTF-8 at byte {exc.start}"
+
+
+async def _lines(chunks: AsyncIterator[bytes], max_line_size: int):
+    """
+        Splits a stream of UTF-8 encoded chunks into lines.
+
+        Only the newly received bytes are searched for line feeds. A line longer than
+        max_line_size bytes is not kept in memory, it is reported as an error and skipped up to
+        its line feed, as is a line that is not valid UTF-8.
+
+        :param chunks: Async iterator of body chunks.
+        :param max_line_size: Maximum size of a line in bytes.
+        :yield: Tuples of (line without its line terminator or None, parse error message or None).
+    """
+    too_long = f"Line longer than {max_line_size} bytes"
+    pending, skipping, first = b"", False, True
+    async for chunk in chunks:
+        searched = len(pending)
+        pending += chunk
+        start = 0
+        while (end := pending.find(b"\n", max(start, searched))) != -1:
+            line, start = pending[start:end], end + 1
+            if first:
+                line, first = line.removeprefix(codecs.BOM_UTF8), False
+            if skipping:
+                skipping = False
+            elif len(line) > max_line_size:
+                yield None, too_long
+            else:
+                yield _decode(line)
+        pending = pending[start:]
+        if len(pending) > max_line_size:
+            if not skipping:
+                yield None, too_long
+            pending, skipping = b"", True
+    if pending and not skipping:
+        yield _decode(pending.removeprefix(codecs.BOM_UTF8) if first else pending)
+
+
+async def _csv_rows(chunks: AsyncIterator[bytes], max_record_size: int):
+    """
+        Parses a streamed CSV body with a header line into dictionaries.
+
+        Quoted fields spanning several lines are joined before parsing. A record whose quote
+        is still open after max_record_size characters, or at the end of the body, is reported
+        as a parse error and parsing goes on with the next line, as are the lines that _lines
+        cannot read.
+
+        :param chunks: Async iterator of body chunks.
+        :param max_record_size: Maximum size of a record in characters.
+        :yield: Tuples of (row number, row dictionary or parse error message).
+    """
+    header, record, record_size, open_quote, row_number = None, [], 0, False, 0
+    async for line, error in _lines(chunks, max_record_size):
+        if error is not None:
+            record, record_size, open_quote = [], 0, False
+            row_number += 1
+            yield row_number, error
+            continue
+        record.append(line)
+        record_size += len(line) + 1
+        open_quote ^= line.count('"') % 2 == 1
+        if open_quote and record_size <= max_record_size:
+            continue
+        text, record, record_size = "\n".join(record), [], 0
+        if open_quote:
+            open_quote = False
+            row_number += 1
+            yield row_number, "Unterminated quoted field"
+            continue
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]), [])
+        except csv.Error as exc:
+            row_number += 1
+            yield row_number, f"Invalid CSV: {exc}"
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, f"Expected {len(header)} columns, got {len(values)}"
+        else:
+            yield row_number, dict(zip(header, values))
+    if record:
+        yield row_number + 1, "Unterminated quoted field"
+
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes], max_line_size: int):
+    """
+        Parses a streamed NDJSON body, one JSON object per line.
+
+        :param chunks: Async iterator of body chunks.
+        :param max_line_size: Maximum size of a line in bytes.
+        :yield: Tuples of (row number, row dictionary or parse error message).
+    """
+    row_number = 0
+    async for line, error in _lines(chunks, max_line_size):
+        if error is not None:
+            row_number += 1
+            yield row_number, error
+            continue
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield row_number, f"Invalid JSON: {exc.msg}"
+            continue
+        yield row_number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+async def import_items(db, chunks: AsyncIterator[bytes], data_format: str, batch_size: int):
+    """
+        Validates and inserts the items of a streamed CSV or NDJSON body.
+
+        Rows are validated against the fields of schema.ItemDataSchema as they arrive and
+        valid rows are inserted with one multi-row INSERT per batch, each batch in its own
+        transaction, so memory use is bounded by the batch size and not by the body size.
+
+        :param db: Database session.
+        :param chunks: Async iterator of body chunks.
+        :param data_format: "csv" or "ndjson".
+        :param batch_size: Number of rows inserted per transaction.
+        :return: Dictionary with the number of inserted and failed rows and the per-row errors.
+    """
+    report = {"inserted": 0, "failed": 0, "errors": []}
+    batch = []
+
+    def fail(row_number, errors):
+        report["failed"] += 1
+        report["errors"].append({"row": row_number, "errors": errors})
+
+    async def flush():
+        restaurant_ids = {row["restaurant_id"] for _, row in batch}
+        existing = await async_crud.get_existing_restaurant_ids(db, restaurant_ids)
+        valid = []
+        for row_number, row in batch:
+            if row["restaurant_id"] in existing:
+                valid.append(row)
+            else:
+                fail(row_number, [
+                    f"restaurant_id: Restaurant {row['restaurant_id']} does not exist"
+                ])
+        report["inserted"] += await async_crud.bulk_create_items(db, valid)
+        batch.clear()
+
+    if data_format == "csv":
+        rows = _csv_rows(chunks, settings.IMPORT_MAX_RECORD_SIZE)
+    else:
+        rows = _ndjson_rows(chunks, settings.IMPORT_MAX_RECORD_SIZE)
+    async for row_number, row in rows:
+        if isinstance(row, str):
+            fail(row_number, [row])
+            continue
+        try:
+            batch.append((row_number, schema.ItemDataSchema(**row).dict()))
+        except ValidationError as exc:
+            fail(row_number, [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                for error in exc.errors()
+            ])
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return report
@@ -0,0 +1,92 @@
+"""Python 3.11"""
+import datetime
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from utils import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """
+    Progress of a background job.
+
+    Args:
+        id (str): Unique identifier of the job.
+        kind (str): Kind of work done by the job.
+        user_id (int): ID of the user who started the job.
+        total (int): Number of rows the job expects to process.
+        done (int): Number of rows processed so far.
+        status (str): "pending", "running", "done" or "failed".
+        error (str): Error message if the job failed.
+    """
+    kind: str
+    user_id: int
+    total: int
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    done: int = 0
+    status: str = "pending"
+    error: Optional[str] = None
+    created_at: datetime.datetime = field(default_factory=datetime.datetime.utcnow)
+    finished_at: Optional[datetime.datetime] = None
+
+
+_jobs = OrderedDict()
+_lock = threading.Lock()
+
+
+def create(kind: str, user_id: int, total: int):
+    """
+        Registers a new job.
+
+        Only the JOBS_HISTORY_SIZE most recent jobs are kept.
+
+        :param kind: Kind of work done by the job.
+        :param user_id: ID of the user who started the job.
+        :param total: Number of rows the job expects to process.
+        :return: Job object.
+    """
+    job = Job(kind=kind, user_id=user_id, total=total)
+    with _lock:
+        _jobs[job.id] = job
+        while len(_jobs) > settings.JOBS_HISTORY_SIZE:
+            _jobs.popitem(last=False)
+    return job
+
+
+def get(job_id: str):
+    """
+        Retrieves a job by ID.
+
+        :param job_id: ID of the job.
+        :return: Job object if found, otherwise None.
+    """
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def run(job: Job, step, *args):
+    """
+        Runs a chunked job until a step processes no more rows.
+
+        Meant to be run in the threadpool, for example as a FastAPI background task.
+
+        :param job: Job object updated with the progress.
+        :param step: Function processing one chunk and returning the number of processed rows.
+        :param args: Arguments passed to the step function.
+    """
+    job.status = "running"
+    try:
+        while processed := step(*args):
+            job.done += processed
+        job.status = "done"
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("Job %s (%s) failed", job.id, job.kind)
+        job.status, job.error = "failed", str(exc)
+    job.finished_at = datetime.datetime.utcnow()
@@ -0,0 +1,216 @@
+"""Python 3.11"""
+import datetime
+import mimetypes
+import os
+import re
+import stat
+
+import anyio
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from utils import http_cache, settings
+
+# Stored media paths start with this prefix, which is also the URL of the files
+PREFIX = "media/"
+
+# Precompressed siblings of a file ("<name>.br", "<name>.gz"), in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(Exception):
+    """
+    Raised when the byte range of a request starts after the end of the file.
+    """
+
+
+class MediaResponse(FileResponse):
+    """
+    File response sending the whole file or one byte range of it.
+
+    A whole file goes through FileResponse, which hands the path to the server when it supports
+    the ASGI pathsend extension, so the file is sent without being copied through Python.
+
+    Args:
+        path (str): Path of the file.
+        stat_result (os.stat_result): Status of the file.
+        headers (dict): Response headers.
+        media_type (str): Content type of the file.
+        byte_range (tuple): Inclusive (first, last) byte positions, None for the whole file.
+    """
+    chunk_size = settings.MEDIA_CHUNK_SIZE
+
+    def __init__(self, path: str, stat_result: os.stat_result, headers: dict, media_type: str,
+                 byte_range: tuple = None):
+        self.byte_range = byte_range
+        if byte_range is not None:
+            first, last = byte_range
+            headers = {
+                **headers, "Content-Length": str(last - first + 1),
+                "Content-Range": f"bytes {first}-{last}/{stat_result.st_size}"
+            }
+        super().__init__(path, status_code=200 if byte_range is None else 206, headers=headers,
+                         media_type=media_type, stat_result=stat_result)
+
+    async def __call__(self, scope, receive, send):
+        if self.byte_range is None:
+            await super().__call__(scope, receive, send)
+            return
+        await send({
+            "type": "http.response.start", "status": self.status_code, "headers": self.raw_headers
+        })
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        first, last = self.byte_range
+        remaining = last - first + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(first)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body", "body": chunk, "more_body": remaining > 0
+                })
+        if remaining > 0:
+            # The file is immutable, it can only have been truncated by an outside process
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def local_path(path: str):
+    """
+        Returns the file of a stored media path, under MEDIA_ROOT.
+
+        :param path: Stored path, such as "media/image/ab/<sha256>.png".
+        :return: File path, such as "<MEDIA_ROOT>/image/ab/<sha256>.png". Paths without the media
+        prefix are returned unchanged.
+    """
+    if not path.startswith(PREFIX):
+        return path
+    return os.path.join(settings.MEDIA_ROOT, path[len(PREFIX):])
+
+
+def resolve(path: str):
+    """
+        Turns the path of a media URL into the path of a file under the media root.
+
+        :param path: Path after /media/, such as "image/ab/<sha256>.png".
+        :return: File path such as "<MEDIA_ROOT>/image/ab/<sha256>.png", or None if the path
+        leaves the media root or names a hidden (temporary) file.
+    """
+    parts = path.split("/")
+    if not path or any(
+            not part or part.startswith(".") or "\\" in part or "\0" in part for part in parts
+    ):
+        return None
+    return os.path.join(settings.MEDIA_ROOT, *parts)
+
+
+def select(request: Request, file_path: str):
+    """
+        Chooses the file to send, a precompressed sibling when the client accepts its encoding.
+
+        :param request: Request object.
+        :param file_path: Path of the requested file.
+        :return: Tuple of (path, encoding or None, stat result).
+        :raises FileNotFoundError: If the requested file is not a regular file.
+    """
+    for encoding, suffix in ENCODINGS:
+        if http_cache.accepts_encoding(request, encoding):
+            try:
+                stat_result = os.stat(file_path + suffix)
+            except OSError:
+                continue
+            if stat.S_ISREG(stat_result.st_mode):
+                return file_path + suffix, encoding, stat_result
+    stat_result = os.stat(file_path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(file_path)
+    return file_path, None, stat_result
+
+
+def parse_range(header: str, size: int):
+    """
+        Parses a Range header for a file.
+
+        Only a single byte range is served, other headers are ignored and the whole file is sent,
+        as the HTTP specification allows.
+
+        :param header: Value of the Range header.
+        :param size: Size of the file in bytes.
+        :return: Inclusive (first, last) byte positions, or None to send the whole file.
+        :raises RangeNotSatisfiable: If the range starts after the end of the file.
+    """
+    match = RANGE_PATTERN.fullmatch(header.replace(" ", ""))
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    if match.group(1) == "":
+        # Suffix range, the last n bytes
+        length = int(match.group(2))
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    first = int(match.group(1))
+    last = size - 1 if match.group(2) == "" else min(int(match.group(2)), size - 1)
+    if first >= size:
+        raise RangeNotSatisfiable()
+    if last < first:
+        return None
+    return first, last
+
+
+async def response(request: Request, path: str):
+    """
+        Builds the response to a request for a media file.
+
+        Stored file names are unique (content hashes, or UUIDs for older uploads) and a stored
+        file is never rewritten, so the responses are cacheable for a year as immutable.
+
+        :param request: Request object.
+        :param path: Path after /media/.
+        :return: Response with the file, a byte range of it, or an empty 304 response.
+        :raises HTTPException 404: If there is no such file.
+    """
+    file_path = resolve(path)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    try:
+        selected, encoding, stat_result = await run_in_threadpool(select, request, file_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Media not found")
+    suffix = "-" + encoding if encoding else ""
+    etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}{suffix}"'
+    last_modified = datetime.datetime.fromtimestamp(
+        int(stat_result.st_mtime), datetime.timezone.utc
+    )
+    headers = http_cache.validator_headers(
+        etag, last_modified, cache_control=f"public, max-age={settings.MEDIA_MAX_AGE}, immutable"
+    )
+    headers["Vary"] = "Accept-Encoding"
+    if http_cache.not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if settings.MEDIA_ACCEL_REDIRECT:
+        # The proxy sends the file with sendfile and serves the byte ranges itself
+        sibling = selected[len(file_path):]
+        headers["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT + path + sibling
+        return Response(media_type=media_type, headers=headers)
+    headers["Accept-Ranges"] = "bytes"
+    byte_range = None
+    header = request.headers.get("range")
+    # A range of an older version of the file is not combined with the current one
+    if header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range(header, stat_result.st_size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{stat_result.st_size}"
+            return Response(status_code=416, headers=headers)
+    return MediaResponse(selected, stat_result, headers, media_type, byte_range)
@@ -0,0 +1,329 @@
+"""Python 3.11"""
+import bisect
+import math
+import threading
+
+from database import factory
+from utils.cache import response_cache, token_cache
+
+# Latency buckets in seconds and response size buckets in bytes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    """
+        Escapes a label value for the Prometheus text format.
+
+        :param value: Label value.
+        :return: Escaped string.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple):
+    """
+        Formats a label set in the Prometheus text format.
+
+        :param names: Label names.
+        :param values: Label values, in the order of the names.
+        :return: Label string such as '{method="GET"}', or an empty string without labels.
+    """
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float):
+    """
+        Formats a sample value in the Prometheus text format.
+
+        :param value: Sample value.
+        :return: Formatted value.
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class of the metrics, a family of samples sharing a name and label names.
+
+    Args:
+        name (str): Metric name.
+        description (str): Help text of the metric.
+        label_names (tuple): Names of the labels of every sample.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: tuple = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """
+            Returns the samples of the metric.
+
+            :return: List of (name suffix, label names, label values, value) tuples.
+        """
+        with self._lock:
+            return [("", self.label_names, labels, value) for labels, value in self._values.items()]
+
+    def render(self):
+        """
+            Renders the metric in the Prometheus text format.
+
+            :return: Lines of the metric.
+        """
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(names, values)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count.
+    """
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        """
+            Increments the count of a label set.
+
+            :param labels: Label values.
+            :param amount: Amount added to the count.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, *labels, value: float):
+        """
+            Sets the count of a label set, for counts kept by another object and read by a
+            collector.
+
+            :param labels: Label values.
+            :param value: Current count, it must never decrease.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down.
+    """
+    kind = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        """
+            Increments the value of a label set.
+
+            :param labels: Label values.
+            :param amount: Amount added to the value, negative to decrement it.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, *labels, value: float):
+        """
+            Sets the value of a label set.
+
+            :param labels: Label values.
+            :param value: New value.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+
+    Args:
+        name (str): Metric name.
+        description (str): Help text of the metric.
+        label_names (tuple): Names of the labels of every sample.
+        buckets (tuple): Sorted upper bounds of the buckets, +Inf is added automatically.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        """
+            Records an observation.
+
+            :param labels: Label values.
+            :param value: Observed value.
+        """
+        with self._lock:
+            counts, total = self._values.get(labels, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def samples(self):
+        """
+            Returns the cumulative bucket, sum and count samples of the histogram.
+
+            :return: List of (name suffix, label names, label values, value) tuples.
+        """
+        names = self.label_names + ("le",)
+        samples = []
+        with self._lock:
+            for labels, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append(("_bucket", names, labels + (_number(bound),), cumulative))
+                samples.append(("_sum", self.label_names, labels, total))
+                samples.append(("_count", self.label_names, labels, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Set of metrics rendered together, plus collectors refreshing gauges at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric: Metric):
+        """
+            Adds a metric to the registry.
+
+            :param metric: Metric to be exposed.
+            :return: The metric.
+        """
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """
+            Adds a function called before every render, usually to set gauges.
+
+            :param func: Function without arguments.
+            :return: The function, so it can be used as a decorator.
+        """
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        """
+            Renders all metrics in the Prometheus text format.
+
+            :return: Exposition text.
+        """
+        for func in self._collectors:
+            func()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "Number of HTTP requests.", ("method", "route", "status")
+))
+IN_PROGRESS = registry.register(Gauge(
+    "http_requests_in_progress", "Number of HTTP requests being served.", ("method", "route")
+))
+LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time taken to serve HTTP requests.", ("method", "route"),
+    LATENCY_BUCKETS
+))
+RESPONSE_SIZE = registry.register(Histogram(
+    "http_response_size_bytes", "Size of HTTP response bodies.", ("method", "route"), SIZE_BUCKETS
+))
+POOL_CHECKED_OUT = registry.register(Gauge(
+    "db_pool_connections_checked_out", "Database connections in use.", ("engine",)
+))
+POOL_SIZE = registry.register(Gauge(
+    "db_pool_size", "Configured size of the database connection pool.", ("engine",)
+))
+POOL_OVERFLOW = registry.register(Gauge(
+    "db_pool_overflow", "Database connections opened above the pool size.", ("engine",)
+))
+CACHE_HIT_RATIO = registry.register(Gauge(
+    "cache_hit_ratio", "Ratio of cache lookups answered from the cache.", ("cache",)
+))
+CACHE_SIZE = registry.register(Gauge(
+    "cache_entries", "Number of entries held by a cache.", ("cache",)
+))
+CACHE_BYTES = registry.register(Gauge(
+    "cache_bytes", "Memory used by the entries of a byte-bounded cache.", ("cache",)
+))
+CACHE_EVENTS = registry.register(Counter(
+    "cache_events_total", "Cache hits, misses, coalesced misses, evictions and invalidations.",
+    ("cache", "event")
+))
+
+# Caches exposed by the cache gauges, name -> object with a stats() method
+caches = {"token": token_cache, "response": response_cache}
+
+
+def _engines():
+    """
+        Lists the engines of the application with a display name.
+
+        :return: Dictionary of name -> sync engine.
+    """
+    engines = {"primary": factory.engine}
+    engines.update(
+        (f"read-{index}", read_engine) for index, read_engine in enumerate(factory.read_engines)
+        if read_engine is not factory.engine
+    )
+    if factory.async_engine is not None:
+        engines["async-primary"] = factory.async_engine.sync_engine
+        engines.update(
+            (f"async-read-{index}", read_engine.sync_engine)
+            for index, read_engine in enumerate(factory.async_read_engines)
+            if read_engine is not factory.async_engine
+        )
+    return engines
+
+
+@registry.collector
+def collect_pools():
+    """
+        Sets the connection pool gauges, pools without a fixed size only report their checkouts.
+    """
+    for name, engine in _engines().items():
+        pool = engine.pool
+        if hasattr(pool, "checkedout"):
+            POOL_CHECKED_OUT.set(name, value=pool.checkedout())
+        if hasattr(pool, "size"):
+            POOL_SIZE.set(name, value=pool.size())
+        if hasattr(pool, "overflow"):
+            POOL_OVERFLOW.set(name, value=max(pool.overflow(), 0))
+
+
+@registry.collector
+def collect_caches():
+    """
+        Sets the cache gauges.
+    """
+    for name, cache in caches.items():
+        stats = cache.stats()
+        CACHE_HIT_RATIO.set(name, value=stats["hit_ratio"])
+        CACHE_SIZE.set(name, value=stats["size"])
+        if "bytes" in stats:
+            CACHE_BYTES.set(name, value=stats["bytes"])
+        for event in ("hits", "misses", "coalesced", "evictions", "invalidations"):
+            if event in stats:
+                CACHE_EVENTS.set(name, event, value=stats[event])
@@ -0,0 +1,145 @@
+"""Python 3.11"""
+import logging
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+
+from database import instrumentation
+from utils import metrics, settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware collecting the SQL statistics of every HTTP request.
+
+    The number of statements, the time spent in the database and the rows touched are sent
+    in the Server-Timing response header and logged once the request is finished. Statements
+    executed repeatedly in one request are logged as likely N+1 patterns.
+
+    Args:
+        app: ASGI application.
+        repeat_threshold (int): Executions of one statement flagged as a likely N+1 pattern.
+    """
+
+    def __init__(self, app, repeat_threshold: int = settings.SQL_REPEAT_THRESHOLD):
+        self.app = app
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats, token = instrumentation.start()
+        started = time.perf_counter()
+        status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", server_timing(stats, time.perf_counter() - started)
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            instrumentation.stop(token)
+            self.log(scope, status, stats, time.perf_counter() - started)
+
+    def log(self, scope, status, stats, elapsed: float):
+        """
+            Logs the SQL statistics of a finished request.
+
+            :param scope: ASGI scope of the request.
+            :param status: Response status code, None if no response was sent.
+            :param stats: QueryStats of the request.
+            :param elapsed: Seconds taken by the request.
+        """
+        logger.info(
+            "%s %s %s: %d statements, %d rows, %.1fms in the database, %.1fms total",
+            scope["method"], scope["path"], status, stats.statements, stats.rows,
+            stats.duration * 1000, elapsed * 1000
+        )
+        for statement, count in stats.repeated(self.repeat_threshold):
+            logger.warning(
+                "Possible N+1 query in %s %s, statement executed %d times: %s",
+                scope["method"], scope["path"], count, " ".join(statement.split())[:300]
+            )
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the request count, in-flight requests, latency,
+    response size and status code of every HTTP request.
+
+    Requests are labelled with the path template of their route (such as
+    "/items/{item_id}/") rather than the raw path, so the number of series stays bounded.
+
+    Args:
+        app: ASGI application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, route = scope["method"], route_template(scope)
+        started = time.perf_counter()
+        status, size = 500, 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.IN_PROGRESS.inc(method, route)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            metrics.IN_PROGRESS.inc(method, route, amount=-1)
+            metrics.REQUESTS.inc(method, route, str(status))
+            metrics.LATENCY.observe(method, route, value=time.perf_counter() - started)
+            metrics.RESPONSE_SIZE.observe(method, route, value=size)
+
+
+def route_template(scope):
+    """
+        Finds the path template of the route serving a request.
+
+        :param scope: ASGI scope of the request.
+        :return: Path template of the matching route, or "unmatched".
+    """
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+
+def server_timing(stats, elapsed: float):
+    """
+        Formats the Server-Timing header value of a request.
+
+        :param stats: QueryStats of the request.
+        :param elapsed: Seconds taken by the request so far.
+        :return: Header value with the "db" and "app" metrics.
+    """
+    return (
+        f'db;dur={stats.duration * 1000:.2f};'
+        f'desc="{stats.statements} statements, {stats.rows} rows", '
+        f'app;dur={elapsed * 1000:.2f}'
+    )
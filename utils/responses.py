@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, computed_field
 
@@ -49,6 +49,9 @@ class RestaurantResponseSchema(BaseSchema):
         :param opening_time: Opening time of the restaurant.
         :param closing_time: Closing time of the restaurant.
         :param logo: URL to the restaurant's logo image.
+        :param logo_variants: URLs of the resized versions of the logo by size name, once generated.
+        :param latitude: Latitude of the restaurant in degrees.
+        :param longitude: Longitude of the restaurant in degrees.
     """
     user_id: int
     name: str
@@ -58,6 +61,9 @@ class RestaurantResponseSchema(BaseSchema):
     opening_time: str
     closing_time: str
     logo: str
+    logo_variants: Optional[Dict[str, str]] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     class Config:
         from_attributes = True
@@ -78,6 +84,46 @@ class RestaurantResponseSchema(BaseSchema):
         }
 
 
+class PublicRestaurantResponseSchema(BaseSchema):
+    """
+        Schema representing the public details of a restaurant, without its owner and contact
+        details.
+
+        Inherits from BaseSchema.
+
+        :param name: Name of the restaurant.
+        :param address: Address of the restaurant.
+        :param opening_time: Opening time of the restaurant.
+        :param closing_time: Closing time of the restaurant.
+        :param logo: URL to the restaurant's logo image.
+        :param logo_variants: URLs of the resized versions of the logo by size name, once generated.
+        :param latitude: Latitude of the restaurant in degrees.
+        :param longitude: Longitude of the restaurant in degrees.
+    """
+    name: str
+    address: str
+    opening_time: str
+    closing_time: str
+    logo: str
+    logo_variants: Optional[Dict[str, str]] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
+class NearbyRestaurantResponseSchema(PublicRestaurantResponseSchema):
+    """
+        Schema representing a restaurant found near a location.
+
+        Inherits from PublicRestaurantResponseSchema.
+
+        :param distance_km: Great-circle distance from the location in kilometers.
+    """
+    distance_km: float
+
+
 class ItemResponseSchema(BaseSchema):
     """
     Schema representing an item response.
@@ -91,6 +137,7 @@ class ItemResponseSchema(BaseSchema):
     :param price: Price of the item.
     :param is_active: Indicates whether the item is active.
     :param image: URL to the item's image.
+    :param image_variants: URLs of the resized versions of the image by size name, once generated.
     """
     restaurant_id: int
     name: str
@@ -99,6 +146,7 @@ class ItemResponseSchema(BaseSchema):
     price: float
     is_active: bool
     image: str
+    image_variants: Optional[Dict[str, str]] = None
 
     class Config:
         """
@@ -118,3 +166,68 @@ class ItemResponseSchema(BaseSchema):
             "items-collection": f"/api/items/{self.restaurant_id}/",
             "restaurant": f"/api/restaurant/"
         }
+
+
+class ItemPageResponseSchema(BaseModel):
+    """
+    Schema representing one page of items.
+
+    :param items: Items of the page.
+    :param next_cursor: Cursor of the next page, None on the last page.
+    :param prev_cursor: Cursor of the previous page, None on the first page.
+    :param limit: Maximum number of items per page.
+    """
+    items: List[ItemResponseSchema]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    limit: int
+
+
+class ImportErrorSchema(BaseModel):
+    """
+    Schema representing the errors of one rejected import row.
+
+    :param row: Number of the row in the imported file, starting at 1 (after the CSV header).
+    :param errors: Error messages of the row.
+    """
+    row: int
+    errors: List[str]
+
+
+class ImportReportSchema(BaseModel):
+    """
+    Schema representing the result of a bulk item import.
+
+    :param inserted: Number of inserted items.
+    :param failed: Number of rejected rows.
+    :param errors: Errors of the rejected rows.
+    """
+    inserted: int
+    failed: int
+    errors: List[ImportErrorSchema]
+
+
+class JobResponseSchema(BaseModel):
+    """
+    Schema representing the progress of a background job.
+
+    :param id: Unique identifier of the job.
+    :param kind: Kind of work done by the job.
+    :param status: "pending", "running", "done" or "failed".
+    :param total: Number of rows the job expects to process.
+    :param done: Number of rows processed so far.
+    :param error: Error message if the job failed.
+    :param created_at: Date and time when the job was created.
+    :param finished_at: Date and time when the job finished.
+    """
+    id: str
+    kind: str
+    status: str
+    total: int
+    done: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
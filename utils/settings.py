@@ -0,0 +1,164 @@
+"""Python 3.11"""
+import os
+
+
+def _env_int(name, default):
+    """
+        Reads an integer setting from the environment.
+
+        :param name: Name of the environment variable.
+        :param default: Value used when the variable is not set.
+        :return: Integer value of the setting.
+    """
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name, default):
+    """
+        Reads a float setting from the environment.
+
+        :param name: Name of the environment variable.
+        :param default: Value used when the variable is not set.
+        :return: Float value of the setting.
+    """
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name, default):
+    """
+        Reads a boolean setting from the environment.
+
+        :param name: Name of the environment variable.
+        :param default: Value used when the variable is not set.
+        :return: True for "1", "true", "yes" or "on", otherwise False.
+    """
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Token to user cache used by auth_utils.get_current_user
+TOKEN_CACHE_SIZE = _env_int("TOKEN_CACHE_SIZE", 1024)
+TOKEN_CACHE_TTL = _env_float("TOKEN_CACHE_TTL", 300.0)
+
+# Cache of the restaurant and item list responses, see utils.cache.ResponseCache. Each worker
+# has its own cache, the entries are keyed by the version of the restaurant or menu read on every
+# request, so the writes of other workers are seen, and the entries of outdated versions left by
+# them are evicted after RESPONSE_CACHE_TTL seconds
+RESPONSE_CACHE_MAX_BYTES = _env_int("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+RESPONSE_CACHE_TTL = _env_float("RESPONSE_CACHE_TTL", 60.0)
+
+# Password hashing executor used by models.User
+PASSWORD_HASH_ROUNDS = _env_int("PASSWORD_HASH_ROUNDS", 535000)
+PASSWORD_HASH_WORKERS = _env_int("PASSWORD_HASH_WORKERS", 2)
+PASSWORD_HASH_QUEUE_DEPTH = _env_int("PASSWORD_HASH_QUEUE_DEPTH", 32)
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+
+# Background purge of expired tokens, an interval of 0 disables the job
+TOKEN_PURGE_INTERVAL = _env_float("TOKEN_PURGE_INTERVAL", 3600.0)
+TOKEN_PURGE_BATCH_SIZE = _env_int("TOKEN_PURGE_BATCH_SIZE", 500)
+
+# Background deletion of the media files no longer used, an interval of 0 disables the job.
+# A file is kept for MEDIA_GC_GRACE seconds after it stops being used.
+MEDIA_GC_INTERVAL = _env_float("MEDIA_GC_INTERVAL", 3600.0)
+MEDIA_GC_GRACE = _env_float("MEDIA_GC_GRACE", 3600.0)
+MEDIA_GC_BATCH_SIZE = _env_int("MEDIA_GC_BATCH_SIZE", 500)
+
+# Authentication token mode, "database" (UUID tokens looked up in the tokens table)
+# or "signed" (HMAC signed tokens carrying the user, validated in memory)
+AUTH_TOKEN_MODE = os.getenv("AUTH_TOKEN_MODE", "database")
+# Seconds between two copies of the revoked_tokens table to the revocation list of a worker,
+# the delay before the other workers reject a revoked signed token
+AUTH_REVOCATION_REFRESH_INTERVAL = _env_float("AUTH_REVOCATION_REFRESH_INTERVAL", 10.0)
+# Comma separated "key_id:secret" pairs, the active key signs new tokens
+AUTH_SIGNING_KEYS = os.getenv("AUTH_SIGNING_KEYS", "")
+AUTH_ACTIVE_KEY_ID = os.getenv("AUTH_ACTIVE_KEY_ID", "")
+
+# Database engine, ASYNC_DATABASE_URL defaults to the aiosqlite form of a sqlite DATABASE_URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+# Serve requests with an AsyncSession (aiosqlite) instead of the sync Session
+DATABASE_ASYNC = _env_bool("DATABASE_ASYNC", False)
+# Comma separated read replica URLs, reads use a query_only pool on a SQLite primary when empty
+DATABASE_READ_URLS = [
+    url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()
+]
+ASYNC_DATABASE_READ_URLS = [
+    url.strip() for url in os.getenv("ASYNC_DATABASE_READ_URLS", "").split(",") if url.strip()
+] or [url.replace("sqlite://", "sqlite+aiosqlite://", 1) for url in DATABASE_READ_URLS]
+# Seconds between two replication heartbeats written to the primary, 0 disables them
+REPLICA_HEARTBEAT_INTERVAL = _env_float("REPLICA_HEARTBEAT_INTERVAL", 5.0)
+DATABASE_POOL_SIZE = _env_int("DATABASE_POOL_SIZE", 5)
+DATABASE_MAX_OVERFLOW = _env_int("DATABASE_MAX_OVERFLOW", 10)
+DATABASE_POOL_TIMEOUT = _env_float("DATABASE_POOL_TIMEOUT", 30.0)
+DATABASE_POOL_RECYCLE = _env_int("DATABASE_POOL_RECYCLE", 1800)
+DATABASE_POOL_PRE_PING = _env_bool("DATABASE_POOL_PRE_PING", False)
+
+# Pragmas set on every new SQLite connection
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT", 5000),
+    "cache_size": _env_int("SQLITE_CACHE_SIZE", -20000),
+    "mmap_size": _env_int("SQLITE_MMAP_SIZE", 268435456),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Page sizes of the item listing
+ITEMS_PAGE_LIMIT = _env_int("ITEMS_PAGE_LIMIT", 50)
+ITEMS_PAGE_LIMIT_MAX = _env_int("ITEMS_PAGE_LIMIT_MAX", 200)
+
+# Bulk item import
+IMPORT_BATCH_SIZE = _env_int("IMPORT_BATCH_SIZE", 500)
+IMPORT_BATCH_SIZE_MAX = _env_int("IMPORT_BATCH_SIZE_MAX", 2000)
+# Maximum size of one line in bytes, and in characters of one CSV record, quoted line breaks
+# included
+IMPORT_MAX_RECORD_SIZE = _env_int("IMPORT_MAX_RECORD_SIZE", 64 * 1024)
+
+# Streamed item export, rows fetched from the database cursor at a time
+EXPORT_BATCH_SIZE = _env_int("EXPORT_BATCH_SIZE", 1000)
+
+# Item deletes matching more rows than this run as chunked background jobs
+BULK_DELETE_SYNC_LIMIT = _env_int("BULK_DELETE_SYNC_LIMIT", 5000)
+BULK_DELETE_BATCH_SIZE = _env_int("BULK_DELETE_BATCH_SIZE", 1000)
+# Number of finished background jobs kept for progress queries
+JOBS_HISTORY_SIZE = _env_int("JOBS_HISTORY_SIZE", 100)
+
+# Per-request SQL statistics (Server-Timing header and logs), a statement executed
+# SQL_REPEAT_THRESHOLD times in one request is logged as a likely N+1 pattern
+SQL_STATS_ENABLED = _env_bool("SQL_STATS_ENABLED", True)
+SQL_REPEAT_THRESHOLD = _env_int("SQL_REPEAT_THRESHOLD", 3)
+
+# Nearest restaurant search, the k nearest search starts with NEARBY_INITIAL_RADIUS_KM
+# and widens it until enough restaurants are found
+NEARBY_INITIAL_RADIUS_KM = _env_float("NEARBY_INITIAL_RADIUS_KM", 5.0)
+NEARBY_LIMIT = _env_int("NEARBY_LIMIT", 10)
+NEARBY_LIMIT_MAX = _env_int("NEARBY_LIMIT_MAX", 100)
+
+# File caching the OpenAPI document between cold starts, empty to always generate it
+OPENAPI_CACHE_PATH = os.getenv("OPENAPI_CACHE_PATH", "")
+
+# Directory of the stored media files, whose paths are stored and served as "media/..."
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
+
+# Uploaded images, copied to MEDIA_ROOT by chunks of IMAGE_CHUNK_SIZE bytes, larger uploads are
+# refused
+IMAGE_MAX_SIZE = _env_int("IMAGE_MAX_SIZE", 10 * 1024 * 1024)
+IMAGE_CHUNK_SIZE = _env_int("IMAGE_CHUNK_SIZE", 1024 * 1024)
+
+# Resized WebP variants of the uploaded images, generated by IMAGE_VARIANT_WORKERS threads
+IMAGE_VARIANTS_ENABLED = _env_bool("IMAGE_VARIANTS_ENABLED", True)
+IMAGE_VARIANT_WORKERS = _env_int("IMAGE_VARIANT_WORKERS", 2)
+IMAGE_VARIANT_QUALITY = _env_int("IMAGE_VARIANT_QUALITY", 80)
+
+# Serving of the media files by /media/, read by chunks of MEDIA_CHUNK_SIZE bytes when the server
+# has no zero-copy pathsend. With MEDIA_ACCEL_REDIRECT (an internal nginx location such as
+# "/protected-media/"), the proxy sends the files itself and the application only sends headers.
+MEDIA_CHUNK_SIZE = _env_int("MEDIA_CHUNK_SIZE", 256 * 1024)
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "")
+MEDIA_MAX_AGE = _env_int("MEDIA_MAX_AGE", 365 * 24 * 3600)
@@ -0,0 +1,168 @@
+"""Python 3.11"""
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+
+from utils import settings
+
+
+def _parse_keys(value: str):
+    """
+        Parses the configured signing keys.
+
+        :param value: Comma separated "key_id:secret" pairs.
+        :return: Dictionary mapping key ids to secrets.
+    """
+    keys = {}
+    for pair in filter(None, (part.strip() for part in value.split(","))):
+        key_id, _, secret = pair.partition(":")
+        keys[key_id] = secret.encode()
+    return keys
+
+
+signing_keys = _parse_keys(settings.AUTH_SIGNING_KEYS)
+active_key_id = settings.AUTH_ACTIVE_KEY_ID or next(iter(signing_keys), None)
+
+# Signature -> expiry of the revoked signed tokens, filled by revoke and by load_revocations
+# from the revoked_tokens table, so the revocations of other workers are seen too
+revoked = {}
+_revoked_lock = threading.Lock()
+
+
+def enabled():
+    """
+        Tells whether new tokens are issued as signed tokens.
+
+        :return: True if AUTH_TOKEN_MODE is "signed".
+        :raises RuntimeError: If signed mode is enabled without an active signing key.
+    """
+    if settings.AUTH_TOKEN_MODE != "signed":
+        return False
+    if active_key_id not in signing_keys:
+        raise RuntimeError("AUTH_TOKEN_MODE is 'signed' but no active signing key is configured")
+    return True
+
+
+def _b64encode(data: bytes):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(key_id: str, payload: str):
+    """
+        Computes the signature of a token payload.
+
+        :param key_id: ID of the signing key.
+        :param payload: Encoded token payload.
+        :return: Encoded HMAC-SHA256 signature, or None if the key is unknown.
+    """
+    secret = signing_keys.get(key_id)
+    if secret is None:
+        return None
+    return _b64encode(hmac.new(secret, f"{key_id}.{payload}".encode(), hashlib.sha256).digest())
+
+
+def signature_of(token_str: str):
+    """
+        Returns the signature part of a signed token, which identifies it on the revocation list.
+
+        :param token_str: Token string in the "key_id.payload.signature" format.
+        :return: Encoded signature.
+    """
+    return token_str.rsplit(".", 1)[1]
+
+
+def is_signed(token_str: str):
+    """
+        Tells whether a token string has the signed token format.
+
+        :param token_str: Token string.
+        :return: True if the token has the "key_id.payload.signature" format.
+    """
+    return token_str.count(".") == 2
+
+
+def sign(user_id: int, expiry: datetime.datetime, claims: dict = None):
+    """
+        Creates a signed token with the active signing key.
+
+        :param user_id: ID of the user the token belongs to.
+        :param expiry: Expiry date of the token (UTC).
+        :param claims: JSON serializable user details carried by the token, so verifying it
+        needs no database read.
+        :return: Token string in the "key_id.payload.signature" format.
+    """
+    expires_at = int(expiry.replace(tzinfo=datetime.timezone.utc).timestamp())
+    payload = _b64encode(json.dumps(
+        {"sub": user_id, "exp": expires_at, "jti": secrets.token_hex(8), "user": claims},
+        separators=(",", ":")
+    ).encode())
+    return f"{active_key_id}.{payload}.{_signature(active_key_id, payload)}"
+
+
+def verify(token_str: str):
+    """
+        Validates the signature and expiry of a signed token purely in memory.
+
+        Revocations are checked separately, see is_revoked.
+
+        :param token_str: Token string.
+        :return: Tuple of (user_id, expiry, claims or None) if the token is valid, otherwise None.
+    """
+    try:
+        key_id, payload, signature = token_str.split(".")
+        expected = _signature(key_id, payload)
+        if expected is None or not hmac.compare_digest(expected, signature):
+            return None
+        data = json.loads(_b64decode(payload))
+        user_id, claims = int(data["sub"]), data.get("user")
+        expiry = datetime.datetime.utcfromtimestamp(int(data["exp"]))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+    if expiry <= datetime.datetime.utcnow():
+        return None
+    return user_id, expiry, claims
+
+
+def revoke(signature: str, expiry: datetime.datetime):
+    """
+        Adds a token to the in-process revocation list, once it is recorded in the database.
+
+        :param signature: Signature of the token.
+        :param expiry: Expiry date of the token, the entry is dropped after it.
+    """
+    with _revoked_lock:
+        revoked[signature] = expiry
+
+
+def load_revocations(revocations):
+    """
+        Adds the revocations recorded by every worker and drops the expired ones.
+
+        Revocations are never withdrawn, so the list only grows until the tokens expire and
+        an entry recorded while the revocations were read is kept.
+
+        :param revocations: Iterable of (signature, expiry) pairs.
+    """
+    now = datetime.datetime.utcnow()
+    with _revoked_lock:
+        for signature in [signature for signature, expiry in revoked.items() if expiry <= now]:
+            del revoked[signature]
+        revoked.update(revocations)
+
+
+def is_revoked(token_str: str):
+    """
+        Tells whether a signed token is on the in-process revocation list.
+
+        :param token_str: Token string in the "key_id.payload.signature" format.
+        :return: True if the token was revoked.
+    """
+    return signature_of(token_str) in revoked
@@ -1,17 +1,46 @@
-import ast
+import argparse
+import enum
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import typing
 
+from fastapi import FastAPI
+from fastapi.openapi.docs import (
+    get_redoc_html, get_swagger_ui_html, get_swagger_ui_oauth2_redirect_html
+)
+from fastapi.dependencies.utils import get_flat_dependant
 from fastapi.openapi.utils import get_openapi
+from fastapi.routing import APIRoute
+from pydantic import BaseModel as PydanticBaseModel
 
+from utils import settings
+from utils.http_cache import Document
 
-def generate_custom_openapi():
+logger = logging.getLogger(__name__)
+
+OPENAPI_URL = "/openapi.json"
+DOCS_URL = "/docs"
+OAUTH2_REDIRECT_URL = "/docs/oauth2-redirect"
+REDOC_URL = "/redoc"
+
+# Encoded documents of the application, built once by build()
+_documents = {}
+
+
+def generate_custom_openapi(app: FastAPI):
     """
         Generates a custom OpenAPI schema for the FastAPI application.
 
         Retrieves the existing schema if available, otherwise generates a new one based on the application routes.
 
+        :param app: FastAPI application.
         :return: Custom OpenAPI schema for the FastAPI application.
     """
-    from main import app
     if app.openapi_schema:
         return app.openapi_schema
     openapi_schema = get_openapi(
@@ -37,6 +66,171 @@ def generate_custom_openapi():
     return app.openapi_schema
 
 
+@functools.cache
+def _model_schema(model):
+    """
+        Returns the JSON schema of a model, computed once per model for all the routes using it.
+
+        :param model: Pydantic model class.
+        :return: JSON schema of the model.
+    """
+    return model.model_json_schema()
+
+
+def _type_schema(annotation):
+    """
+        Describes a parameter, body or response type for the fingerprint.
+
+        Models are described by their JSON schema and enums by their values, so a change to
+        either changes the description.
+
+        :param annotation: Type, such as Optional[int] or a pydantic model.
+        :return: JSON serializable description of the type.
+    """
+    if isinstance(annotation, type) and issubclass(annotation, PydanticBaseModel):
+        return [annotation.__qualname__, _model_schema(annotation)]
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return [annotation.__qualname__, [member.value for member in annotation]]
+    arguments = typing.get_args(annotation)
+    if arguments:
+        return [
+            repr(typing.get_origin(annotation)), [_type_schema(argument) for argument in arguments]
+        ]
+    return repr(annotation)
+
+
+def _route_description(route):
+    """
+        Describes what a route contributes to the OpenAPI document, for the fingerprint.
+
+        :param route: Route of the application.
+        :return: JSON serializable description of the route.
+    """
+    description = [route.path, sorted(getattr(route, "methods", None) or []), route.name]
+    if not isinstance(route, APIRoute):
+        return description
+    dependant = get_flat_dependant(route.dependant, skip_repeats=True)
+    params = (
+        ("path", dependant.path_params), ("query", dependant.query_params),
+        ("header", dependant.header_params), ("cookie", dependant.cookie_params),
+        ("body", dependant.body_params),
+    )
+    for kind, fields in params:
+        description.extend([
+            kind, field.name, field.alias, type(field.field_info).__name__,
+            repr(field.field_info.default), repr(field.field_info.metadata),
+            field.field_info.description, _type_schema(field.type_),
+        ] for field in fields)
+    response_class = route.response_class
+    description.append([
+        _type_schema(route.response_model) if route.response_model else None, route.status_code,
+        route.summary, route.description, route.response_description, route.tags, route.deprecated,
+        route.include_in_schema, route.operation_id, route.responses, route.openapi_extra,
+        response_class.__name__ if isinstance(response_class, type) else repr(response_class),
+    ])
+    return description
+
+
+def fingerprint(app: FastAPI):
+    """
+        Identifies the API of an application, to tell whether a cached document still describes it.
+
+        Besides the routes, the fingerprint covers their parameters, bodies and response models
+        down to the JSON schemas of the types, so a change to a schema or a parameter invalidates
+        the cached document, without generating the document itself.
+
+        :param app: FastAPI application.
+        :return: Hex digest of the application version and routes.
+    """
+    routes = sorted((_route_description(route) for route in app.routes), key=lambda item: item[:3])
+    return hashlib.sha256(json.dumps([app.version, routes], default=repr).encode()).hexdigest()
+
+
+def save(app: FastAPI, path: str):
+    """
+        Writes the gzip compressed OpenAPI document of an application to a file.
+
+        The file starts with the fingerprint of the application on its own line. It is written
+        to a temporary file first, so a reader never sees a partial document.
+
+        :param app: FastAPI application.
+        :param path: Path of the cache file.
+    """
+    document = document_of(app, "openapi")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as file:
+        file.write(fingerprint(app).encode() + b"\n" + document.gzip_body)
+    os.replace(file.name, path)
+
+
+def load(app: FastAPI, path: str):
+    """
+        Reads an OpenAPI document written by save.
+
+        :param app: FastAPI application.
+        :param path: Path of the cache file.
+        :return: JSON bytes of the document, or None if the file is missing, unreadable
+        or was written for another version of the application.
+    """
+    try:
+        with open(path, "rb") as file:
+            stored_fingerprint, _, compressed = file.read().partition(b"\n")
+        if stored_fingerprint.decode() != fingerprint(app):
+            logger.info("Ignoring stale OpenAPI cache %s", path)
+            return None
+        return gzip.decompress(compressed)
+    except (OSError, EOFError, UnicodeDecodeError) as exc:
+        logger.warning("Cannot load the OpenAPI cache %s: %s", path, exc)
+        return None
+
+
+def build(app: FastAPI, cache_path: str = settings.OPENAPI_CACHE_PATH):
+    """
+        Encodes the OpenAPI document and the documentation pages of an application once.
+
+        With a cache path, the OpenAPI document is loaded from it when it matches the application
+        and written to it otherwise, so later cold starts skip the schema generation.
+
+        :param app: FastAPI application.
+        :param cache_path: Path of the OpenAPI cache file, empty to disable the cache.
+    """
+    body = load(app, cache_path) if cache_path else None
+    loaded = body is not None
+    if not loaded:
+        body = json.dumps(
+            generate_custom_openapi(app), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+    _documents["openapi"] = Document(body, "application/json")
+    if cache_path and not loaded:
+        try:
+            save(app, cache_path)
+        except OSError as exc:
+            logger.warning("Cannot write the OpenAPI cache %s: %s", cache_path, exc)
+    _documents["docs"] = Document(get_swagger_ui_html(
+        openapi_url=OPENAPI_URL, title="Foo - Swagger UI", oauth2_redirect_url=OAUTH2_REDIRECT_URL
+    ).body, "text/html")
+    _documents["oauth2-redirect"] = Document(
+        get_swagger_ui_oauth2_redirect_html().body, "text/html"
+    )
+    _documents["redoc"] = Document(
+        get_redoc_html(openapi_url=OPENAPI_URL, title="Foo - ReDoc").body, "text/html"
+    )
+
+
+def document_of(app: FastAPI, name: str):
+    """
+        Returns an encoded document of an application, building the documents on first use.
+
+        :param app: FastAPI application.
+        :param name: "openapi", "docs", "oauth2-redirect" or "redoc".
+        :return: Document object.
+    """
+    if name not in _documents:
+        build(app)
+    return _documents[name]
+
+
 def generate_form_input(model_cls):
     """
         Generates form input for a given Pydantic model class.
@@ -45,7 +239,7 @@ def generate_form_input(model_cls):
         :return: Form input schema for the given model class.
     """
     properties = {}
-    json_schema = ast.literal_eval(model_cls.schema_json())
+    json_schema = model_cls.model_json_schema()
     for item in json_schema["properties"]:
         properties[item] = json_schema["properties"][item]
     return {
@@ -62,3 +256,21 @@ def generate_form_input(model_cls):
             "required": True
         }
     }
+
+
+def main():
+    """
+        Command line entry point, writes the OpenAPI cache file of the application.
+    """
+    parser = argparse.ArgumentParser(description="Pre-build the OpenAPI document.")
+    parser.add_argument("command", choices=["build"], help="build: write the OpenAPI cache file")
+    parser.add_argument("path", nargs="?", default=settings.OPENAPI_CACHE_PATH or "openapi.json.gz")
+    arguments = parser.parse_args()
+    from main import app  # pylint: disable=import-outside-toplevel
+    build(app, cache_path="")
+    save(app, arguments.path)
+    print(f"OpenAPI document written to {arguments.path}")
+
+
+if __name__ == "__main__":
+    main()